@@ -20,7 +20,7 @@
 ########################################################################
 
 import os, sys, time, re
-import subprocess
+import subprocess, threading
 
 from configBase import baseConfigurator, JobID, MPIConf
 
@@ -42,8 +42,30 @@ class configurator (baseConfigurator) :
     self.hostname  = "VECNA"
     self.schjobext = 'slurm'
     self.needcopy = False
+
+    self.poller     = None   ## shared SLURM status poller, see start_status_poller
+    self.statusretry = 3     ## retries when squeue/sacct socket timed out
+    self.retrywait   = 10    ## seconds between retries
   #enddef
 
+  ##----------------------- Job status poller   -----------------------
+  def start_status_poller(self,interval=30,maxretry=3,retrywait=10) :
+    '''
+    Start one background thread that queries SLURM for all outstanding
+    jobs at every "interval" seconds. JobID.update_status will read the
+    cached status instead of running squeue/sacct for each job.
+    '''
+    self.statusretry = maxretry
+    self.retrywait   = retrywait
+
+    if self.poller is None:
+      self.poller = SlurmPoller(self,interval)
+      self.poller.start()
+      self.addlog(0,self.hostname,f'Job status poller started with interval {interval} seconds.')
+
+    self.jobstatuscmd = self.get_job_status
+  #enddef start_status_poller
+
   ##----------------------- Ending of the module -----------------------
   def finalize(self) :
     baseConfigurator.finalize(self)
@@ -51,7 +73,7 @@ class configurator (baseConfigurator) :
 
   ######################################################################
 
-  def run_a_program(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None):
+  def run_a_program(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None,depends=None):
     '''
       Generate job script for a task and submit it
 
@@ -59,6 +81,7 @@ class configurator (baseConfigurator) :
       outfile : must provide a output file name
       wrkdir  : the program can be run in a directory different from the
                 instance attribute of wrkdir
+      depends : list of job ids that must finish successfully before this job starts
       NOTE: For array jobs, it is a general directory without ensemble number appended
     '''
 
@@ -191,8 +214,9 @@ class configurator (baseConfigurator) :
           touch start.%(jobname)s.%(append)s
 
           %(cmdstr)s
+          runstatus=$?
 
-          if [[ $? -eq 0 ]]; then
+          if [[ $runstatus -eq 0 ]]; then
             touch done.%(jobname)s.%(append)s
           else
             touch error.%(jobname)s.%(append)s
@@ -212,6 +236,7 @@ class configurator (baseConfigurator) :
           printf 'Job run time:  %%02d:%%02d:%%02d' $hour $min $sec
           echo " "
 
+          exit $runstatus
           ''' %{ 'wrkdir' : jobwrkdir, 'logpre'  : logpre, 'jobname' : jobname,
                  'cmdstr' : runcmdstr,    'outfile' : outfile,
                  'queue'  : runqueue,  'partition': runpart,
@@ -235,7 +260,7 @@ class configurator (baseConfigurator) :
         jobid = JobID(jobname,wrkdir,self,jobconf)
         jobid['status'] = 0
       else :
-        jobid = self.submit_a_job(jobname,scptdir,jobconf)
+        jobid = self.submit_a_job(jobname,scptdir,jobconf,depends=depends)
         jobid.update_status()
 
     #os.chdir(cwdsaved)
@@ -355,8 +380,9 @@ class configurator (baseConfigurator) :
           set echo on
 
           %(cmdstr)s
+          runstatus=$?
 
-          if [[ $? -eq 0 ]]; then
+          if [[ $runstatus -eq 0 ]]; then
             touch done.%(jobname)s.%(append)s
           else
             touch error.%(jobname)s.%(append)s
@@ -408,7 +434,7 @@ class configurator (baseConfigurator) :
 
   ######################################################################
 
-  def run_joinwrf(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None):
+  def run_joinwrf(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None,tasks=None):
     '''
       Join WRF output files in split format.
       It is mostly the same as run_a_program execpt for it is a NON-MPI
@@ -418,6 +444,7 @@ class configurator (baseConfigurator) :
       outfile : must provide a output file name
       wrkdir  : the program can be run in a directory different from the
                 instance attribute of wrkdir
+      tasks   : members of the job array to be submitted, default all
       NOTE: For array jobs, it is a general directory without ensemble number appended
     '''
     import namelist
@@ -586,7 +613,7 @@ class configurator (baseConfigurator) :
         jobid = JobID(jobname,wrkdir,self,jobconf)
         jobid['status'] = 0
       else :
-        jobid = self.submit_a_job(jobname,scptdir,jobconf)
+        jobid = self.submit_a_job(jobname,scptdir,jobconf,tasks=tasks)
         jobid.update_status()
 
     #os.chdir(cwdsaved)
@@ -594,6 +621,165 @@ class configurator (baseConfigurator) :
     return jobid
   #enddef run_joinwrf
 
+  ##====================================================================
+
+  def run_joinwrf_batch(self,executable,jobs,jobname,wrkdir,jobconf):
+    '''
+      Join WRF split output of several members and output times with one
+      job array. Each task of the array is one member, it joins all its
+      output times in "jobs" in order, with the same clean up as run_joinwrf.
+
+      jobs    : {iens: [(nmlfile, outfile), ...]}, the namelist files are
+                in the directory of each member
+      jobname : name of the job array, must be unique for the batch
+      wrkdir  : general directory without ensemble number appended
+    '''
+    import namelist
+
+    if self.cmdmutex.acquire():
+      self.serieno += 1
+      myserieno = self.serieno
+      self.cmdmutex.release()
+
+    ##
+    ## joinwrf commands of each member, the namelist of an output time
+    ## gives the names of its files
+    ##
+    joinfiles = {}
+    joincmds  = {}
+    for iens, nmljobs in sorted(jobs.items()):
+      cmds = []
+      for nmlfile, outfile in nmljobs:
+        if nmlfile not in joinfiles:
+          nmlgrp = namelist.decode_namelist_file(os.path.join(f"{wrkdir}_{iens}",nmlfile))
+          fileheader = nmlgrp['wrfdfile'].filename_header
+          filetime   = nmlgrp['wrfdfile'].end_time_str
+          joinfiles[nmlfile] = (f"{fileheader}_d01_{filetime}_ready", f"{fileheader}_d01_{filetime}_????")
+        fileready, filewrf = joinfiles[nmlfile]
+        cmds.append(f'join_one {nmlfile} {outfile} {fileready} "{filewrf}"')
+      joincmds[iens] = cmds
+
+    if jobconf.shell:
+
+      for iens, cmds in joincmds.items():
+        jobdir = f"{wrkdir}_{iens}"
+        jobid  = JobID(jobname,jobdir,self,jobconf,myserieno)
+        status = 0
+        for nmlfile, outfile in jobs[iens]:
+          cmdstr = f"{executable} {nmlfile} > {outfile}"
+          self.addlog(0,self.hostname, 'In <%s>, executing:\n    $> %s\n' % (jobdir,cmdstr))
+          status = subprocess.call(cmdstr,shell=True,cwd=jobdir) or status
+        jobid['status'] = status
+
+        if status == 0: subprocess.call('touch done.%s.%d_%d' %(jobname,myserieno,iens),shell=True,cwd=jobdir)
+        else:           subprocess.call('touch error.%s.%d_%d'%(jobname,myserieno,iens),shell=True,cwd=jobdir)
+
+    else:
+
+      scptdir   = f"{wrkdir}_{min(jobs)}"
+      append    = "${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}"
+      jobwrkdir = f"{wrkdir}_${{SLURM_ARRAY_TASK_ID}}"
+      logpre    = f"{wrkdir}_%a/{jobname}_%a_%j"
+
+      if jobconf.exclusive:
+          slurmoptions = '--exclusive'
+      else:
+          slurmoptions = ' '
+
+      runpart  = jobconf.jobqueue or self.defaultQueue
+      if runpart == "radarq":
+          runqueue = 'radar'
+      else:
+          runqueue = 'largequeue' if jobconf.ntotal > 288 else 'smallqueue'
+
+      (hour,minute) = divmod(jobconf.claimmin*max([len(cmds) for cmds in joincmds.values()]),60)
+      timestr = '%02d:%02d:00' % (hour,minute)
+
+      scriptfile = f"{jobname}.{self.schjobext}"
+
+      casestr = '\n'.join([f"  {iens})\n    "+'\n    '.join(cmds)+"\n    ;;"
+                           for iens, cmds in joincmds.items()])
+
+      scriptstr = '''#!/bin/bash
+#SBATCH -A %(queue)s
+#SBATCH -p %(partition)s
+#SBATCH -J %(jobname)s
+#SBATCH -N 1
+#SBATCH %(slurmoptions)s
+#SBATCH -t %(claimtime)s
+#SBATCH -o %(logpre)s.out
+#SBATCH -e %(logpre)s.err
+
+time1=$(date '+%%s')
+echo "Job Started: $(date). Job Id:  $SLURM_JOBID"
+echo " "
+
+cd %(wrkdir)s
+
+touch start.%(jobname)s.%(append)s
+
+failed=0
+join_one () {
+  srun -n 1 %(executable)s $1 > $2
+  if [[ $? -eq 0 ]]; then
+    #
+    # Specail clean after join run successfully
+    #
+    if [[ -e $3 ]]; then
+      rm -rf $4
+      rm $1 $2
+    fi
+  else
+    failed=1
+  fi
+}
+
+case ${SLURM_ARRAY_TASK_ID} in
+%(casestr)s
+esac
+
+if [[ $failed -eq 0 ]]; then
+  rm start.%(jobname)s.%(append)s
+else
+  touch error.%(jobname)s.%(append)s
+fi
+
+time2=$(date '+%%s')
+
+let diff=time2-time1
+let hour=diff/3600
+let diff=diff%%3600
+let min=diff/60
+let sec=diff%%60
+
+echo -n "Job   Ended: $(date). "
+printf 'Job run time:  %%02d:%%02d:%%02d' $hour $min $sec
+echo " "
+''' %{ 'wrkdir'   : jobwrkdir, 'jobname'     : jobname,
+       'executable' : executable, 'claimtime' : timestr,
+       'queue'    : runqueue,  'partition'   : runpart,
+       'slurmoptions': slurmoptions, 'logpre' : logpre,
+       'append'   : append,    'casestr'     : casestr
+      }
+
+      scriptfull = os.path.join(scptdir,scriptfile)
+      with open(scriptfull,'w') as batchFile:
+        batchFile.write(scriptstr)
+
+      self.addlog(0,self.hostname,'''- %02d -  Jobscript "%s" generated.''' %(
+                        myserieno,scriptfile )  )
+
+      if self.showonly :
+        self.addlog(0,self.hostname,'Preparing job script "%s" in %s.' % (scriptfile,scptdir))
+        jobid = JobID(jobname,wrkdir,self,jobconf)
+        jobid['status'] = 0
+      else :
+        jobid = self.submit_a_job(jobname,scptdir,jobconf,tasks=sorted(jobs))
+        jobid.update_status()
+
+    return jobid
+  #enddef run_joinwrf_batch
+
   ######################################################################
 
   def run_unipost(self,executable,nmlfile,outfile,wrkdir,postdir,ndate,ifhr,jobconf):
@@ -742,19 +928,22 @@ class configurator (baseConfigurator) :
 
   ##====================================================================
 
-  def submit_a_job(self,jobname,wrkdir,jobconf,tasks=None) :
+  def submit_a_job(self,jobname,wrkdir,jobconf,tasks=None,depends=None) :
     '''
     submit a job to SLURM on odin
+
+    depends: job ids to be finished successfully before this job can start,
+             or dependencies with type, e.g. "aftercorr:jobid"
     '''
 
     jobfile = os.path.join(wrkdir,'%s.%s'%(jobname,self.schjobext))
 
-    #if djobs :
-    #  bjoblst = ['sbatch', '-d', 'afterok:%s' % ':'.join(djobs), jobfile]
-    #else :
-    #  bjoblst = ['sbatch', jobfile]
     bjoblst = ['sbatch']
 
+    if depends :
+      deplst = [dep if ':' in str(dep) else f'afterok:{dep}' for dep in depends]
+      bjoblst.extend(['-d', ','.join(deplst), '--kill-on-invalid-dep=yes'])
+
     if tasks is not None:
         bjoblst.extend(['-a',','.join(map(str,tasks))])
     elif jobconf.numens is not None:
@@ -785,6 +974,7 @@ class configurator (baseConfigurator) :
 
       job = None
     else:
+      if self.poller is not None: self.poller.register(jobid)
       job = JobID(jobname,wrkdir,self,jobconf,jobid,self.jobstatuscmd)
 
       self.addlog(  0,self.hostname,'Submitted %s.' % job  )
@@ -796,107 +986,124 @@ class configurator (baseConfigurator) :
 
   ##====================================================================
 
+  def cancel_job(self,jobid) :
+    '''
+    cancel a job in the queue
+    '''
+
+    if jobid is None or self.showonly: return
+
+    self.addlog(0,self.hostname,f'Cancelling job <{jobid}> ...')
+    subprocess.call(['scancel',str(jobid)])
+  #enddef cancel_job
+
+  ##====================================================================
+
   def get_job_status(self,jobid) :
     '''
     Check job status using SQUEUE & SACCT
+
+    If the status poller is started, the cached status is returned.
     '''
 
     if jobid is None :
       return 0
 
-    #retout = subprocess.Popen(['squeue', '-j','%s' % jobid ],
-    #                       stdout=subprocess.PIPE).communicate()[0]
-    pipe = subprocess.PIPE
-    #queryarg = ['squeue','-h','-o','"%10i %20u %.2t"','-j',jobid ]
-    queryarg = ['squeue','-h','-o','"%10i %.2t"','-j',jobid ]
-    outs  = subprocess.Popen(queryarg,stdout=pipe,stderr=pipe).communicate()
-                                #sacct -j jobid -o "JobID,User,state"
-    retout = outs[0]
-    reterr = outs[1]
-    #self.addlog(1,retout)
-    timeoutre = re.compile(r'Socket timed out on send/recv operation' )
-    while timeoutre.search(reterr):
-      #print "STDOUT: %s"%retout
-      #print "STDERR: %s"%reterr
-      time.sleep(10)
-      outs   = subprocess.Popen(queryarg,stdout=pipe,stderr=pipe).communicate()
-      retout = outs[0]
-      reterr = outs[1]
-    #print retout
-    ## get job status here
-
-    #if self.debug :   ## debugging outputs
-    #  if self.firstqstat :
-    #    print retlist[0]
-    #    print retlist[1]
-    #    self.firstqstat = False
-    #  else :
-    #    print retlist[1]
-    #jobstatre = re.compile(r'"%s +%s +(\w{1,2})"' % (jobid,os.getenv('USER')) )
-    jobstatre = re.compile(r'"%s +(\w{1,2})"' % jobid )
-    jobstatmatch = jobstatre.match(retout)
-    if jobstatmatch :
-      status = jobstatmatch.group(1)
-      #self.addlog(1,'get job status %s'%status)
-      if status == "CD" :  # (completed)
-        jobstatus = 0
-      elif status == "PD" :
-        jobstatus = 1
-      elif status == "R" :
-        jobstatus = 2
-      elif status == 'CA':  # (cancelled),
-        jobstatus = 3
-      elif status == 'CF':  # (configuring),
-        jobstatus = 4
-      elif status == 'CG':  # (completing),
-        jobstatus = 5
-      elif status == 'F':   # (failed),
-        jobstatus = 6
-      elif status == 'TO':  # (timeout)
-        jobstatus = 7
-      elif status == 'NF':  # (node failure).
-        jobstatus = 8
-      else :
-        jobstatus = 9
+    if self.poller is not None:
+      return self.poller.get_status(jobid)
 
-    else :
-      queryarg = ['sacct',  '-o', "JobID,state", '-n','-j', jobid]
-      outs   = subprocess.Popen(queryarg,stdout=pipe,stderr=pipe).communicate()
-      retout = outs[0]
-      reterr = outs[1]
-      #print retout
-      #print reterr
-
-      while timeoutre.search(reterr):
-        #print "STDOUT: %s"%retout
-        #print "STDERR: %s"%reterr
-        time.sleep(10)
-        outs   = subprocess.Popen(queryarg,stdout=pipe,stderr=pipe).communicate()
-        retout = outs[0]
-        reterr = outs[1]
-
-      retlst = retout.split('\n')
-      #print retlst[0]
-      jobstatre = re.compile(r'%s +(\w+)' % jobid )
-      jobstatmatch = jobstatre.match(retlst[0])
-      if jobstatmatch:
-        status = jobstatmatch.group(1)
-        if status == 'COMPLETED':
-          jobstatus = 0
-        elif status == 'PENDING':
-          jobstatus = 1
-        elif status == 'RUNNING':
-          jobstatus = 2
-        else:
-          jobstatus = 9
-      else:
-          self.addlog(-1,self.hostname,'job status is not matched, "%s"'%retlst[0])
-          jobstatus = None
+    jobstatus = self.query_jobs([jobid]).get(jobid)
+    if jobstatus is None:
+      self.addlog(-1,self.hostname,f'job status is not matched, "{jobid}"')
 
     return jobstatus
 
   #enddef get_job_status
 
+  ##====================================================================
+
+  def query_jobs(self,jobids) :
+    '''
+    Query the status of a list of jobs with one SQUEUE and at most one SACCT
+
+    return a dict {jobid: status} with the status codes of JobID.update_status,
+    jobs that are not found are not in the dict.
+    For job arrays, the status of all tasks are merged into one status.
+    '''
+
+    timeoutre = re.compile(r'Socket timed out on send/recv operation' )
+    def run_query(queryarg):
+      pipe = subprocess.PIPE
+      for itry in range(self.statusretry+1):
+        outs = subprocess.Popen(queryarg,stdout=pipe,stderr=pipe,universal_newlines=True).communicate()
+        if not timeoutre.search(outs[1]): break
+        time.sleep(self.retrywait)
+      else:
+        self.addlog(1,self.hostname,f'"{" ".join(queryarg[:2])}" timed out after {self.statusretry} retries.')
+      return outs[0]
+
+    def merge_status(codes):
+      # merge the status of all tasks into one JobID status
+      if 9 in codes: return 9                               # any task pending
+      if 1 in codes: return 1                               # all started, some still running
+      if all(code == 0 for code in codes): return 0         # all tasks completed
+      if all(code < 0 for code in codes): return -6         # all tasks failed
+      return -1                                             # some tasks failed
+
+    def to_status(state,statecodes):
+      if state in statecodes: return statecodes[state]
+      self.addlog(1,self.hostname,f'Unknown SLURM job state "{state}", taken as pending.')
+      return 9
+
+    ##
+    ## jobs in queue, array tasks are listed as "1234_5" or "1234_[6-10]"
+    ## SLURM states are translated to the JobID status, see JobID.update_status
+    ##
+    squeue_codes = {'PD': 9, 'CF': 9, 'RQ': 9, 'RH': 9, 'RF': 9, 'RS': 9, 'S': 9, 'ST': 9,
+                    'SI': 9, 'SO': 9, 'R': 1, 'CG': 1,
+                    'CD': 0,
+                    'F': -6, 'TO': -6, 'NF': -6, 'CA': -6, 'PR': -6, 'OOM': -6,
+                    'BF': -6, 'DL': -6, 'RV': -6, 'SE': -6 }
+
+    jobstatre = re.compile(r'^(\d+)\S* +(\w+)$')
+    retout = run_query(['squeue','-h','-o','%i %t','-j',','.join(jobids)])
+
+    codes = {}
+    for line in retout.splitlines():
+      jobstatmatch = jobstatre.match(line.strip())
+      if jobstatmatch and jobstatmatch.group(1) in jobids:
+        codes.setdefault(jobstatmatch.group(1),[]).append(to_status(jobstatmatch.group(2),squeue_codes))
+
+    jobstatus = { jobid: merge_status(jcodes) for jobid,jcodes in codes.items() }
+
+    ##
+    ## jobs that left the queue, cancelled jobs are listed as "CANCELLED by <uid>"
+    ##
+    missids = [ jobid for jobid in jobids if jobid not in jobstatus ]
+    if len(missids) > 0:
+      sacct_codes = {'PENDING': 9, 'REQUEUED': 9, 'REQUEUE_FED': 9, 'REQUEUE_HOLD': 9,
+                     'RESV_DEL_HOLD': 9, 'SUSPENDED': 9, 'RUNNING': 1, 'COMPLETING': 1,
+                     'COMPLETED': 0,
+                     'FAILED': -6, 'TIMEOUT': -6, 'CANCELLED': -6, 'PREEMPTED': -6,
+                     'NODE_FAIL': -6, 'OUT_OF_MEMORY': -6, 'BOOT_FAIL': -6,
+                     'DEADLINE': -6, 'REVOKED': -6 }
+
+      jobstatre = re.compile(r'^(\d+)[^|]*\|(\w+)')
+      retout = run_query(['sacct','-n','-X','-P','-o','JobID,State','-j',','.join(missids)])
+
+      codes = {}
+      for line in retout.splitlines():
+        jobstatmatch = jobstatre.match(line.strip())
+        if jobstatmatch and jobstatmatch.group(1) in missids:
+          codes.setdefault(jobstatmatch.group(1),[]).append(to_status(jobstatmatch.group(2),sacct_codes))
+
+      for jobid,jcodes in codes.items():
+        jobstatus[jobid] = merge_status(jcodes)
+
+    return jobstatus
+
+  #enddef query_jobs
+
   ######################################################################
 
   @staticmethod
@@ -924,6 +1131,92 @@ class configurator (baseConfigurator) :
 
 #endclass configurator
 
+##%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class SlurmPoller(threading.Thread) :
+  #classbegin
+  '''
+  A single thread that polls SLURM for all registered jobs at once and
+  caches their status to be shared by all domain threads.
+  '''
+
+  ##----------------------- Initialization      -----------------------
+  def __init__(self,command,interval=30,maxmiss=5) :
+    threading.Thread.__init__(self,name='SlurmPoller',daemon=True)
+    self.command  = command
+    self.interval = interval
+    self.maxmiss  = maxmiss    ## polls a job may be unknown to SLURM before it is lost
+
+    self.jobids   = set()      ## jobs still in the queue
+    self.cache    = {}         ## jobid: status
+    self.misses   = {}         ## jobid: number of polls it was not found
+    self.asked    = False      ## a new job is waiting for its first status
+    self.cond     = threading.Condition()
+  #enddef
+
+  def register(self,jobid) :
+    ''' Add a job to be polled '''
+    with self.cond:
+      self.jobids.add(jobid)
+  #enddef register
+
+  def get_status(self,jobid) :
+    '''
+    Return the cached status of jobid. A job that is not polled yet
+    triggers an immediate query.
+    '''
+    with self.cond:
+      if jobid not in self.cache:
+        self.jobids.add(jobid)
+        self.asked = True
+        self.cond.notify_all()
+        self.cond.wait_for(lambda: jobid in self.cache, timeout=self.interval)
+
+      return self.cache.get(jobid,9)   ## not seen by SLURM yet, take it as pending
+  #enddef get_status
+
+  def run(self) :
+    finalcodes = (0,-1,-6)        ## no more change for these status
+
+    while self.command.keep_waiting:
+      with self.cond:
+        self.cond.wait_for(lambda: self.asked, timeout=self.interval)
+        self.asked = False
+        jobids = sorted(self.jobids)
+
+      if len(jobids) == 0: continue
+
+      try:
+        jobstatus = self.command.query_jobs(jobids)
+      except Exception as ex:
+        self.command.addlog(1,self.command.hostname,f'Job status poller: {ex}')
+        continue
+
+      lostids = []
+      with self.cond:
+        self.cache.update(jobstatus)
+        for jobid,status in jobstatus.items():
+          self.misses.pop(jobid,None)
+          if status in finalcodes: self.jobids.discard(jobid)
+
+        for jobid in jobids:     ## neither squeue nor sacct knows it
+          if jobid in jobstatus: continue
+          self.misses[jobid] = self.misses.get(jobid,0)+1
+          if self.misses[jobid] >= self.maxmiss:
+            self.cache[jobid] = -6
+            self.jobids.discard(jobid)
+            del self.misses[jobid]
+            lostids.append(jobid)
+        self.cond.notify_all()
+
+      for jobid in lostids:
+        self.command.addlog(1,self.command.hostname,f'Job <{jobid}> is not known to SLURM after {self.maxmiss} polls, taken as failed.')
+
+      self.command.addlog(999,self.command.hostname,f'Polled {len(jobids)} jobs: {jobstatus}')
+  #enddef run
+
+#endclass SlurmPoller
+
 if __name__ == "__main__":
   #
   # Test get job status
@@ -25,11 +25,17 @@
 ## Requirements:
 ##
 ##   o Python 2.7 or above
+##   o NumPy for the array interface (xytoll_array, lltoxy_array & lattomf_array)
 ##
 ########################################################################
 
 import math
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class NWPMapProjector:
 
   ##----------------------- Constructor  -------------------------------
@@ -428,7 +434,10 @@ class NWPMapProjector:
     #
     #-------------------------------------------------------------------
 
-    if xin is list:
+    if np is not None and isinstance(xin,np.ndarray):
+        return self.xytoll_array(xin,yin)
+
+    if isinstance(xin,(list,tuple)):
         xlen = len(xin)
         ylen = len(yin)
 
@@ -437,7 +446,7 @@ class NWPMapProjector:
                   ERROR: dimension size is not consistent for input lists:
                             xin - %d, yin - %d
                   """%(xlen,ylen))
-            return -1
+            return (None,None)
 
         x = xin
         y = yin
@@ -532,7 +541,7 @@ class NWPMapProjector:
     else:
        print ("ERROR: unknown map projection option jproj = %d."%(self.jproj))
 
-    if xlen > 1:
+    if isinstance(xin,(list,tuple)):
         return (rlat,rlon)
     else:
         return (rlat[0],rlon[0])
@@ -569,7 +578,10 @@ class NWPMapProjector:
     #
     #-------------------------------------------------------------------
 
-    if type(rlatin) is list:
+    if np is not None and isinstance(rlatin,np.ndarray):
+        return self.lltoxy_array(rlatin,rlonin)
+
+    if isinstance(rlatin,(list,tuple)):
 
         xlen = len(rlatin)
         ylen = len(rlonin)
@@ -580,6 +592,9 @@ class NWPMapProjector:
                              rlonin - %d
                 """%( xlen, ylen))
           return (None,None)
+
+        rlat = rlatin
+        rlon = rlonin
     else:
         rlon = [rlonin]
         rlat = [rlatin]
@@ -642,13 +657,170 @@ class NWPMapProjector:
            if xloc[i] >  180.: xloc[i]=xloc[i]-360.
            yloc[i]=rlat[i]-self.yorig
     else:
-       print ("ERROR: unknown map projection option jproj = %d." % jproj)
+       print ("ERROR: unknown map projection option jproj = %d." % self.jproj)
 
-    if xlen > 1:
+    if isinstance(rlatin,(list,tuple)):
         return xloc,yloc
     else:
         return xloc[0],yloc[0]
 
+  ##----------------------- xytoll_array  -------------------------------
+
+  def xytoll_array(self,x,y):
+    #
+    # Same as xytoll for NumPy arrays (or anything np.asarray accepts)
+    # of any shape, x & y are broadcast against each other.
+    #
+    # return (rlat, rlon) arrays in degrees
+    #
+
+    if np is None:
+        raise ImportError("NumPy is required by NWPMapProjector.xytoll_array")
+
+    x, y = np.broadcast_arrays(np.asarray(x,dtype=float),np.asarray(y,dtype=float))
+
+    xabs = x+self.xorig
+    yabs = y+self.yorig
+
+    if self.jproj == 0:
+       ratio = self.r2deg / self.eradius
+       rlat = ratio*yabs
+       rlon = ratio*xabs
+
+    elif self.jproj in (1,2):
+       radius = np.hypot(xabs,yabs)
+       if self.jproj == 1:
+           ratio = radius / self.projc3
+           cone  = 1.0
+       else:
+           ratio = self.projc3*np.power(radius/(self.projc1*self.projc2), 1./self.projc4)
+           cone  = self.projc4
+
+       rlat = np.clip(self.jpole*(90.-2.*self.r2deg*np.arctan(ratio)), -90., 90.)
+
+       yjp = self.jpole*yabs
+       with np.errstate(divide='ignore',invalid='ignore'):
+           tlon = self.r2deg*np.arctan(-xabs/yabs)/cone
+       dlon = np.where(yjp > 0., 180.+tlon,
+              np.where(yjp < 0., tlon,
+              np.where(xabs > 0., 90./cone, -90./cone)))    # y = 0.
+
+       rlon = self.rota+self.jpole*dlon
+       rlon = np.where(rlon >  180., rlon-360., rlon)
+       rlon = np.where(rlon < -180., rlon+360., rlon)
+       rlon = np.clip(rlon, -180., 180.)
+
+    elif self.jproj == 3:
+       rlat = np.clip(90. - 2.*self.r2deg*np.arctan(np.exp(-yabs/self.projc3)), -90., 90.)
+
+       rlon = self.rota + self.r2deg*(xabs/self.projc3)
+       rlon = np.where(rlon >  180., rlon-360., rlon)
+       rlon = np.where(rlon < -180., rlon+360., rlon)
+
+    elif self.jproj == 4:
+       rlon = xabs
+       rlat = yabs
+    else:
+       print ("ERROR: unknown map projection option jproj = %d."%(self.jproj))
+       return (None,None)
+
+    return (rlat,rlon)
+
+  ##----------------------- lltoxy_array  -------------------------------
+
+  def lltoxy_array(self,rlat,rlon):
+    #
+    # Same as lltoxy for NumPy arrays (or anything np.asarray accepts)
+    # of any shape, rlat & rlon are broadcast against each other.
+    #
+    # return (xloc, yloc) arrays in map coordinates
+    #
+
+    if np is None:
+        raise ImportError("NumPy is required by NWPMapProjector.lltoxy_array")
+
+    rlat, rlon = np.broadcast_arrays(np.asarray(rlat,dtype=float),np.asarray(rlon,dtype=float))
+
+    if self.jproj == 0:
+       ratio = self.d2rad*self.eradius
+       xloc = ratio*rlon - self.xorig
+       yloc = ratio*rlat - self.yorig
+
+    elif self.jproj == 1:
+       denom = 1. + np.sin(self.d2rad*self.jpole*rlat)
+       denom = np.where(denom == 0., 1.0e-10, denom)
+       radius = self.jpole*self.projc3*np.cos(self.d2rad*rlat)/denom
+       dlon = self.jpole*self.d2rad*(rlon-self.rota)
+       xloc =  radius*np.sin(dlon) - self.xorig
+       yloc = -radius*np.cos(dlon) - self.yorig
+
+    elif self.jproj == 2:
+       # Handle opposite pole
+       lat = np.where(self.jpole*rlat < -89.9, -89.9*self.jpole, rlat)
+
+       radius = self.projc1*self.projc2*np.power(
+                 np.tan(self.d2rad*(45.-0.5*self.jpole*lat))/self.projc3, self.projc4)
+       tem = rlon-self.rota
+       tem = np.where(tem < -180.0, 360.0+tem, tem)
+       tem = np.where(tem >  180.0, tem-360.0, tem)
+       dlon = self.projc4*self.d2rad*tem
+       xloc =            radius*np.sin(dlon) - self.xorig
+       yloc = -self.jpole*radius*np.cos(dlon) - self.yorig
+
+    elif self.jproj == 3:
+       dlon = rlon-self.rota
+       dlon = np.where(dlon < -180., dlon+360., dlon)
+       dlon = np.where(dlon >  180., dlon-360., dlon)
+       xloc = self.projc3*self.d2rad*dlon - self.xorig
+       denom = np.tan(self.d2rad*(45. - 0.5*rlat))
+       denom = np.where(denom <= 0., 1.0e-10, denom)
+       yloc = -self.projc3*np.log(denom) - self.yorig
+
+    elif self.jproj == 4:
+       xloc = rlon-self.xorig
+       xloc = np.where(xloc < -180., xloc+360., xloc)
+       xloc = np.where(xloc >  180., xloc-360., xloc)
+       yloc = rlat-self.yorig
+    else:
+       print ("ERROR: unknown map projection option jproj = %d." % self.jproj)
+       return (None,None)
+
+    return (xloc,yloc)
+
+  ##----------------------- lattomf_array  ------------------------------
+
+  def lattomf_array(self,rlat):
+    #
+    # Map factor (emfact), the ratio of the map distance to the distance
+    # on the earth, at latitude rlat (NumPy array of any shape).
+    #
+    # Based on lattomf in maproj3d.f90, the scale (scmap) is not included
+    #
+
+    if np is None:
+        raise ImportError("NumPy is required by NWPMapProjector.lattomf_array")
+
+    rlat = np.asarray(rlat,dtype=float)
+
+    if self.jproj in (0,4):
+       emfact = np.ones_like(rlat)
+
+    elif self.jproj == 1:
+       emfact = self.projc2/(1. + np.sin(self.d2rad*self.jpole*rlat))
+
+    elif self.jproj == 2:
+       lat = np.clip(rlat, -89.9, 89.9)
+       emfact = (self.projc2/np.cos(self.d2rad*lat))*np.power(
+                 np.tan(self.d2rad*(45.-0.5*self.jpole*lat))/self.projc3, self.projc4)
+
+    elif self.jproj == 3:
+       emfact = self.projc2/np.cos(self.d2rad*np.clip(rlat, -89.9, 89.9))
+    else:
+       print ("ERROR: unknown map projection option jproj = %d." % self.jproj)
+       return None
+
+    return emfact
+
 
 #############################  Portral   ###############################
 
@@ -720,3 +892,36 @@ if __name__ == "__main__":
       print ("*** Failed ***")
     else:
       print ("--- success ---")
+
+    #
+    # Benchmark of the list and the array interfaces on a 1000x1000 grid,
+    # run as "NWPMapProjection.py bench"
+    #
+    import sys, time
+    if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+      if np is None:
+        print ("NumPy is not available, skip the benchmark.")
+        sys.exit(0)
+
+      mapproj_bench = NWPMapProjector(2,[ 30.0, 60.0 ],-100.0,info=False)
+      (cx,cy) = mapproj_bench.lltoxy( 38.0, -98.0 )
+      mapproj_bench.setorig( 1, cx-0.5*999*3000., cy-0.5*999*3000.)
+
+      xgrd, ygrd = np.meshgrid(np.arange(1000)*3000.,np.arange(1000)*3000.)
+
+      print ("\n=== Benchmark of xytoll/lltoxy on a 1000x1000 grid")
+      t0 = time.time()
+      (rlats,rlons) = mapproj_bench.xytoll(list(xgrd.ravel()),list(ygrd.ravel()))
+      (xlist,ylist) = mapproj_bench.lltoxy(rlats,rlons)
+      tlist = time.time()-t0
+
+      t0 = time.time()
+      (rlata,rlona) = mapproj_bench.xytoll(xgrd,ygrd)
+      (xarr,yarr)   = mapproj_bench.lltoxy(rlata,rlona)
+      tarr  = time.time()-t0
+
+      print ("lists : %8.3f seconds" % tlist)
+      print ("arrays: %8.3f seconds, %.1f times faster" % (tarr, tlist/tarr))
+      print ("max difference: lat %g, lon %g, x %g, y %g" % (
+             np.abs(rlata.ravel()-rlats).max(), np.abs(rlona.ravel()-rlons).max(),
+             np.abs(xarr.ravel()-xlist).max(),  np.abs(yarr.ravel()-ylist).max()))
@@ -20,8 +20,10 @@
 ##
 ########################################################################
 
-import os, time, re, sys
-import shutil, threading, logging
+import os, time, re, sys, string, errno
+import shutil, threading, logging, gzip
+import select, struct, ctypes, ctypes.util
+import concurrent.futures, multiprocessing, hashlib, collections, json
 
 from datetime import datetime, timedelta
 
@@ -48,6 +50,10 @@ class baseConfigurator :
 
     self.cmdmutex     = threading.Lock()
     self.keep_waiting = True
+
+    self.stager       = None   ## StagingEngine, created on first use
+    self.stageworkers = 8      ## number of concurrent copies
+    self.obscache     = None   ## ObsCache shared by all domains, see setup_obscache
   #enddef
 
   def setuplog(self,logdir,runname,runtime,debug,justfordelete=False):
@@ -149,7 +155,7 @@ class baseConfigurator :
 
   ########################################################################
 
-  def run_a_program(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None):
+  def run_a_program(self,executable,nmlfile,outfile,wrkdir,jobconf,inarg=None,depends=None):
     '''
        To be implemented for each environment
     '''
@@ -246,6 +252,121 @@ class baseConfigurator :
 
   #enddef copyfile
 
+  def setup_obscache(self,cachedir=None,budget=20) :
+    '''Stage observation files through a cache under "cachedir"
+       (default <wrkdir>/obscache) which holds at most "budget" GB.'''
+
+    if cachedir is None:
+      cachedir = os.path.join(self.wrkdir,'obscache')
+    self.obscache = ObsCache(cachedir,int(budget*1024**3))
+    self.addlog(0,'CMD',f'Observation cache in <{cachedir}> with {self.obscache.nbytes/1024**3:.2f} of {budget} GB used.')
+
+  #enddef setup_obscache
+
+  def stage_files(self,jobname,pairs,link=True) :
+    '''Copy a batch of files [(srcfile,destfile), ...] concurrently.
+
+       Files on the same file system as their destination are hard linked
+       when "link" is True. Return the list of destination files staged.'''
+
+    if len(pairs) == 0: return []
+
+    with self.cmdmutex:
+      if self.stager is None:
+        self.stager = StagingEngine(self.stageworkers)
+
+    staged, nbytes, elapsed, errors = self.stager.stage(pairs,link,self.obscache)
+
+    for srcfile, err in errors:
+      self.addlog(1,'CMD',f'Job "{jobname}" failed to stage <{srcfile}>: {err}')
+
+    if len(staged) > 0:
+      mbytes = nbytes/1048576
+      self.addlog(0,'CMD',f'Job "{jobname}" staged {len(staged)} files ({mbytes:.1f} MB) in {elapsed:.2f} seconds, {mbytes/max(elapsed,1.0E-6):.1f} MB/s.')
+      if self.obscache is not None:
+        self.addlog(0,'CMD',f'Job "{jobname}" {self.obscache.summary()}')
+
+    return staged
+
+  #enddef stage_files
+
+  def gunzip_files(self,jobname,pairs,cachedir=None,maxworkers=8,cachemaxage=6) :
+    '''Decompress a batch of gzip files [(srcfile,destfile), ...] in a process pool.
+
+       With "cachedir", the decompressed files are kept there and linked to
+       "destfile", so that other domains or cycles reuse the same copy. A file
+       that is already decompressed and current is not decompressed again.
+       Cached files not used for "cachemaxage" hours are removed.
+       Return the list of destination files that are ready.'''
+
+    if len(pairs) == 0: return []
+
+    if cachedir is not None:
+      os.makedirs(cachedir,exist_ok=True)
+
+    outpairs = []
+    for srcfile, destfile in pairs:
+      if cachedir is None:
+        outfile = destfile
+      else:
+        outfile = os.path.join(cachedir,re.sub(r'\.gz$','',os.path.basename(srcfile)))
+      outpairs.append((srcfile,outfile,destfile))
+
+    todos = [(srcfile,outfile) for srcfile,outfile,_destfile in outpairs
+                               if not StagingEngine.gunzip_is_current(srcfile,outfile)]
+
+    time0 = time.time()
+    fails = StagingEngine.gunzip(todos,maxworkers)
+    for srcfile, err in fails:
+      self.addlog(1,'CMD',f'Job "{jobname}" failed to decompress <{srcfile}>: {err}')
+    failed = set([srcfile for srcfile, _err in fails])
+
+    readys = []
+    for srcfile, outfile, destfile in outpairs:
+      if srcfile in failed: continue
+      if outfile != destfile:
+        try:
+          ObsCache.link(outfile,destfile)
+        except OSError as ex:
+          self.addlog(1,'CMD',f'Job "{jobname}" failed to link <{outfile}> to <{destfile}>: {ex}')
+          continue
+      readys.append(destfile)
+
+    self.addlog(0,'CMD',f'Job "{jobname}" decompressed {len(todos)-len(fails)} files ({len(pairs)-len(todos)} already current) in {time.time()-time0:.2f} seconds.')
+
+    if cachedir is not None:
+      self.clean_cache(jobname,cachedir,cachemaxage)
+
+    return readys
+
+  #enddef gunzip_files
+
+  def clean_cache(self,jobname,cachedir,maxage) :
+    '''Remove the files in "cachedir" that are not decompressed or linked
+       for "maxage" hours. The inode change time is updated by both, while
+       the modification time is the one of the source file.
+
+       The hard links in the work directories keep their data.'''
+
+    expire = time.time()-maxage*3600
+    nfile = 0
+    nbyte = 0
+    with os.scandir(cachedir) as entries:
+      for entry in entries:
+        try:
+          stat = entry.stat(follow_symlinks=False)
+          if stat.st_ctime < expire:
+            os.unlink(entry.path)
+            nfile += 1
+            nbyte += stat.st_size
+        except OSError:      # removed by another domain
+          pass
+
+    if nfile > 0:
+      self.addlog(0,'CMD',f'Job "{jobname}" removed {nfile} files ({nbyte/1048576:.1f} MB) older than {maxage} hours from {cachedir}.')
+
+  #enddef clean_cache
+
   ################# Check job status ###################################
 
   def wait_job(self,jobname,job,waitonjob,maxwaittime = 5*3600) :
@@ -322,58 +443,70 @@ class baseConfigurator :
     #
 
     self.addlog(999,'CMD',f"Waiting for <{filepath}> ...." )
-    while wait_time < maxwaitexist and self.keep_waiting:
-        if os.path.exists(filepath): break
-
-        time.sleep(waittick)
-        wait_time += waittick
-    else:   ## We have waitted too long
-        self.addlog(1,'CMD',f'Job "{jobname}" waiting for file <{filepath}> exceeded {maxwaitexist} seconds.\n')
-        return False
-
-    ##
-    ## Secondly, file should be stable for manipulating if requested for a check
-    ##
-    #  Check whether other process is writing this file
-    #  If the file exists but is changing continuously, wait "waittick" seconds
-    #  and check again until it's stable within "waittick" seconds.
-    #
-    if maxwaitready is None:
-       maxwaitready = sys.maxsize
-
-    multiple = 24      # multipulor of wait tick for which file is condisdered old
-                       # so not further stability checking
-    if not skipread:
-        epoch   = datetime.utcfromtimestamp(0)
-        currUTC = datetime.utcnow()
-        last    = os.path.getmtime(filepath)
-        fileage = (currUTC-epoch).total_seconds()-last
-        if fileage < multiple*waittick:  # only wait for newer file
-          wait_time = 0
-          while wait_time < maxwaitready and self.keep_waiting:
-                time.sleep(waittick)
-                wait_time += waittick
-                current=os.path.getmtime(filepath)
-                if last == current:
-                  if expectSize > 0:
-                    fsize = os.path.getsize(filepath)
-                    if fsize < expectSize*1024:
-                      self.addlog(999,'CMD',f"<{filepath}> is still too small ({fsize} bytes) after {wait_time} seconds. Keep Waiting ...")
-                      continue
-                    self.addlog(999,'CMD',f"<{filepath}> now has size ({fsize} bytes) after {wait_time} seconds.")
-
-                  self.addlog(0,'CMD',f"<{filepath}> is now ready after {wait_time} seconds.")
-                  break
-
-                self.addlog(999,'CMD',f"<{filepath}> is actively changing after {wait_time} seconds." )
-                last = current
-
-          else :   ## We have waitted too long
-                self.addlog(1,'CMD', f'Job "{jobname}" waiting for file <{filepath}> ready exceeded {maxwaitready} seconds.\n')
-                return False
-        else:
-          #self.addlog(999,'CMD',"<%s> is (%d seconds) old > %d * tick (%d seconds). No further checking."%(filepath,fileage,multiple,waittick) )
-          self.addlog(999,'CMD',f"<{filepath}> ready." )
+    with FileWatcher([filepath]) as watcher:
+        start = time.time()
+        while wait_time < maxwaitexist and self.keep_waiting:
+            if filepath in watcher.scan(): break
+
+            watcher.wait(min(waittick,maxwaitexist-wait_time))
+            wait_time = time.time()-start
+        else:   ## We have waitted too long
+            self.addlog(1,'CMD',f'Job "{jobname}" waiting for file <{filepath}> exceeded {maxwaitexist} seconds.\n')
+            return False
+
+        ##
+        ## Secondly, file should be stable for manipulating if requested for a check
+        ##
+        #  Check whether other process is writing this file
+        #  The file is stable once its writer closed it, or when it did not
+        #  change for "waittick" seconds (see FileWatcher.settled).
+        #
+        if maxwaitready is None:
+           maxwaitready = sys.maxsize
+
+        multiple = 24      # multipulor of wait tick for which file is condisdered old
+                           # so not further stability checking
+        if not skipread:
+            epoch   = datetime.utcfromtimestamp(0)
+            currUTC = datetime.utcnow()
+            last    = os.path.getmtime(filepath)
+            fileage = (currUTC-epoch).total_seconds()-last
+            if fileage < multiple*waittick:  # only wait for newer file
+              wait_time = 0
+              start = since = time.time()
+              while wait_time < maxwaitready and self.keep_waiting:
+                    now = time.time()
+                    wait_time = now-start
+                    current, fsize = watcher.scan().get(filepath,(None,0))
+                    if current is None:          # removed, wait for it again
+                      self.addlog(999,'CMD',f"<{filepath}> disappeared after {wait_time:.0f} seconds. Keep Waiting ...")
+                      last, since = None, now
+                    else:
+                      if last != current:
+                        if last is not None:
+                          self.addlog(999,'CMD',f"<{filepath}> is actively changing after {wait_time:.0f} seconds." )
+                        last, since = current, now
+
+                      if watcher.settled(filepath,since,waittick,now):
+                        if expectSize > 0:
+                          if fsize < expectSize*1024:
+                            self.addlog(999,'CMD',f"<{filepath}> is still too small ({fsize} bytes) after {wait_time:.0f} seconds. Keep Waiting ...")
+                            watcher.wait(waittick)
+                            continue
+                          self.addlog(999,'CMD',f"<{filepath}> now has size ({fsize} bytes) after {wait_time:.0f} seconds.")
+
+                        self.addlog(0,'CMD',f"<{filepath}> is now ready after {wait_time:.0f} seconds.")
+                        break
+
+                    waitleft = since+waittick-time.time()
+                    watcher.wait(waitleft if waitleft > 0 else waittick)
+
+              else :   ## We have waitted too long
+                    self.addlog(1,'CMD', f'Job "{jobname}" waiting for file <{filepath}> ready exceeded {maxwaitready} seconds.\n')
+                    return False
+            else:
+              #self.addlog(999,'CMD',"<%s> is (%d seconds) old > %d * tick (%d seconds). No further checking."%(filepath,fileage,multiple,waittick) )
+              self.addlog(999,'CMD',f"<{filepath}> ready." )
 
     return True
 
@@ -409,102 +542,887 @@ class baseConfigurator :
     basefile   = os.path.basename(files[0])
     dirname    = re.sub(r"_\d{1,3}$","_*",os.path.dirname(files[0]))
 
-    while wait_time < maxwaitexist and self.keep_waiting:
-        filexist = [os.path.exists(filepath) for filepath in files]
-        if filexist.count(True) == len(files): break
-
-        miss = [ idx for idx, exist in enumerate(filexist) if not exist ]
-        status_str = f"exists:{filexist.count(True)}; miss:{miss}"
-        self.addlog(999,'CMD',f"Checking {basefile} ({status_str}) \n{' '*15}from {dirname} at {wait_time} seconds:")
-        #for idx, exist in enumerate(filexist):
-        #    if not exist:
-        #        self.addlog(999,'CMD',f"{idx:02d}: {os.path.basename(files[idx])} not exist ...")
-        time.sleep(waittick)
-        wait_time += waittick
-    else:   ## We have waitted too long
-        self.addlog(1,'CMD',f'Job "{jobname}" waiting for {basefile} from {dirname} exceeded {maxwaitexist} seconds.\n')
-        for idx, exist in enumerate(filexist):
-            if not exist:
-                self.addlog(1,'CMD',f"{idx:02d}: {os.path.basename(files[idx])} not exist.")
-        return filexist.count(True)
+    with FileWatcher(files) as watcher:
+        start = time.time()
+        while wait_time < maxwaitexist and self.keep_waiting:
+            stats    = watcher.scan()
+            filexist = [filepath in stats for filepath in files]
+            if filexist.count(True) == len(files): break
+
+            miss = [ idx for idx, exist in enumerate(filexist) if not exist ]
+            status_str = f"exists:{filexist.count(True)}; miss:{miss}"
+            self.addlog(999,'CMD',f"Checking {basefile} ({status_str}) \n{' '*15}from {dirname} at {wait_time:.0f} seconds:")
+            #for idx, exist in enumerate(filexist):
+            #    if not exist:
+            #        self.addlog(999,'CMD',f"{idx:02d}: {os.path.basename(files[idx])} not exist ...")
+            watcher.wait(min(waittick,maxwaitexist-wait_time))
+            wait_time = time.time()-start
+        else:   ## We have waitted too long
+            self.addlog(1,'CMD',f'Job "{jobname}" waiting for {basefile} from {dirname} exceeded {maxwaitexist} seconds.\n')
+            for idx, exist in enumerate(filexist):
+                if not exist:
+                    self.addlog(1,'CMD',f"{idx:02d}: {os.path.basename(files[idx])} not exist.")
+            return filexist.count(True)
+        ##
+        ## Secondly, file should be stable for manipulating if requested for a check
+        ##
+        #  Check whether other process is writing this file
+        #  The file is stable once its writer closed it, or when it did not
+        #  change for "waittick" seconds (see FileWatcher.settled).
+        #
+        multiple = 24     # multipulor of wait tick for which file is condisdered old
+                          # so not further stability checking
+        if skipread:
+            return filexist.count(True)
+
+        epoch   = datetime.utcfromtimestamp(0)
+        currUTC = datetime.utcnow()
+        lasts   = [stats[filepath][0] for filepath in files]
+        fileages= [(currUTC-epoch).total_seconds()-last for last in lasts]
+
+        tasks = []
+        waitfiles = []
+        for idx, fileage in enumerate(fileages):
+            if fileage < multiple*waittick:  # only wait for newer file
+                tasks.append(idx)
+                waitfiles.append(files[idx])
+
+        if len(waitfiles) > 0:
+            lasts     = [stats[filepath][0] for filepath in waitfiles]
+            wait_time = 0
+            start     = time.time()
+            sinces    = [start]*len(waitfiles)
+            readys    = [False]*len(waitfiles)
+            while wait_time < maxwaitready and self.keep_waiting:
+                waitleft = max(sinces)+waittick-time.time()    # until the last change settles
+                watcher.wait(waitleft if waitleft > 0 else waittick)
+                now       = time.time()
+                wait_time = now-start
+                stats    = watcher.scan()
+                currents = [stats.get(filepath,(None,0))[0] for filepath in waitfiles]
+                sinces   = [since if last == current else now for last, current, since in zip(lasts, currents, sinces)]
+                readys   = [current is not None and watcher.settled(filepath,since,waittick,now)
+                            for filepath, last, current, since in zip(waitfiles, lasts, currents, sinces)]
+                if readys.count(True) == len(waitfiles):
+                    if expectSize > 0:
+                        fsizes = [stats.get(filepath,(None,0))[1] for filepath in waitfiles]
+                        readys = [fsize > expectSize*1024 for fsize in fsizes]
+                        if readys.count(True) == len(waitfiles):
+                            #self.addlog(999,'CMD',f"Checking ({basefile}) in <{dirname}> after {wait_time} seconds." )
+                            self.addlog(999,'CMD',f"All {basefile} in <{dirname}> are ready after {wait_time:.0f} seconds.")
+                            #for idx, filepath in enumerate(waitfiles):
+                            #    self.addlog(999,'CMD',f"{idx:02d}: <{os.path.basename(filepath)}> now has size ({fsizes[idx]} bytes)." )
+                        else:
+                            smallsize = [idx for idx, ready in zip(tasks,readys) if not ready]
+                            self.addlog(999,'CMD',f"Files from {smallsize} in {dirname} are not large enough after {wait_time:.0f} seconds. Keep Waiting ...")
+                            #for idx, sizeready in enumerate(readys):
+                            #    if not sizeready:
+                            #        self.addlog(999,'CMD',f"<{waitfiles[idx]}> is still too small ({fsizes[idx]} bytes) after {wait_time} seconds. Keep Waiting ..." )
+                            continue
+
+                    self.addlog(0,'CMD',f"Files {basefile} in <{dirname}> are now stable after {wait_time:.0f} seconds:")
+                    #for filepath in waitfiles:
+                    #    self.addlog(0,'CMD',f"<{os.path.basename(filepath)}> is now ready.")
+                    #break
+                    return len(files)
+
+                changing = [idx for idx, ready in zip(tasks,readys) if not ready]
+                self.addlog(999,'CMD',f"Files from {changing} in {dirname} are actively changing after {wait_time:.0f} seconds.")
+                #for idx, ready in enumerate(readys):
+                #    if not ready:
+                #        self.addlog(999,'CMD',f"<{waitfiles[idx]}> is actively changing after {wait_time} seconds.")
+                lasts = currents
+
+            else :   ## We have waitted too long
+                for idx,ready in enumerate(readys):
+                    if not ready:
+                        self.addlog(1,'CMD', f'Job "{jobname}" waiting for file <{waitfiles[idx]}> ready exceeded {maxwaitready} seconds.\n')
+                return readys.count(True)
+
+        else:
+            #self.addlog(999,'CMD',"<%s> is (%d seconds) old > %d * tick (%d seconds). No further checking."%(filepath,fileage,multiple,waittick) )
+            #for filepath in files:
+            #    self.addlog(999,'CMD',f"{filepath} is ready." )
+            self.addlog(999,'CMD',f"All {basefile} in {dirname} are ready." )
+            return len(files)
+
+  #enddef wait_for_files
+
+  ################# Yield files as they are ready ######################
+
+  def as_files_ready(self,jobname,files,
+                     deadline=10800,maxwaitready=3600,waittick=10,
+                     skipread=False,expectSize=0):
+    """
+       Generator of (filepath, True) for each file in "files" as soon as it
+       is ready for reading/copying, in the order they become ready.
+
+       The readiness check is the same as wait_for_files. When "deadline"
+       seconds passed, the files that are still missing are reported and
+       yielded as (filepath, False). Like the "maxwaitexist" of
+       wait_for_files, the deadline only applies to the appearance of the
+       files, those being written are waited for up to "maxwaitready"
+       seconds since they were found.
+
+       Usage:
+         for filepath, ready in command.as_files_ready(...):
+             if ready: link/copy/submit it while waiting for others
+    """
+
+    for readys, fails in self.files_ready_by_pass(jobname,files,deadline,
+                                   maxwaitready,waittick,skipread,expectSize):
+        for filepath in readys:
+            yield filepath, True
+        for filepath in fails:
+            yield filepath, False
+
+  #enddef as_files_ready
+
+  def files_ready_by_pass(self,jobname,files,
+                     deadline=10800,maxwaitready=3600,waittick=10,
+                     skipread=False,expectSize=0,giveup=None):
+    """
+       Same as as_files_ready, but yields (readys, fails) once for each
+       pass over the files that has something to report, so that the
+       caller can handle all files that became ready together.
+
+       giveup : optional function of a pending file, the files for which
+                it returns True are not waited for any longer and are
+                reported in "fails"
+    """
+
+    if self.showonly:
+        yield list(dict.fromkeys(files)), []
+        return
+
+    if deadline is None:
+       deadline = sys.maxsize
+    if maxwaitready is None:
+       maxwaitready = sys.maxsize
+
+    multiple = 24     # multipulor of wait tick for which file is condisdered old
+
+    basefile = os.path.basename(files[0])
+    dirname  = re.sub(r"_\d{1,3}$","_*",os.path.dirname(files[0]))
+
+    pending  = list(dict.fromkeys(files))       # unique, keep order
+    seen     = {}                 # filepath: (mtime, size, stable since, first seen)
+
+    with FileWatcher(pending) as watcher:
+        start = time.time()
+        while len(pending) > 0 and self.keep_waiting:
+            now   = time.time()
+            stats = watcher.scan()
+            readys  = []
+            toolong = []          # files exceeded maxwaitready
+            for filepath in pending:
+                if filepath not in stats: continue
+
+                mtime, fsize = stats[filepath]
+                if skipread or now-mtime >= multiple*waittick:   # old file, no further checking
+                    readys.append(filepath)
+                    continue
+
+                if filepath not in seen or seen[filepath][0] != mtime:
+                    seen[filepath] = (mtime, fsize, now, seen.get(filepath,(0,0,0,now))[3])
+                if watcher.settled(filepath,seen[filepath][2],waittick,now) and fsize >= expectSize*1024:
+                    readys.append(filepath)
+                    continue
+
+                if now-seen[filepath][3] > maxwaitready:    # still changing or too small
+                    toolong.append(filepath)
+
+            for filepath in readys+toolong:
+                pending.remove(filepath)
+
+            for filepath in readys:
+                self.addlog(999,'CMD',f"<{filepath}> is ready after {now-start:.0f} seconds." )
+
+            for filepath in toolong:
+                self.addlog(1,'CMD',f'Job "{jobname}" waiting for file <{filepath}> ready exceeded {maxwaitready} seconds.')
+
+            if giveup is not None:
+                for filepath in [filepath for filepath in pending if giveup(filepath)]:
+                    pending.remove(filepath)
+                    toolong.append(filepath)
+
+            waitleft = deadline-(time.time()-start)
+            if waitleft <= 0:
+                missing = [filepath for filepath in pending if filepath not in seen]
+                if len(missing) > 0:
+                    self.addlog(1,'CMD',f'Job "{jobname}" waiting for {basefile} from {dirname} exceeded {deadline} seconds, {len(missing)} not exist:')
+                    for filepath in missing:
+                        self.addlog(1,'CMD',f"    {filepath} (not exist)")
+                        pending.remove(filepath)
+                        toolong.append(filepath)
+                waitleft = waittick       # files being written, up to maxwaitready
+
+            if len(readys) > 0 or len(toolong) > 0:
+                yield readys, toolong
+
+            if len(pending) == 0: break
+
+            watcher.wait(min(waittick,waitleft))
+
     ##
-    ## Secondly, file should be stable for manipulating if requested for a check
+    ## Report stragglers when the waiting is stopped
     ##
-    #  Check whether other process is writing this file
-    #  If the file exists but is changing continuously, wait "waittick" seconds
-    #  and check again until it's stable within "waittick" seconds.
-    #
-    multiple = 24     # multipulor of wait tick for which file is condisdered old
-                      # so not further stability checking
-    if skipread:
-        return filexist.count(True)
-
-    epoch   = datetime.utcfromtimestamp(0)
-    currUTC = datetime.utcnow()
-    lasts   = [os.path.getmtime(filepath) for filepath in files]
-    fileages= [(currUTC-epoch).total_seconds()-last for last in lasts]
-
-    tasks = []
-    waitfiles = []
-    for idx, fileage in enumerate(fileages):
-        if fileage < multiple*waittick:  # only wait for newer file
-            tasks.append(idx)
-            waitfiles.append(files[idx])
-
-    if len(waitfiles) > 0:
-        lasts     = [os.path.getmtime(filepath) for filepath in waitfiles]
-        wait_time = 0
-        while wait_time < maxwaitready and self.keep_waiting:
-            time.sleep(waittick)
-            wait_time += waittick
-            currents = [os.path.getmtime(filepath) for filepath in waitfiles]
-            readys   = [last == current for last, current in zip(lasts, currents)]
-            if readys.count(True) == len(waitfiles):
-                if expectSize > 0:
-                    fsizes = [os.path.getsize(filepath) for filepath in waitfiles]
-                    readys = [fsize > expectSize*1024 for fsize in fsizes]
-                    if readys.count(True) == len(waitfiles):
-                        #self.addlog(999,'CMD',f"Checking ({basefile}) in <{dirname}> after {wait_time} seconds." )
-                        self.addlog(999,'CMD',f"All {basefile} in <{dirname}> are ready after {wait_time} seconds.")
-                        #for idx, filepath in enumerate(waitfiles):
-                        #    self.addlog(999,'CMD',f"{idx:02d}: <{os.path.basename(filepath)}> now has size ({fsizes[idx]} bytes)." )
-                    else:
-                        smallsize = [idx for idx, ready in zip(tasks,readys) if not ready]
-                        self.addlog(999,'CMD',f"Files from {smallsize} in {dirname} are not large enough after {wait_time} seconds. Keep Waiting ...")
-                        #for idx, sizeready in enumerate(readys):
-                        #    if not sizeready:
-                        #        self.addlog(999,'CMD',f"<{waitfiles[idx]}> is still too small ({fsizes[idx]} bytes) after {wait_time} seconds. Keep Waiting ..." )
+    if len(pending) > 0:
+        self.addlog(1,'CMD',f'Job "{jobname}" stopped waiting for {basefile} from {dirname}, {len(pending)} not ready:')
+        for filepath in pending:
+            state = "changing" if filepath in seen else "not exist"
+            self.addlog(1,'CMD',f"    {filepath} ({state})")
+        yield [], pending
+
+  #enddef files_ready_by_pass
+
+#endclass baseConfigurator
+
+##%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# Watch a group of files for appearance/modification
+#
+##%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class FileWatcher:
+    ''' Watch a list of files by their parent directories.
+
+        On Linux, one inotify instance per process is shared by all
+        watchers, a daemon thread reads its events and wakes up the
+        watchers of the files that are created, moved in or closed after
+        writing. Writes (IN_MODIFY) are recorded without waking up, they
+        only restart the stability period of the file (see settled).
+
+        Events are not delivered for writes from other nodes on network
+        file systems, so wait() always returns after at most "timeout"
+        seconds and the caller should rescan, settled() then falls back to
+        an unchanged mtime.
+
+        scan() does one os.scandir per directory per call instead of
+        one os.path.exists/getmtime for each file.
+    '''
+
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_IGNORED     = 0x00008000
+
+    WAKEUP = IN_CREATE|IN_MOVED_TO|IN_CLOSE_WRITE
+
+    _libc = None
+    _libc_checked = False
+    _libc_mutex   = threading.Lock()
+
+    _mutex    = threading.Lock()  # guards the shared instance below
+    _fd       = None              # shared inotify instance of this process
+    _pid      = None              # process that owns _fd
+    _wds      = {}                # wd -> set of dirnames
+    _dirwds   = {}                # dirname -> wd
+    _refs     = {}                # dirname -> number of watchers
+    _watchers = set()
+
+    def __init__(self, files):
+        self.dirs  = {}            # dirname -> {basename: filepath}
+        for filepath in files:
+            dirname  = os.path.dirname(filepath) or '.'
+            basename = os.path.basename(filepath)
+            self.dirs.setdefault(dirname,{})[basename] = filepath
+
+        self.wds    = set()        # dirnames watched for this watcher
+        self.events = {}           # filepath -> (time, closed) of its last event
+        self.woken  = threading.Event()
+
+        if FileWatcher.start() is not None:
+            with FileWatcher._mutex:
+                FileWatcher._watchers.add(self)
+            self.add_watches()
+
+    #enddef __init__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @classmethod
+    def load_libc(cls):
+        ''' Find inotify functions in libc, None if it is not available '''
+        with cls._libc_mutex:
+            if not cls._libc_checked:
+                cls._libc_checked = True
+                try:
+                    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                    libc.inotify_init1.argtypes     = [ctypes.c_int]
+                    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                    libc.inotify_rm_watch.argtypes  = [ctypes.c_int, ctypes.c_int]
+                    cls._libc = libc
+                except (OSError, AttributeError):
+                    cls._libc = None
+        return cls._libc
+
+    #enddef load_libc
+
+    @classmethod
+    def start(cls):
+        ''' Create the inotify instance of this process and its reader
+            thread on first use, return its fd or None without inotify '''
+        libc = cls.load_libc()
+        if libc is None: return None
+
+        with cls._mutex:
+            if cls._pid != os.getpid():          # first use, or a forked child
+                cls._pid = os.getpid()
+                cls._wds, cls._dirwds, cls._refs, cls._watchers = {}, {}, {}, set()
+                fd = libc.inotify_init1(os.O_NONBLOCK|os.O_CLOEXEC)
+                cls._fd = fd if fd >= 0 else None
+                if cls._fd is not None:
+                    threading.Thread(target=cls.dispatch,args=(cls._fd,),
+                                     name='FileWatcher',daemon=True).start()
+            return cls._fd
+
+    #enddef start
+
+    @classmethod
+    def dispatch(cls, fd):
+        ''' Read the events of the shared instance and pass them to the watchers '''
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        while True:
+            poller.poll()
+            try:
+                buf = os.read(fd, 65536)
+            except BlockingIOError:
+                continue
+            except OSError:
+                break
+
+            now = time.time()
+            with cls._mutex:
+                offset = 0
+                while offset + 16 <= len(buf):
+                    wd, mask, cookie, nlen = struct.unpack_from('iIII',buf,offset)
+                    name = buf[offset+16:offset+16+nlen].rstrip(b'\0').decode(errors='replace')
+                    offset += 16+nlen
+
+                    if mask & cls.IN_IGNORED:        # directory removed, watch is gone
+                        for dirname in cls._wds.pop(wd,()):
+                            cls._dirwds.pop(dirname,None)
                         continue
 
-                self.addlog(0,'CMD',f"Files {basefile} in <{dirname}> are now stable after {wait_time} seconds:")
-                #for filepath in waitfiles:
-                #    self.addlog(0,'CMD',f"<{os.path.basename(filepath)}> is now ready.")
-                #break
-                return len(files)
-
-            changing = [idx for idx, ready in zip(tasks,readys) if not ready]
-            self.addlog(999,'CMD',f"Files from {changing} in {dirname} are actively changing after {wait_time} seconds.")
-            #for idx, ready in enumerate(readys):
-            #    if not ready:
-            #        self.addlog(999,'CMD',f"<{waitfiles[idx]}> is actively changing after {wait_time} seconds.")
-            lasts = currents
-
-        else :   ## We have waitted too long
-            for idx,ready in enumerate(readys):
-                if not ready:
-                    self.addlog(1,'CMD', f'Job "{jobname}" waiting for file <waitfiles[idx]> ready exceeded {maxwaitready} seconds.\n')
-            return readys.count(True)
+                    for dirname in cls._wds.get(wd,()):
+                        for watcher in cls._watchers:
+                            filepath = watcher.dirs.get(dirname,{}).get(name)
+                            if filepath is not None:
+                                watcher.notify(filepath,mask,now)
+
+    #enddef dispatch
+
+    def notify(self, filepath, mask, now):
+        ''' Record an event of "filepath", called by the reader thread '''
+        self.events[filepath] = (now, bool(mask & (self.IN_CLOSE_WRITE|self.IN_MOVED_TO)))
+        if mask & self.WAKEUP:
+            self.woken.set()
+
+    #enddef notify
+
+    def add_watches(self):
+        ''' Add a watch for each directory that exists but is not watched yet '''
+        cls = FileWatcher
+        if self not in cls._watchers: return
+
+        mask = self.IN_CREATE|self.IN_MOVED_TO|self.IN_CLOSE_WRITE|self.IN_MODIFY|self.IN_ATTRIB
+        with cls._mutex:
+            for dirname in self.dirs:
+                if dirname not in cls._dirwds:     # not watched yet, or removed and created again
+                    if not os.path.isdir(dirname): continue
+                    wd = self._libc.inotify_add_watch(cls._fd, os.fsencode(dirname), mask)
+                    if wd < 0: continue
+                    cls._dirwds[dirname] = wd
+                    cls._wds.setdefault(wd,set()).add(dirname)
+
+                if dirname not in self.wds:
+                    self.wds.add(dirname)
+                    cls._refs[dirname] = cls._refs.get(dirname,0)+1
+
+    #enddef add_watches
+
+    def scan(self):
+        ''' Return {filepath: (mtime, size)} for the watched files that exist '''
+        stats = {}
+        for dirname, names in self.dirs.items():
+            try:
+                if len(names) == 1:    # one file, a stat is cheaper than listing the directory
+                    (basename, filepath), = names.items()
+                    fstat = os.stat(filepath)
+                    stats[filepath] = (fstat.st_mtime, fstat.st_size)
+                else:
+                    with os.scandir(dirname) as entries:
+                        for entry in entries:
+                            if entry.name in names:
+                                try:
+                                    fstat = entry.stat()
+                                except OSError:          # dangling link or just removed
+                                    continue
+                                stats[names[entry.name]] = (fstat.st_mtime, fstat.st_size)
+            except OSError:
+                pass
+
+        self.add_watches()   # pick up directories created since last scan
+        return stats
+
+    #enddef scan
+
+    def settled(self, filepath, since, quiet, now):
+        ''' Whether "filepath" stopped changing, "since" is the time its
+            current mtime was first seen.
+
+            It is settled when its writer closed it (or it was moved in)
+            with no write after that, otherwise when neither a write event
+            nor a new mtime was seen for "quiet" seconds.
+        '''
+        evtime, closed = self.events.get(filepath,(0.0,False))
+        if closed: return True
+        return now-max(since,evtime) >= quiet
 
-    else:
-        #self.addlog(999,'CMD',"<%s> is (%d seconds) old > %d * tick (%d seconds). No further checking."%(filepath,fileage,multiple,waittick) )
-        #for filepath in files:
-        #    self.addlog(999,'CMD',f"{filepath} is ready." )
-        self.addlog(999,'CMD',f"All {basefile} in {dirname} are ready." )
-        return len(files)
+    #enddef settled
 
-  #enddef wait_for_files
+    def wait(self, timeout):
+        ''' Block until a watched file is created/closed or timeout seconds passed.
 
-#endclass baseConfigurator
+            return True if woke up by an event for one of the watched files.
+        '''
+        if timeout <= 0: return False
+
+        if not self.wds:
+            time.sleep(timeout)
+            return False
+
+        woke = self.woken.wait(timeout)
+        self.woken.clear()
+        return woke
+
+    #enddef wait
+
+    def close(self):
+        ''' Release the watches of this watcher '''
+        cls = FileWatcher
+        with cls._mutex:
+            cls._watchers.discard(self)
+            for dirname in self.wds:
+                cls._refs[dirname] -= 1
+                if cls._refs[dirname] > 0: continue
+
+                del cls._refs[dirname]
+                wd = cls._dirwds.pop(dirname,None)
+                if wd is None: continue          # already gone with its directory
+                cls._wds[wd].discard(dirname)
+                if not cls._wds[wd]:
+                    del cls._wds[wd]
+                    self._libc.inotify_rm_watch(cls._fd, wd)
+            self.wds = set()
+
+    #enddef close
+
+#endclass FileWatcher
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# Copy files with a bounded pool of threads
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class StagingEngine:
+    ''' Stage (copy) many files at once.
+
+        A file is hard linked when it is on the same file system as its
+        destination, otherwise it is copied in the kernel with
+        os.copy_file_range or os.sendfile, falling back to a plain copy.
+        The size of each staged file is verified against its source.
+    '''
+
+    def __init__(self, maxworkers=8):
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=maxworkers, thread_name_prefix='stage')
+
+    #enddef __init__
+
+    def stage(self, pairs, link=True, cache=None):
+        ''' Stage [(srcfile, destfile), ...] and wait for all of them,
+            through "cache" (ObsCache) if it is given.
+
+            Return (staged destination files, number of bytes,
+                    elapsed seconds, [(srcfile, error)])
+        '''
+        stager  = self.stage_a_file if cache is None else cache.fetch
+
+        time0   = time.time()
+        futures = [(srcfile, destfile, self.executor.submit(stager, srcfile, destfile, link))
+                   for srcfile, destfile in pairs]
+
+        staged = []
+        errors = []
+        nbytes = 0
+        for srcfile, destfile, future in futures:
+            try:
+                nbytes += future.result()
+                staged.append(destfile)
+            except OSError as ex:
+                errors.append((srcfile, ex))
+
+        return staged, nbytes, time.time()-time0, errors
+
+    #enddef stage
+
+    @staticmethod
+    def stage_a_file(srcfile, destfile, link=True):
+        ''' Stage one file and return its size in bytes '''
+        srcstat = os.stat(srcfile)
+        if os.path.lexists(destfile): os.unlink(destfile)
+
+        destdir = os.path.dirname(os.path.abspath(destfile))
+        if link and os.stat(destdir).st_dev == srcstat.st_dev:
+            try:
+                os.link(srcfile, destfile)
+                return srcstat.st_size
+            except OSError:       # e.g. hard link is not permitted, do a copy
+                pass
+
+        StagingEngine.fastcopy(srcfile, destfile, srcstat.st_size)
+        shutil.copymode(srcfile, destfile)
+
+        destsize = os.stat(destfile).st_size
+        if destsize != srcstat.st_size:
+            raise OSError(f'size of <{destfile}> is {destsize}, expected {srcstat.st_size}')
+        return destsize
+
+    #enddef stage_a_file
+
+    @staticmethod
+    def fastcopy(srcfile, destfile, size):
+        ''' Copy "size" bytes of srcfile to destfile without going through user space '''
+        with open(srcfile, 'rb') as fsrc, open(destfile, 'wb') as fdst:
+            infd  = fsrc.fileno()
+            outfd = fdst.fileno()
+            copied = 0
+            try:
+                while copied < size:
+                    if hasattr(os, 'copy_file_range'):
+                        nbytes = os.copy_file_range(infd, outfd, size-copied)
+                    else:
+                        nbytes = os.sendfile(outfd, infd, copied, size-copied)
+                    if nbytes == 0: break
+                    copied += nbytes
+            except OSError:       # not supported between these file systems
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+                shutil.copyfileobj(fsrc, fdst, 1024*1024)
+
+    #enddef fastcopy
+
+    @staticmethod
+    def gunzip(pairs, maxworkers=8):
+        ''' Decompress [(srcfile, destfile), ...] in a process pool,
+            return [(srcfile, error)] for those failed
+        '''
+        if len(pairs) == 0: return []
+
+        # the driver is multithreaded, do not fork it for the workers
+        methods = multiprocessing.get_all_start_methods()
+        mpctx   = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+        fails = []
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(maxworkers,len(pairs)),
+                                                    mp_context=mpctx) as pool:
+            futures = [(srcfile, pool.submit(StagingEngine.gunzip_a_file, srcfile, destfile))
+                       for srcfile, destfile in pairs]
+            for srcfile, future in futures:
+                try:
+                    future.result()
+                except (OSError, EOFError) as ex:
+                    fails.append((srcfile, ex))
+        return fails
+
+    #enddef gunzip
+
+    @staticmethod
+    def gunzip_a_file(srcfile, destfile, bufsize=4*1024*1024):
+        ''' Decompress one file, the result takes the modification time of
+            srcfile and replaces destfile in one step
+        '''
+        tmpfile = f'{destfile}.{os.getpid()}.tmp'
+        with gzip.open(srcfile, 'rb') as fsrc, open(tmpfile, 'wb') as fdst:
+            shutil.copyfileobj(fsrc, fdst, bufsize)
+
+        srcstat = os.stat(srcfile)
+        os.utime(tmpfile, ns=(srcstat.st_atime_ns, srcstat.st_mtime_ns))
+        os.replace(tmpfile, destfile)
+        return os.stat(destfile).st_size
+
+    #enddef gunzip_a_file
+
+    @staticmethod
+    def gunzip_is_current(srcfile, destfile):
+        ''' Whether destfile is already decompressed from the current srcfile,
+            by modification time and the uncompressed size in the gzip trailer
+        '''
+        try:
+            srcstat  = os.stat(srcfile)
+            deststat = os.stat(destfile)
+            if deststat.st_mtime_ns != srcstat.st_mtime_ns: return False
+            with open(srcfile, 'rb') as fsrc:
+                fsrc.seek(-4, os.SEEK_END)
+                isize = struct.unpack('<I', fsrc.read(4))[0]     # size modulo 2^32
+        except OSError:
+            return False
+        return deststat.st_size % 2**32 == isize
+
+    #enddef gunzip_is_current
+
+#endclass StagingEngine
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# Observation files cache shared by all domains and cycles
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class ObsCache:
+    ''' Files copied once into "cachedir" and linked into each work directory.
+
+        An entry is keyed by the source path, size and modification time,
+        so a changed source file is a miss. The least recently used entries
+        are removed when the cache holds more than "budget" bytes. The work
+        directories get hard links when possible, a symbolic link only when
+        the cache is on a different file system. Entries symbolically linked
+        by this run are never removed, the work directories still use them.
+    '''
+
+    def __init__(self, cachedir, budget):
+        self.cachedir = cachedir
+        self.budget   = budget
+        self.mutex    = threading.Lock()
+
+        self.hits     = 0
+        self.misses   = 0
+        self.hitbytes = 0
+
+        self.pinned   = set()       # keys symbolically linked by this run
+
+        os.makedirs(cachedir, exist_ok=True)
+
+        # entries from earlier runs, the oldest copied first. The order of
+        # use is kept in this index only, the files are not touched on a hit
+        self.entries  = collections.OrderedDict()   # key -> size
+        self.nbytes   = 0
+        with os.scandir(cachedir) as it:
+            stats = [(entry.name, entry.stat()) for entry in it
+                     if entry.is_file() and not entry.name.endswith('.tmp')]
+        for key, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+            self.entries[key] = stat.st_size
+            self.nbytes += stat.st_size
+
+    #enddef __init__
+
+    def fetch(self, srcfile, destfile, link=True):
+        ''' Link the cached copy of srcfile to destfile, copy it into
+            the cache first on a miss. Return the file size in bytes.
+        '''
+        srcstat   = os.stat(srcfile)
+        srckey    = f'{os.path.abspath(srcfile)}:{srcstat.st_size}:{srcstat.st_mtime_ns}'
+        key       = hashlib.sha1(srckey.encode()).hexdigest()
+        cachefile = os.path.join(self.cachedir, key)
+
+        with self.mutex:
+            hit = key in self.entries and os.path.exists(cachefile)
+            if hit:
+                self.entries.move_to_end(key)     # most recently used
+                self.hits     += 1
+                self.hitbytes += srcstat.st_size
+                self.pin(key, cachefile, destfile)   # evict() of other threads waits
+
+        if not hit:
+            tmpfile = f'{cachefile}.{os.getpid()}.{threading.get_ident()}.tmp'
+            StagingEngine.stage_a_file(srcfile, tmpfile, link=False)
+            with self.mutex:
+                os.replace(tmpfile, cachefile)
+                self.misses += 1
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                else:
+                    self.entries[key] = srcstat.st_size
+                    self.nbytes += srcstat.st_size
+                self.pin(key, cachefile, destfile)
+                self.evict()
+
+        return srcstat.st_size
+
+    #enddef fetch
+
+    @staticmethod
+    def link(cachefile, destfile):
+        ''' Hard link cachefile to destfile, a symbolic link only when
+            the cache is on another file system or hard links are not permitted
+        '''
+        if os.path.lexists(destfile): os.unlink(destfile)
+        try:
+            os.link(cachefile, destfile)
+        except OSError as ex:
+            if ex.errno not in (errno.EXDEV, errno.EPERM): raise
+            os.symlink(cachefile, destfile)
+
+    #enddef link
+
+    def pin(self, key, cachefile, destfile):
+        ''' Link an entry to destfile and keep it in the cache if the link
+            is symbolic, the caller must hold self.mutex
+        '''
+        self.link(cachefile, destfile)
+        if os.path.islink(destfile):
+            self.pinned.add(key)
+
+    #enddef pin
+
+    def evict(self):
+        ''' Remove the least recently used entries to be within budget,
+            except those pinned, the caller must hold self.mutex
+        '''
+        for key in list(self.entries):
+            if self.nbytes <= self.budget or len(self.entries) <= 1:
+                break
+            if key in self.pinned:
+                continue
+            self.nbytes -= self.entries.pop(key)
+            try:
+                os.unlink(os.path.join(self.cachedir, key))
+            except OSError:
+                pass
+
+    #enddef evict
+
+    def summary(self):
+        with self.mutex:
+            return (f'observation cache: {self.hits} hits ({self.hitbytes/1048576:.1f} MB), '
+                    f'{self.misses} misses, {len(self.entries)} files ({self.nbytes/1048576:.1f} MB) cached.')
+
+    #enddef summary
+
+#endclass ObsCache
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# In-memory index of radar data files
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class RadarCatalog:
+    ''' Radar files under "datdir/subdir" named as "filename".
+
+        "subdir" and "filename" are templates with {radar} and {time:...}
+        fields, "filename" may also contain glob wildcards. Each directory
+        is listed once per pass (at most once every "maxage" seconds) and
+        the time stamps are parsed out of the file names, so looking for a
+        radar file over a time range is answered from memory instead of
+        one glob for each radar and minute.
+
+        Use RadarCatalog.get() to share one catalog among the domain threads.
+    '''
+
+    _catalogs = {}
+    _mutex    = threading.Lock()
+
+    def __init__(self, datdir, subdir, filename, maxage=5):
+        self.datdir   = datdir
+        self.subdir   = subdir
+        self.maxage   = maxage
+
+        self.listings = {}         # dirpath -> (listing time, [names])
+        self.indexes  = {}         # (dirpath, radar) -> {time string: filepath}
+        self.mutex    = threading.Lock()
+
+        #
+        # Split the file name template, the time field is matched by its
+        # formatted width and the glob wildcards are kept as wildcards
+        #
+        self.timespec = ''
+        self.parts    = []         # [(literal regex, field name)]
+        for literal, field, spec, _conv in string.Formatter().parse(filename):
+            literal = re.escape(literal).replace(r'\?','.').replace(r'\*','.*')
+            if field is not None and field != 'radar':
+                field = 'time'
+                self.timespec = spec or ''
+            self.parts.append((literal, field))
+
+        self.timewidth = len(format(datetime(2000,1,1), self.timespec))
+
+    #enddef __init__
+
+    @classmethod
+    def get(cls, datdir, subdir, filename, maxage=5):
+        ''' Return the catalog shared by all threads for the same files '''
+        key = (datdir, subdir, filename, maxage)
+        with cls._mutex:
+            if key not in cls._catalogs:
+                cls._catalogs[key] = cls(datdir, subdir, filename, maxage)
+            return cls._catalogs[key]
+
+    #enddef get
+
+    def index(self, dirpath, radar):
+        ''' Return {time string: filepath} of "radar" in "dirpath" '''
+        with self.mutex:
+            now = time.time()
+            listed = self.listings.get(dirpath)
+            if listed is None or now-listed[0] > self.maxage:
+                try:
+                    names = sorted(entry.name for entry in os.scandir(dirpath))
+                except OSError:
+                    names = []
+                self.listings[dirpath] = (now, names)
+                for key in [key for key in self.indexes if key[0] == dirpath]:
+                    del self.indexes[key]
+
+            if (dirpath, radar) not in self.indexes:
+                pattern = ''
+                for literal, field in self.parts:
+                    pattern += literal
+                    if field == 'radar':
+                        pattern += re.escape(radar)
+                    elif field == 'time':
+                        pattern += f'(?P<time>.{{{self.timewidth}}})'
+                namere = re.compile(pattern)
+
+                files = {}
+                for name in self.listings[dirpath][1]:
+                    match = namere.fullmatch(name)
+                    if match:
+                        timestr = match.group('time') if 'time' in namere.groupindex else ''
+                        files.setdefault(timestr, os.path.join(dirpath, name))
+                self.indexes[(dirpath, radar)] = files
+
+            return self.indexes[(dirpath, radar)]
+
+    #enddef index
+
+    def nearest(self, radar, startime, timerange):
+        ''' Return the file of "radar" for the first time in "timerange"
+            (minutes relative to "startime") that has one, or None
+        '''
+        for timemin in timerange:
+            currTime = startime+timedelta(minutes=timemin)
+            dirpath  = os.path.join(self.datdir, self.subdir.format(radar=radar, time=currTime))
+            files    = self.index(dirpath, radar)
+            timestr  = format(currTime, self.timespec)
+            if timestr in files:
+                return files[timestr]
+        return None
+
+    #enddef nearest
+
+#endclass RadarCatalog
 
 #%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 #
@@ -514,6 +1432,10 @@ class baseConfigurator :
 
 class JobID(dict):
 
+    TASK_START = 1      # flags of task state in a job array
+    TASK_DONE  = 2
+    TASK_ERROR = 4
+
     def __init__(self,name,wrkdir,machine,jobconf,jobid=None,sfunction=None) :
         ''' Only initialize JobID at creation
             Once created, only "status" can be changed using attribute method
@@ -536,10 +1458,14 @@ class JobID(dict):
         self['status']  = None
         self['numtry']  = 1
         self['statuscmd'] = sfunction   # function to check job status
+        self['status_ens'] = ""         # task summary of a job array
 
         if jobconf.numens is not None:
             self['tasks'] = list(range(0,jobconf.numens+1))
             self['failtasks'] = []
+            self['states']  = bytearray(len(self['tasks']))   # TASK_* flags of each task
+            self['stateid'] = jobid     # job id that "states" belongs to
+            self['history'] = []        # (time, status) at each status change
 
         #if machine is not None:
         #    self['script']  = "%s.%s"% (name,machine.schjobext)
@@ -594,7 +1520,9 @@ class JobID(dict):
           Update the job status
 
           if "statuscmd" presents, use it (cmd.get_job_status)
-          else use file detect method by default
+          else use file detect method by default. Job arrays always use
+          the file detect method for the state of each task, "statuscmd"
+          is only used to find the tasks killed by the scheduler.
 
           return  0 : job done
                  -6 : job error
@@ -608,7 +1536,15 @@ class JobID(dict):
           if self.id is None :
               self["status"] = None
           else:
-              if self.statuscmd is None:
+              if self.config.numens is None and self.statuscmd is not None:
+                  # the job script writes the error file when it failed but
+                  # may still exit normally as far as the scheduler knows
+                  errorfile = os.path.join(self.wrkdir,f'error.{self.name}.{self.id}')
+                  if os.path.lexists(errorfile):
+                      self["status"] = -6
+                  else:
+                      self["status"] = self.statuscmd(self.id)
+              else:
                   if self.config.numens is None:  # one single job
                     startfile = os.path.join(self.wrkdir,f'start.{self.name}.{self.id}')
                     donefile  = os.path.join(self.wrkdir,f'done.{self.name}.{self.id}')
@@ -630,17 +1566,16 @@ class JobID(dict):
                   else:   # job array
                     wrkdir = re.sub(r"_\d{1,3}$","",self.wrkdir)
 
-                    donefiles  = [os.path.join(f"{wrkdir}_{iens}",f'done.{self.name}.{self.id}_{iens}')  for iens in self.tasks]
-                    startfiles = [os.path.join(f"{wrkdir}_{iens}",f'start.{self.name}.{self.id}_{iens}') for iens in self.tasks]
-                    errorfiles = [os.path.join(f"{wrkdir}_{iens}",f'error.{self.name}.{self.id}_{iens}') for iens in self.tasks]
+                    states = self.scan_tasks(wrkdir)
                     #if outlog: self.cmd.addlog(999,'JobID',f"Waiting for {self.name}, current STATUS: {self.status}")
 
-                    done = [os.path.lexists(donefile)   for donefile  in donefiles  ]
-                    errr = [os.path.lexists(errfile)    for errfile   in errorfiles ]
-                    start = [os.path.lexists(startfile) for startfile in startfiles ]
+                    done  = [state & self.TASK_DONE  > 0 for state in states]
+                    errr  = [state & self.TASK_ERROR > 0 for state in states]
+                    start = [state & self.TASK_START > 0 for state in states]
 
                     self["status_ens"] = f"(done:{done.count(True)}; fail:{[i for i,x in zip(self.tasks,errr) if x]}; start:{start.count(True)})"
 
+                    startfiles = [os.path.join(f"{wrkdir}_{iens}",f'start.{self.name}.{self.id}_{iens}') for iens,x in zip(self.tasks,start) if x]
                     if done.count(True) == len(self.tasks):
                         self["status"] = 0
                         for startfile in startfiles:
@@ -662,10 +1597,59 @@ class JobID(dict):
                     else:
                         self["status"] = 9
 
-              else:
-                  self["status"] = self.statuscmd(self.id)
+                    #
+                    # Tasks that were killed by the scheduler (cancelled, timed out,
+                    # node failure etc.) never write their done/error files
+                    #
+                    if self.status > 0 and self.statuscmd is not None:
+                        schstatus = self.statuscmd(self.id)
+                        if schstatus is not None and schstatus <= 0:   # job left the queue
+                            self["failtasks"] = [i for i,x in zip(self.tasks,done) if not x]
+                            self["status"] = -1 if done.count(True) > 0 else -6
+                            for startfile in startfiles:
+                                if os.path.lexists(startfile): os.unlink(startfile)
+                            self.cmd.addlog(1,'JobID',f"<{self.name}> left the queue with tasks {self.failtasks} unfinished.")
+
+                    if len(self.history) == 0 or self.history[-1][1] != self.status:
+                        self.history.append((time.time(),self.status))
     #enddef update_status
 
+    def scan_tasks(self,wrkdir):
+        '''
+        Update the state flags of each task in a job array.
+
+        Only the tasks still unfinished are checked, for the sentinel
+        files they do not have yet. The member directories hold hundreds
+        of rsl.* files, so they are not listed.
+        '''
+
+        if self.stateid != self.id or len(self.states) != len(self.tasks):
+            self['states']  = bytearray(len(self.tasks))
+            self['stateid'] = self.id
+
+        states = self.states
+        finished = []
+        for i, iens in enumerate(self.tasks):
+            if states[i] & (self.TASK_DONE|self.TASK_ERROR): continue
+
+            flags = [ (f'done.{self.name}.{self.id}_{iens}',  self.TASK_DONE),
+                      (f'error.{self.name}.{self.id}_{iens}', self.TASK_ERROR),
+                      (f'start.{self.name}.{self.id}_{iens}', self.TASK_START) ]
+            state = states[i]
+            for filename, flag in flags:
+                if state & flag: continue          # started before
+                if os.path.lexists(os.path.join(f"{wrkdir}_{iens}",filename)):
+                    state |= flag
+
+            if state & (self.TASK_DONE|self.TASK_ERROR): finished.append(iens)
+            states[i] = state
+
+        if len(finished) > 0:
+            self.cmd.addlog(999,'JobID',f"<{self.name}> tasks {finished} finished.")
+
+        return states
+    #enddef scan_tasks
+
     def wait(self,maxwaittime):
         '''
              return status
@@ -753,6 +1737,103 @@ class JobID(dict):
 
 #endclass JobID
 
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# Job dependency graph of a workflow
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class JobGraph(dict):
+    ''' step name -> JobID of the job submitted for this step
+
+        Each step declares the upstream steps whose outputs are its inputs.
+        A step is submitted with a scheduler dependency on the upstream jobs
+        that are still in the queue, so the workflow only needs to block
+        where it has to inspect the results.
+
+        Edges in "permember" pair the tasks of two job arrays, i.e. task N
+        of the step starts as soon as task N of the upstream job is done.
+    '''
+
+    def __init__(self,command,steps,permember=()):
+        dict.__init__(self)
+        self.command = command
+        self.steps   = steps       # step: tuple of upstream steps
+        self.permember = set(permember)   # (upstep, step) edges between job arrays
+        self.depids  = {}          # step: upstream dependencies it was submitted with
+
+    def depends(self,step):
+        ''' Dependencies on the upstream jobs that are submitted but not done yet
+
+            return a list of "afterok:jobid" or "aftercorr:jobid"
+        '''
+        deps = []
+        for upstep in self.steps.get(step,()):
+            job = self.get(upstep)
+            if job is None or job.id is None: continue
+
+            job.update_status()
+            if job.status != 0:
+                deptype = 'aftercorr' if (upstep,step) in self.permember else 'afterok'
+                deps.append(f'{deptype}:{job.id}')
+        return deps
+    #enddef depends
+
+    def add(self,step,job,depends=None):
+        ''' Record the job submitted for step '''
+        if job is None: return
+        self[step] = job
+        self.depids[step] = list(depends or [])
+    #enddef add
+
+    def rechain(self):
+        '''
+        Submit again the jobs whose upstream jobs were resubmitted.
+        The scheduler has cancelled them because of an invalid dependency.
+        '''
+        for step, job in self.items():          # in submission order
+            upids = [self[upstep].id for upstep in self.steps.get(step,()) if upstep in self]
+            if all(dep.split(':')[-1] in upids for dep in self.depids.get(step,[])): continue
+
+            tasks = job.get('tasks')
+            if tasks is not None:                 # keep the tasks that are done already
+                wrkdir = re.sub(r"_\d{1,3}$","",job.wrkdir)
+                tasks  = [iens for iens,state in zip(tasks,job.scan_tasks(wrkdir)) if not state & job.TASK_DONE]
+                if len(tasks) == 0: continue
+
+            depends = self.depends(step)
+            self.command.addlog(0,'JobGraph',f'Resubmitting <{step}> because its upstream jobs were resubmitted.')
+            if hasattr(self.command,'cancel_job'): self.command.cancel_job(job.id)
+            newjob = self.command.submit_a_job(job.name,job.wrkdir,job.config,
+                                               tasks=tasks,depends=depends)
+            job["id"]     = newjob.id
+            job["status"] = 10
+            if tasks is not None: job["tasks"] = tasks
+            self.depids[step] = depends
+    #enddef rechain
+
+    def wait(self,step,maxwaittime=5*3600):
+        '''
+        Wait for step and all its upstream jobs to be done.
+
+        Failed jobs are resubmitted by wait_job and their dependent jobs
+        are submitted again. return True if step is done successfully or
+        it was not submitted through this graph.
+        '''
+        job = self.get(step)
+        if job is None: return True
+
+        for upstep in self.steps.get(step,()):
+            if not self.wait(upstep,maxwaittime): return False
+
+        self.rechain()
+        retvalue = self.command.wait_job(step,job,True,maxwaittime)
+        self.rechain()
+        return retvalue
+    #enddef wait
+
+#endclass JobGraph
+
 ##%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 class ConfDict(dict):
@@ -770,12 +1851,84 @@ class ConfDict(dict):
     def __setattr__(self, k, v):
         raise Exception("ConfDict attribute <%s> read only."%k)
 
+    # realpath -> (mtime_ns, size, sha1, JSON of the configuration)
+    loaded = {}
+    loadlock = threading.Lock()
+
     @classmethod
-    def fromfilename(cls, filename):
+    def fromfilename(cls, filename, cached=True):
+        ''' Load the YAML configuration in "filename".
+
+            With "cached", the parsed configuration is kept in memory and
+            saved as JSON next to the configuration as ".<name>.json". It is
+            reused while the file's mtime and size are unchanged, or its
+            SHA1 still matches after a touch. The JSON file is only read
+            when it is owned by this user or the owner of the configuration
+            and nobody else can write it. A configuration that JSON cannot
+            hold exactly, e.g. with YAML timestamps, is parsed every time.
+            Each call returns a fresh copy, so callers may modify it.
+        '''
+        if not cached:
+            with open(filename,'rb') as f:
+                return cls(cls.parseyaml(f.read(), filename))
+
+        realname  = os.path.realpath(filename)
+        cachefile = os.path.join(os.path.dirname(realname), f'.{os.path.basename(realname)}.json')
+
+        stat  = os.stat(realname)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with cls.loadlock:
+            entry = cls.loaded.get(realname)
+            if entry is None:
+                try:
+                    with open(cachefile,'r') as f:
+                        fstat = os.fstat(f.fileno())
+                        if fstat.st_uid in (os.getuid(), stat.st_uid) and not fstat.st_mode & 0o022:
+                            entry = tuple(json.load(f))
+                    if entry is not None and len(entry) != 4: entry = None
+                except (OSError, ValueError, TypeError):
+                    entry = None
+
+            if entry is None or tuple(entry[:2]) != stamp:
+                with open(realname,'rb') as f:
+                    content = f.read()
+                sha1 = hashlib.sha1(content).hexdigest()
+                if entry is None or entry[2] != sha1:
+                    config = cls.parseyaml(content, filename)
+                    try:
+                        text = json.dumps(config)
+                        if json.loads(text) != config: text = None
+                    except (TypeError, ValueError):     # e.g. datetime values
+                        text = None
+                    if text is None:
+                        return cls(config)
+                    entry  = (stamp[0], stamp[1], sha1, text)
+                else:                                   # touched only
+                    entry  = (stamp[0], stamp[1], sha1, entry[3])
+
+                tmpfile = f'{cachefile}.{os.getpid()}.tmp'
+                try:
+                    with open(tmpfile,'w') as f:
+                        os.fchmod(f.fileno(), 0o644)
+                        json.dump(entry, f)
+                    os.replace(tmpfile, cachefile)
+                except OSError:                         # read-only configuration directory
+                    pass
+
+            cls.loaded[realname] = entry
+
+        return cls(json.loads(entry[3]))
+
+    @staticmethod
+    def parseyaml(content, filename):
+        ''' Parse YAML "content" with the C loader when libyaml is available '''
         import yaml
-        with open(filename,'r') as f:
-            config = yaml.safe_load(f)
-        return cls(config)
+        loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+        config = yaml.load(content, Loader=loader)
+        if not isinstance(config, dict):
+            raise runException(f'Configuration file {filename} is not a YAML mapping')
+        return config
 
 #endclass ConfDict
 
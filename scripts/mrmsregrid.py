@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+## ---------------------------------------------------------------------
+##
+## This is a python library that interpolates MRMS mosaics to a model
+## grid with precomputed sparse weights.
+##
+## The MRMS grid and the model grid do not change within a day, so the
+## interpolation weights (nearest, bilinear or area average) are built
+## once as a CSR matrix, saved in a npz file keyed by both grids and
+## loaded memory-mapped afterwards. Each time step is then one sparse
+## matrix-vector product over the part of the mosaic that covers the
+## model domain.
+##
+## ---------------------------------------------------------------------
+##
+## Requirements:
+##
+##   o Python 3.6 or above
+##   o NumPy and netCDF4
+##   o SciPy (optional) for the sparse matrix-vector product
+##
+########################################################################
+
+import os, math, hashlib, threading
+import concurrent.futures
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
+
+try:
+    from scipy.sparse import csr_matrix
+except ImportError:
+    csr_matrix = None
+
+from nssldomains import GridGeometry
+
+EARTH_RADIUS = 6371000.0
+
+def is_netcdf(filename):
+    ''' Whether "filename" is a netCDF (classic or HDF5 based) file '''
+    try:
+        with open(filename,'rb') as fh:
+            magic = fh.read(4)
+    except OSError:
+        return False
+    return magic[:3] == b'CDF' or magic == b'\x89HDF'
+
+#enddef is_netcdf
+
+##%%%%%%%%%%%%%%%%%%%%%%%  class LatLonGrid %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class LatLonGrid:
+    #classbegin
+    ''' A regular latitude/longitude grid such as the MRMS mosaic.
+
+        Point (j,i) is at (lat0+j*dlat, lon0+i*dlon), dlat is negative
+        when the rows run from north to south.
+    '''
+
+    ##----------------------- Constructor  -----------------------------
+    def __init__(self,lat0,dlat,nlat,lon0,dlon,nlon) :
+        self.lat0 = float(lat0)
+        self.dlat = float(dlat)
+        self.nlat = int(nlat)
+        self.lon0 = float(lon0)
+        self.dlon = float(dlon)
+        self.nlon = int(nlon)
+    #enddef __init__
+
+    @classmethod
+    def fromCoords(cls,lats,lons):
+        ''' Grid from its 1D coordinate variables '''
+        return cls(lats[0],(lats[-1]-lats[0])/(len(lats)-1),len(lats),
+                   lons[0],(lons[-1]-lons[0])/(len(lons)-1),len(lons))
+    #enddef fromCoords
+
+    def key(self):
+        ''' Grid parameters rounded to well below the grid spacing '''
+        return (round(self.lat0,6),round(self.dlat,8),self.nlat,
+                round(self.lon0,6),round(self.dlon,8),self.nlon)
+    #enddef key
+
+    def fracindex(self,lat,lon):
+        ''' Fractional (j,i) of points (lat,lon) '''
+        if self.lon0 > 0.0:            # 0-360 degree longitudes
+            lon = np.mod(lon,360.0)
+        return (lat-self.lat0)/self.dlat, (lon-self.lon0)/self.dlon
+    #enddef fracindex
+
+#endclass LatLonGrid
+
+##%%%%%%%%%%%%%%%%%%%%%%%  class RegridWeights %%%%%%%%%%%%%%%%%%%%%%%%
+
+class RegridWeights:
+    #classbegin
+    ''' Sparse interpolation weights from a LatLonGrid to a model grid
+
+        indptr, indices, data:  CSR matrix of (ny*nx) rows, the columns
+                                are points of the source window
+        window:                 [j0,j1,i0,i1], rows and columns of the
+                                source grid used by the weights
+        shape:                  [ny,nx] of the model grid
+
+        Weights are renormalized over the valid source points when they
+        are applied, so missing MRMS values do not bias the result and a
+        model point without any valid source point is missing (NaN).
+    '''
+
+    fields  = ('indptr','indices','data','window','shape')
+    methods = ('nearest','bilinear','area')
+
+    lock = threading.Lock()
+
+    ##----------------------- Constructor  -----------------------------
+    def __init__(self,arrays) :
+        for field in self.fields:
+            setattr(self,field,arrays[field])
+        self._matrix = None
+    #enddef __init__
+
+    ####################### build ######################################
+    @classmethod
+    def build(cls,srcgrid,lat,lon,method='bilinear',dx=None):
+        '''
+          Weights that interpolate "srcgrid" to points (lat,lon), (ny,nx)
+          arrays. The area average takes all source points within the
+          model grid cell of size "dx" meters.
+        '''
+
+        if method not in cls.methods:
+            raise ValueError(f"Unknown interpolation method {method}, one of {cls.methods}")
+
+        ny, nx = lat.shape
+        lat = np.asarray(lat,dtype=np.float64).ravel()
+        lon = np.asarray(lon,dtype=np.float64).ravel()
+        fj, fi = srcgrid.fracindex(lat,lon)
+        rows = np.arange(ny*nx)
+
+        if method == 'nearest':
+            jj = np.rint(fj).astype(np.int64)[:,None]
+            ii = np.rint(fi).astype(np.int64)[:,None]
+            ww = np.ones(jj.shape)
+        elif method == 'bilinear':
+            j0 = np.floor(fj).astype(np.int64)
+            i0 = np.floor(fi).astype(np.int64)
+            wj = fj-j0
+            wi = fi-i0
+            jj = np.stack([j0,  j0,  j0+1,j0+1],axis=1)
+            ii = np.stack([i0,  i0+1,i0,  i0+1],axis=1)
+            ww = np.stack([(1-wj)*(1-wi),(1-wj)*wi,wj*(1-wi),wj*wi],axis=1)
+        else:
+            if dx is None:
+                raise ValueError("Grid spacing is required by the area average")
+            # half cell size in source grid points
+            hj = 0.5*dx/(EARTH_RADIUS*math.radians(abs(srcgrid.dlat)))*np.ones(fj.shape)
+            hi = 0.5*dx/(EARTH_RADIUS*math.radians(abs(srcgrid.dlon))*np.cos(np.radians(lat)))
+            kj = int(math.ceil(hj.max()))
+            ki = int(math.ceil(hi.max()))
+            dj, di = [a.ravel() for a in np.meshgrid(np.arange(-kj,kj+1),np.arange(-ki,ki+1),indexing='ij')]
+
+            jc = np.rint(fj).astype(np.int64)
+            ic = np.rint(fi).astype(np.int64)
+            jj = jc[:,None]+dj[None,:]
+            ii = ic[:,None]+di[None,:]
+            inside = (np.abs(jj-fj[:,None]) <= hj[:,None]) & (np.abs(ii-fi[:,None]) <= hi[:,None])
+            inside[:,len(dj)//2] = True          # at least the nearest point
+            ww = inside.astype(np.float64)
+
+        valid = (jj >= 0) & (jj < srcgrid.nlat) & (ii >= 0) & (ii < srcgrid.nlon) & (ww > 0.0)
+        rowsum = np.where(valid,ww,0.0).sum(axis=1)
+        ww = ww/np.where(rowsum > 0.0,rowsum,1.0)[:,None]
+
+        jj   = jj[valid]
+        ii   = ii[valid]
+        ww   = ww[valid]
+        rows = np.broadcast_to(rows[:,None],valid.shape)[valid]
+
+        if len(jj) > 0:
+            window = np.array([jj.min(),jj.max()+1,ii.min(),ii.max()+1],dtype=np.int64)
+        else:
+            window = np.zeros(4,dtype=np.int64)
+        cols = (jj-window[0])*(window[3]-window[2]) + (ii-window[2])
+
+        indptr = np.zeros(ny*nx+1,dtype=np.int64)
+        np.cumsum(np.bincount(rows,minlength=ny*nx),out=indptr[1:])
+
+        return cls({'indptr': indptr, 'indices': cols.astype(np.int32),
+                    'data': ww.astype(np.float32), 'window': window,
+                    'shape': np.array([ny,nx],dtype=np.int64)})
+    #enddef build
+
+    ####################### fromGrids ##################################
+    @classmethod
+    def fromGrids(cls,srcgrid,lat,lon,method='bilinear',dx=None,cachedir=None):
+        '''
+          Load the weights from "cachedir" or build them and save them
+          there as "mrms_<method>_<key>.npz", key is a hash of both grids.
+
+          Return the weights and the cache file name (None without cachedir)
+        '''
+
+        if cachedir is None:
+            return cls.build(srcgrid,lat,lon,method,dx), None
+
+        sha1 = hashlib.sha1(repr((srcgrid.key(),method,dx)).encode())
+        sha1.update(np.ascontiguousarray(lat,dtype=np.float32).tobytes())
+        sha1.update(np.ascontiguousarray(lon,dtype=np.float32).tobytes())
+        filename = os.path.join(cachedir,f'mrms_{method}_{sha1.hexdigest()[:16]}.npz')
+
+        with cls.lock:
+            if os.path.exists(filename):
+                try:
+                    return cls.fromFile(filename), filename
+                except (OSError, ValueError, KeyError):
+                    pass                # incomplete or corrupted, make it again
+
+            weights = cls.build(srcgrid,lat,lon,method,dx)
+
+            os.makedirs(cachedir,exist_ok=True)
+            tmpfile = f'{filename}.{os.getpid()}.tmp'
+            with open(tmpfile,'wb') as fh:
+                np.savez(fh,**dict([(field,getattr(weights,field)) for field in cls.fields]))
+            os.replace(tmpfile,filename)    # other processes never see a partial file
+
+        return weights, filename
+    #enddef fromGrids
+
+    ####################### fromFile ###################################
+    @classmethod
+    def fromFile(cls,filename):
+        ''' Weights memory-mapped from a cache file '''
+        return cls(GridGeometry.load(filename))
+    #enddef fromFile
+
+    ####################### apply ######################################
+    def apply(self,window):
+        '''
+          Interpolate the source window (j1-j0,i1-i0) array, NaN for
+          missing values, to the model grid.
+        '''
+
+        values = np.asarray(window,dtype=np.float32).ravel()
+        valid  = np.isfinite(values)
+        values = np.where(valid,values,0.0).astype(np.float32)
+
+        if csr_matrix is not None:
+            if self._matrix is None:
+                self._matrix = csr_matrix((self.data,self.indices,self.indptr),
+                                          shape=(len(self.indptr)-1,len(values)))
+            total  = self._matrix.dot(values)
+            weight = self._matrix.dot(valid.astype(np.float32))
+        else:
+            rows   = np.repeat(np.arange(len(self.indptr)-1),np.diff(self.indptr))
+            total  = np.bincount(rows,weights=self.data*values[self.indices],minlength=len(self.indptr)-1)
+            weight = np.bincount(rows,weights=self.data*valid[self.indices],minlength=len(self.indptr)-1)
+
+        result = np.full(total.shape,np.nan,dtype=np.float32)
+        np.divide(total,weight,out=result,where=weight > 1.0e-6)
+        return result.reshape(tuple(self.shape))
+    #enddef apply
+
+#endclass RegridWeights
+
+##%%%%%%%%%%%%%%%%%%%%%%%  File handling  %%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+def mrms_variable(ncfile,varname=None):
+    ''' The data variable of a MRMS netCDF file and its lat/lon variable names '''
+
+    latname = 'lat' if 'lat' in ncfile.variables else 'latitude'
+    lonname = 'lon' if 'lon' in ncfile.variables else 'longitude'
+
+    if varname is None:
+        latdim = ncfile.variables[latname].dimensions[0]
+        londim = ncfile.variables[lonname].dimensions[0]
+        for name, var in ncfile.variables.items():
+            if var.dimensions[-2:] == (latdim,londim):
+                varname = name
+                break
+        else:
+            raise ValueError(f"No {latdim}x{londim} variable in {ncfile.filepath()}")
+
+    return ncfile.variables[varname], latname, lonname
+
+#enddef mrms_variable
+
+def read_grid(mrmsfile,varname=None):
+    ''' LatLonGrid of a MRMS netCDF file '''
+    with netCDF4.Dataset(mrmsfile) as ncfile:
+        _var, latname, lonname = mrms_variable(ncfile,varname)
+        return LatLonGrid.fromCoords(ncfile.variables[latname][:],ncfile.variables[lonname][:])
+
+#enddef read_grid
+
+def read_window(mrmsfile,window,varname=None,missing=-99.0):
+    '''
+      Read rows j0:j1 and columns i0:i1 of the MRMS field, a 3D field is
+      reduced to its column maximum. Values at or below "missing" become
+      NaN, i.e. -99 (no radar coverage) and -999 (missing) of MRMS.
+    '''
+    j0, j1, i0, i1 = [int(w) for w in window]
+    with netCDF4.Dataset(mrmsfile) as ncfile:
+        var, _latname, _lonname = mrms_variable(ncfile,varname)
+        data = var[...,j0:j1,i0:i1]
+
+    data = np.ma.filled(np.ma.asarray(data,dtype=np.float32),np.nan)
+    data = data.reshape((-1,)+data.shape[-2:])
+    data[data <= missing] = np.nan
+    return np.max(data,axis=0) if data.shape[0] > 1 else data[0]
+
+#enddef read_window
+
+def read_model_grid(wrffile):
+    ''' XLAT, XLONG and DX of a WRF file '''
+    with netCDF4.Dataset(wrffile) as ncfile:
+        lat = np.asarray(ncfile.variables['XLAT'][0],dtype=np.float64)
+        lon = np.asarray(ncfile.variables['XLONG'][0],dtype=np.float64)
+        dx  = float(ncfile.getncattr('DX'))
+    return lat, lon, dx
+
+#enddef read_model_grid
+
+def write_field(outfile,field,varname,wrffile,fill_value=-999.0):
+    '''
+      Write the interpolated 2D field as "varname" in the layout of the
+      obsfmt=202 files, with the grid attributes and XLAT/XLONG of "wrffile"
+    '''
+
+    tmpfile = f'{outfile}.{os.getpid()}.tmp'
+    with netCDF4.Dataset(wrffile) as wrfnc, netCDF4.Dataset(tmpfile,'w',format='NETCDF4_CLASSIC') as ncfile:
+        ny, nx = field.shape
+        ncfile.createDimension('Time',None)
+        ncfile.createDimension('south_north',ny)
+        ncfile.createDimension('west_east',nx)
+
+        for attr in ('DX','DY','MAP_PROJ','CEN_LAT','CEN_LON','TRUELAT1','TRUELAT2','STAND_LON'):
+            if attr in wrfnc.ncattrs():
+                ncfile.setncattr(attr,wrfnc.getncattr(attr))
+
+        for name in ('XLAT','XLONG'):
+            var = ncfile.createVariable(name,'f4',('Time','south_north','west_east'))
+            var[0] = wrfnc.variables[name][0]
+
+        var = ncfile.createVariable(varname,'f4',('Time','south_north','west_east'),fill_value=fill_value)
+        var[0] = np.ma.masked_invalid(field)
+
+    os.replace(tmpfile,outfile)
+
+#enddef write_field
+
+##%%%%%%%%%%%%%%%%%%%%%%%  Regrid many files  %%%%%%%%%%%%%%%%%%%%%%%%%
+
+_loaded = {}          # weights file -> RegridWeights, in each worker process
+
+def regrid_file(weightfile,mrmsfile,outfile,varname,wrffile,mrmsvar=None):
+    ''' Interpolate one MRMS file with the cached weights in "weightfile" '''
+
+    weights = _loaded.get(weightfile)
+    if weights is None:
+        weights = _loaded[weightfile] = RegridWeights.fromFile(weightfile)
+
+    field = weights.apply(read_window(mrmsfile,weights.window,mrmsvar))
+    write_field(outfile,field,varname,wrffile)
+    return outfile
+
+#enddef regrid_file
+
+def install_weights(weightfile,weights):
+    ''' Pool initializer, make "weights" known to regrid_file as "weightfile" '''
+    _loaded[weightfile] = weights
+
+#enddef install_weights
+
+def regrid_files(mrmsfiles,outfiles,varname,wrffile,cachedir,method='bilinear',maxworkers=4):
+    '''
+      Interpolate "mrmsfiles" to the grid of "wrffile", the weights are
+      built from the first MRMS file (or loaded from "cachedir") and each
+      file is one task in a process pool. Without "cachedir", the weights
+      are passed to each worker when it starts.
+
+      Return the output files in the order of "mrmsfiles".
+    '''
+
+    lat, lon, dx = read_model_grid(wrffile)
+    weights, weightfile = RegridWeights.fromGrids(read_grid(mrmsfiles[0]),lat,lon,method,dx,cachedir)
+
+    initializer = None
+    initargs    = ()
+    if weightfile is None:
+        weightfile  = f'<weights of {wrffile}>'
+        initializer = install_weights
+        initargs    = (weightfile,weights)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(maxworkers,len(mrmsfiles)),
+                                                initializer=initializer,initargs=initargs) as executor:
+        tasks = [executor.submit(regrid_file,weightfile,mrmsfile,outfile,varname,wrffile)
+                 for mrmsfile,outfile in zip(mrmsfiles,outfiles)]
+        return [task.result() for task in tasks]
+
+#enddef regrid_files
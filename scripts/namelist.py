@@ -21,7 +21,8 @@
 ##
 ########################################################################
 
-import re, sys
+import os, re, sys, threading, collections
+import concurrent.futures
 from collections.abc import MutableSequence
 
 ##%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
@@ -53,30 +54,53 @@ class VariableValue(MutableSequence):
         self.comment = comment
         self.data = self._inner_list
 
+        self._value    = None      # parsed value and type, cached until changed
+        self._datatype = None
+
+    def changed(self):
+        ''' Drop the cached value and type, must be called after the
+            element lists are changed in place, e.g. self[1].append(...)
+        '''
+        self._value    = None
+        self._datatype = None
+
     def __len__(self):
         return len(self._inner_list)
 
     def __delitem__(self, index):
         self._inner_list.__delitem__(index)
+        self.changed()
 
     def insert(self, index, value):
         self._inner_list.insert(index, value)
+        self.changed()
 
     def __setitem__(self, index, value):
         self._inner_list.__setitem__(index, value)
+        self.changed()
 
     def __getitem__(self, index):
         return self._inner_list.__getitem__(index)
 
     def append(self,value):
         self._inner_list.append(value)
+        self.changed()
 
     def extend(self,value):
         self._inner_list.extend(value)
+        self.changed()
 
     def __repr__(self):
         return '%s' % repr(self._inner_list)
 
+    def copy(self):
+        ''' A copy that does not share the value list(s) with this one '''
+        alist = [list(el) if isinstance(el,list) else el for el in self._inner_list]
+        varvalue = VariableValue(alist,self.varname,self.comment)
+        varvalue._value    = self._value          # never handed out, can be shared
+        varvalue._datatype = self._datatype
+        return varvalue
+
     def __str__(self):
         if isinstance(self._inner_list[0],list) :
           lstr = ''
@@ -95,8 +119,19 @@ class VariableValue(MutableSequence):
           return unpacked value as python internal data type
 
           get rid of list symbol for single value
+
+          The value is parsed once and cached, the caller gets a copy of
+          the cached lists so that it can change them freely.
       '''
 
+      if self._value is None:
+          self._value = self.unpackvalue()
+
+      if isinstance(self._value,list):
+          return [list(el) if isinstance(el,list) else el for el in self._value]
+      return self._value
+
+    def unpackvalue(self) :
       if len(self._inner_list) > 1:
           newvalue = []
 
@@ -121,6 +156,11 @@ class VariableValue(MutableSequence):
            Detect the value type as:
            int, str, float, bool, arrayofint1d, listint2d, ...
         '''
+        if self._datatype is None:
+            self._datatype = self.detecttype()
+        return self._datatype
+
+    def detecttype(self):
         outtyp = ''
 
         dim = 0
@@ -345,15 +385,34 @@ class namelistBlock(dict) :
         2. repr() To get internal representation, for debugging etc.
     """
 
+    index_re = re.compile(r'([\w_ ]+)\(([\d:]{1,2})(,(\d{1,2})){0,2}\)')   # var(1) or var(1,2)
+
     def __init__(self,name='',comment=None) :
       dict.__init__(self)
       self._order   = []
       self._name    = name
       self._comment = comment
+      self._shared  = set()    # keys whose value is still shared with the block cloned from
  #  enddef
 
     ####################################################################
 
+    def clone(self) :
+      '''
+          A copy-on-write clone, variable values are shared with this block
+          until they are accessed in the clone, by the dict notation, get(),
+          values() or items().
+      '''
+      nmlblk = namelistBlock(self._name,self._comment)
+      for key in self._order:
+          dict.__setitem__(nmlblk,key,dict.__getitem__(self,key))
+      nmlblk._order  = list(self._order)
+      nmlblk._shared = set(self._order)
+      return nmlblk
+    #enddef
+
+    ####################################################################
+
     def keys(self) :
       return self._order
     #enddef
@@ -386,7 +445,7 @@ class namelistBlock(dict) :
       indx1 = 0
       #print 'Adding key :',key
       #                        1            2       3 4
-      regroups = re.match(r'([\w_ ]+)\(([\d:]{1,2})(,(\d{1,2})){0,2}\)',key)
+      regroups = self.index_re.match(key) if '(' in key else None
       if  regroups:
         key = (regroups.group(1)).strip()
         if regroups.group(2) == ':': indx1 = 0
@@ -396,14 +455,16 @@ class namelistBlock(dict) :
           indx2 = int(regroups.group(4))
 
       if key in self:
+        varvalue = self[key]
         if multidim :
-          if indx2 > len(self[key]):
-            self[key].append(value)
+          if indx2 > len(varvalue):
+            varvalue.append(value)
           else :
-            self[key][indx2-1].extend(value)
+            varvalue[indx2-1].extend(value)
+            varvalue.changed()
         else :
-          if indx1 > 1: assert(indx1-1 == len(self[key]))
-          self[key].extend(value)
+          if indx1 > 1: assert(indx1-1 == len(varvalue))
+          varvalue.extend(value)
       else :
         if multidim:
             valuelist = [value]
@@ -426,7 +487,7 @@ class namelistBlock(dict) :
 
     def __getattr__(self, key):
       try:
-          return self[key].value
+          return dict.__getitem__(self,key).value    # read only, no need to copy
       except KeyError:
           print ('''Variable "%s" is not a member of this namelist block: <%s>.''' % (key,self._name))
           raise AttributeError(key)
@@ -434,7 +495,7 @@ class namelistBlock(dict) :
     ####################################################################
 
     def __setattr__(self, key, value):
-      if key in ['_comment', '_order', '_keycomments', '_name']:
+      if key in ['_comment', '_order', '_keycomments', '_name', '_shared']:
           super(namelistBlock,self).__setattr__(key,value)
       else:
           valnml = VariableValue.pack4nml(value)
@@ -446,10 +507,37 @@ class namelistBlock(dict) :
 
     ####################################################################
 
+    def __getitem__(self, key):
+
+        value = super(namelistBlock,self).__getitem__(key)
+        if key in self._shared:             # copy on the first access
+            value = value.copy()
+            super(namelistBlock,self).__setitem__(key, value)
+            self._shared.discard(key)
+        return value
+
+    ####################################################################
+    #
+    # The other accessors of the values go through __getitem__, so a value
+    # is never handed out while it is shared with the cloned block
+    #
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def values(self):
+        return [self[key] for key in dict.keys(self)]
+
+    def items(self):
+        return [(key, self[key]) for key in dict.keys(self)]
+
+    ####################################################################
+
     def __setitem__(self, key, value):
 
         if isinstance(value,VariableValue):
             super(namelistBlock,self).__setitem__(key, value)
+            self._shared.discard(key)
         else:
             raise ValueError('''Value "%s" is not an instance of class VariableValue.'''%value)
 
@@ -458,7 +546,7 @@ class namelistBlock(dict) :
     def item (self, key):
       ''' return one (key,value) pair as a string'''
 
-      value_list = self[key]
+      value_list = dict.__getitem__(self,key)
       # value_list is an instance of VariableValue
       # but it can be used as a list
 
@@ -480,7 +568,7 @@ class namelistBlock(dict) :
 
       outstr = '&%s\n'%self._name
       for var_name in self.keys() :
-          outstr += '  %s = %s\n'%(var_name,repr(self[var_name]))
+          outstr += '  %s = %s\n'%(var_name,repr(dict.__getitem__(self,var_name)))
 
       outstr += '/\n\n'
 
@@ -534,10 +622,35 @@ class namelistGroup(dict) :
       self._order   = []
       self._srcfile = filename
       self.merge    = self.merge1dict    # to keep backward compatible
+      self._varindex = (None, {})        # (blocks & sizes it was built for, index)
     #enddef
 
     ######################################################################
 
+    def varindex(self) :
+      '''
+      Return {variable name: namelist block name}, the first block in
+      order that contains the variable.
+
+      It is rebuilt only when a block is added or a block gets new
+      variables (variables are never removed from a namelist block).
+      '''
+      stamp = self.blockstamp()
+      if self._varindex[0] != stamp:
+        index = {}
+        for nml_name in self._order:
+          for var in self[nml_name].keys():
+            index.setdefault(var,nml_name)
+        self._varindex = (stamp, index)
+      return self._varindex[1]
+    #enddef varindex
+
+    def blockstamp(self) :
+      return tuple([(nml_name,id(self[nml_name]),len(self[nml_name]._order)) for nml_name in self._order])
+    #enddef blockstamp
+
+    ######################################################################
+
     def keys(self) :
       return self._order
     #enddef
@@ -551,6 +664,18 @@ class namelistGroup(dict) :
 
     ######################################################################
 
+    def clone(self) :
+      ''' A copy-on-write clone, see namelistBlock.clone '''
+      nmlgrp = namelistGroup(self._srcfile)
+      for nml_name in self.keys() :
+          nmlgrp[nml_name] = self[nml_name].clone()
+      if self._varindex[0] == self.blockstamp():     # the index is never changed in place
+          nmlgrp._varindex = (nmlgrp.blockstamp(), self._varindex[1])
+      return nmlgrp
+    #enddef
+
+    ######################################################################
+
     def __repr__(self):
       '''repr() for debugging, formally representation of the object'''
 
@@ -604,19 +729,15 @@ class namelistGroup(dict) :
         inblk = namelistBlock.clone_from_dict(indict)
         #print inblk
 
-      set1 = set(inblk.keys())
-
-      for nml_name in self.keys() :       ## loop over all namelist blocks
-        nml_block = self[nml_name]
-        set0 = set(nml_block.keys())      ## variable set of this namelist block
-        setc = set0.intersection(set1)    ## Keys to be updated
-        if len(setc) > 0 :                ## this block contains variable to be merged
-          for var in setc :
-            nml_block[var] = inblk[var]
-            #print "%s -> <%s>" % (var, nml_block[var])
-
-        set1 = set1.difference(setc)      ## Keys left to be merged with other namelis block
-        if len(set1) <= 0 : break
+      index = self.varindex()
+      set1  = []                          ## Keys not in any namelist block
+      for var in inblk.keys() :
+        nml_name = index.get(var)
+        if nml_name is None :
+          set1.append(var)
+        else :
+          self[nml_name][var] = inblk[var]
+          #print "%s -> <%s>" % (var, nml_block[var])
 
       #
       # extra variables from input dict
@@ -625,7 +746,7 @@ class namelistGroup(dict) :
         if forceadd and nblkname in self.keys():
           sys.stderr.write('WARNING: Unknown variables \"%s\" while merging namelist <%s>. Adding...\n'%(','.join(set1),inblk._name))
           for var in set1:
-            newvalue = inblk[var]
+            newvalue = inblk[var].data
             self[nblkname].append(var,newvalue,'New from %s'%inblk._name)
 
             #print >> sys.stderr, nml_block.getComment(var)
@@ -653,7 +774,8 @@ class namelistGroup(dict) :
       for nml_name in ingrp.keys() :       ## loop over all namelist blocks, it is a "dict" again
         if nml_name in self.keys():         ## make sure indict key is valid
             nml_block = self[nml_name]
-            for key,value in ingrp[nml_name].items():
+            for key in ingrp[nml_name].keys():
+                  value = ingrp[nml_name][key]
 
                   if key in nml_block.keys():         # make sure variable is valid
                          nml_block[key] = value
@@ -672,6 +794,39 @@ class namelistGroup(dict) :
 
     ######################################################################
 
+    def merge_changes(self,changes):
+      '''
+      Merge "changes" into this namelist group and return the names of
+      the namelist blocks changed.
+
+      A key of variable name is merged as by merge1dict. A key of namelist
+      block name with a dict value sets variables in that block with the
+      attribute notation, which adds the variables that are not there yet.
+      Variables are merged before the blocks are set.
+      '''
+
+      changed = set()
+
+      varchanges = dict([(key,value) for key,value in changes.items() if not isinstance(value,dict)])
+      if len(varchanges) > 0:
+        inblk = namelistBlock.clone_from_dict(varchanges)
+        self.merge1dict(inblk)
+        index = self.varindex()
+        for var in inblk.keys():
+          if var in index:
+            changed.add(index[var])
+
+      for nml_name,blkchanges in changes.items():
+        if isinstance(blkchanges,dict):
+          for var,value in blkchanges.items():
+            setattr(self[nml_name],var,value)
+          changed.add(nml_name)
+
+      return changed
+    #enddef merge_changes
+
+    ######################################################################
+
     def writeToFile(self,file_name,file_handle=False) :
       '''Write a run-time namelist file.'''
 
@@ -867,13 +1022,150 @@ class namelistCMPGroup(dict) :
 ##
 ########################################################################
 ##
-def decode_namelist_file(file_name,debug=False,dictionary=False) :
+
+nml_token_re = re.compile(r'''(?:[\s,]|![^\n]*)*(?:        # separators and comments before a token
+      &(?!end)(?P<open>[^\n!]*)                         # &name starts a namelist block
+     |(?P<close>/|&end)[^\n]*                          # / or &end closes it
+     |(?P<name>[A-Za-z_]\w*(?:[ \t]*\([ \t\d:,]*\))?)[ \t]*=  # var =, var(2) = or var(1,2) =
+     |(?P<str>'[^'\n]*'|"[^"\n]*")                     # quoted string, may contain , or !
+     |(?P<value>[^\s,!'"](?:[^,!\n]*[^\s,!])?)          # any other value
+     )''', re.X)
+
+nml_cache      = collections.OrderedDict()   # key: (file name, dictionary), value: ((mtime, size), namelistGroup)
+nml_cache_size = 64           # files kept, the least recently used is dropped first
+nml_cache_lock = threading.Lock()
+
+def decode_namelist_file(file_name,debug=False,dictionary=False,cached=True) :
   '''read and parse a namelist file
 
      note that each variable is a string
      value is also string, but enclosed within a list
      string wrapped within ' and '.
 
+     The file is decoded once and kept in memory until it is modified,
+     each call returns a copy-on-write clone of it (see namelistGroup.clone).
+     At most "nml_cache_size" files are kept.
+  '''
+
+  if not cached or debug:
+      return decode_namelist_text(file_name,debug,dictionary)
+
+  stat = os.stat(file_name)
+  key  = (os.path.realpath(file_name), dictionary)
+  with nml_cache_lock:
+      entry = nml_cache.get(key)
+      if entry is not None: nml_cache.move_to_end(key)
+  if entry is None or entry[0] != (stat.st_mtime_ns, stat.st_size):
+      entry = ((stat.st_mtime_ns, stat.st_size), decode_namelist_text(file_name,debug,dictionary))
+      with nml_cache_lock:
+          nml_cache[key] = entry
+          nml_cache.move_to_end(key)
+          while len(nml_cache) > nml_cache_size:
+              nml_cache.popitem(last=False)
+
+  nml_grp = entry[1].clone()
+  nml_grp._srcfile = file_name
+  return nml_grp
+#enddef decode_namelist_file
+
+########################################################################
+
+def decode_namelist_text(file_name,debug=False,dictionary=False) :
+  '''
+     Decode a namelist file in one pass, the whole file is tokenized by
+     "nml_token_re" instead of being split and matched line by line and
+     element by element. Anything not in a token is skipped.
+  '''
+  nml_grp = namelistGroup(file_name)  ## Contain the whole namelist file
+
+  if dictionary :
+    nml_name  = 'global'
+    nml_block = namelistBlock(name=file_name)
+    inmlblock = True
+  else :
+    inmlblock = False
+
+  var_name   = None        # we are sure one variable is completed only when
+  value_list = None        # the next variable name is found.
+
+  var_names   = []         # Collect all variables and values for output
+  value_lists = {}
+
+  with open(file_name) as fp:
+    text = fp.read()
+
+  # findall gives one tuple of the groups for each token, only the group
+  # of its kind is not empty, except "open" for a bare "&"
+  for opened, closed, name, string, value in nml_token_re.findall(text):
+      if value or string:
+          if value_list is not None: value_list.append(value or string)
+
+      elif name:
+          if not inmlblock: continue    ## ignore everything outside a namelist block
+
+          if var_name is not None:
+              var_names.append(var_name)
+              value_lists[var_name] = value_list or ['']
+          var_name = (name if ' ' not in name and '\t' not in name
+                      else re.sub(r'\s+','',name)).lower()
+          value_list = []
+
+      elif closed:
+          if not inmlblock: continue    ## close a namelist block
+
+          if var_name is not None:
+              var_names.append(var_name)
+              value_lists[var_name] = value_list or ['']
+
+          add_variables(nml_block,var_names,value_lists,debug)
+
+          nml_grp[nml_name] = nml_block
+          inmlblock = False
+
+          var_name    = None
+          value_list  = None
+          var_names   = []         # Clear old namelist block
+          value_lists = {}
+
+      else:                             ## start a namelist block
+          nml_name  = opened.strip()
+          nml_block = namelistBlock(name=nml_name)
+          inmlblock = True
+
+  if dictionary :    ## contain only var = value pairs
+        if var_name is not None:
+            var_names.append(var_name)
+            value_lists[var_name] = value_list or ['']
+
+        add_variables(nml_block,var_names,value_lists,debug)
+
+        nml_grp[nml_name] = nml_block
+
+  return nml_grp
+#enddef decode_namelist_text
+
+def add_variables(nml_block,var_names,value_lists,debug=False) :
+  '''
+     Add the decoded variables to "nml_block". A new variable without
+     indices is added directly, others go through namelistBlock.append,
+     which handles var(2) and var(1,2) and extends repeated variables.
+  '''
+  order = nml_block._order
+  for varname in var_names:
+      if '(' in varname or varname in nml_block:
+          nml_block.append(varname, value_lists[varname])
+      else:
+          dict.__setitem__(nml_block,varname,VariableValue(value_lists[varname],varname))
+          order.append(varname)
+      if debug : print ('adding %s as %s' % (varname, value_lists[varname]))
+#enddef add_variables
+
+########################################################################
+
+def decode_namelist_file_byline(file_name,debug=False,dictionary=False) :
+  '''read and parse a namelist file element by element
+
+     It is the original decoder, kept as a reference for decode_namelist_text.
   '''
   nml_grp = namelistGroup(file_name)  ## Contain the whole namelist file
 
@@ -1030,6 +1322,59 @@ def decode_one_line(linein,varpend,varin,valuein,var_names,value_lists,debug=Fal
 
       return (var_name,value_list,var_pend)
 
+##
+########################################################################
+##
+## Render namelist files for many ensemble members
+##
+########################################################################
+##
+def render_namelist_files(tmplfiles,nmlfiles,base=None,deltas=None,maxworkers=8) :
+  '''
+     Write the namelist files of all members in one pass.
+
+     tmplfiles  Template file of each member, or one file for all members
+     nmlfiles   Output file of each member
+     base       Changes to all members, see namelistGroup.merge_changes
+     deltas     Changes to each member after "base", or None
+
+     The output is the same as decode_namelist_file, merge and writeToFile
+     for each member. Each template is decoded and merged with "base" only
+     once, the namelist blocks that are not changed by a member's delta are
+     serialized once per template, and the files are written by a thread pool.
+  '''
+
+  if isinstance(tmplfiles,str):
+    tmplfiles = [tmplfiles]*len(nmlfiles)
+  if deltas is None:
+    deltas = [{}]*len(nmlfiles)
+
+  templates = {}            # template file: (namelistGroup, {namelist block name: string})
+  outputs   = []
+  for tmplfile,delta in zip(tmplfiles,deltas):
+    if tmplfile not in templates:
+      nmlgrp = decode_namelist_file(tmplfile)
+      if base: nmlgrp.merge_changes(base)
+      templates[tmplfile] = (nmlgrp, dict([(nml_name,str(nmlgrp[nml_name])) for nml_name in nmlgrp.keys()]))
+
+    nmlgrp, blkstrs = templates[tmplfile]
+    if delta:
+      memgrp  = nmlgrp.clone()
+      changed = memgrp.merge_changes(delta)
+      outputs.append(''.join([str(memgrp[nml_name]) if nml_name in changed else blkstrs[nml_name]
+                              for nml_name in memgrp.keys()]))
+    else:
+      outputs.append(''.join([blkstrs[nml_name] for nml_name in nmlgrp.keys()]))
+
+  def write_a_file(nmlfile,outstr):
+    with open(nmlfile,'w') as nml_file:
+      nml_file.write(outstr)
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=maxworkers) as executor:
+    for future in [executor.submit(write_a_file,nmlfile,outstr) for nmlfile,outstr in zip(nmlfiles,outputs)]:
+      future.result()             # raise the exception from a thread if any
+#enddef render_namelist_files
+
 ##
 ########################################################################
 ##
@@ -1154,6 +1499,71 @@ def merge_namelist_file(file_name, nmlgrp_in, outfhdl, debug=False, forceadd=Fal
   return
 #enddef merge_namelist_file
 
+##======================================================================
+## Benchmark the namelist decoders
+##======================================================================
+def bench_decode(file_names, repeat=20) :
+  '''
+     Time decode_namelist_file_byline, decode_namelist_text and the cached
+     decode_namelist_file on each file, also check that they agree.
+  '''
+  import time
+
+  def timeit(func,file_name):
+      time0 = time.perf_counter()
+      for n in range(repeat):
+          func(file_name)
+      return (time.perf_counter()-time0)/repeat*1000.
+
+  print(f"{'file':<32} {'byline (ms)':>12} {'text (ms)':>12} {'cached (ms)':>12} {'speedup':>8}  same")
+  totals = [0.0, 0.0, 0.0]
+  for file_name in file_names:
+      same = str(decode_namelist_file_byline(file_name)) == str(decode_namelist_text(file_name))
+
+      times = [timeit(decode_namelist_file_byline,file_name), timeit(decode_namelist_text,file_name),
+               timeit(decode_namelist_file,file_name)]
+      totals = [total+t for total,t in zip(totals,times)]
+      print(f"{os.path.basename(file_name):<32} {times[0]:12.3f} {times[1]:12.3f} {times[2]:12.3f} {times[0]/times[2]:8.1f}  {same}")
+
+  print(f"{'total':<32} {totals[0]:12.3f} {totals[1]:12.3f} {totals[2]:12.3f} {totals[0]/totals[2]:8.1f}")
+#enddef bench_decode
+
+def bench_merge(file_names, nvars=60, repeat=200) :
+  '''
+     Time merging a "nvars" keys dict into each namelist file, as the
+     workflow does, and the typed access of all its variables.
+  '''
+  import time
+
+  print(f"\n{'file':<32} {'keys':>6} {'merge (ms)':>12} {'vars':>6} {'typed (ms)':>12}")
+  for file_name in file_names:
+      nmlgrp  = decode_namelist_file(file_name)
+
+      allvars = []                # pack does not take Python bool, value does not take T/F etc.
+      for nml_name in nmlgrp.keys():
+          for var in nmlgrp[nml_name].keys():
+              try:
+                  getattr(nmlgrp[nml_name],var)
+                  if not nmlgrp[nml_name][var].datatype.endswith('bool'):
+                      allvars.append((nml_name,var))
+              except TypeError:
+                  pass
+      indict  = dict([(var,getattr(nmlgrp[nml_name],var)) for nml_name,var in allvars[::max(len(allvars)//nvars,1)][:nvars]])
+
+      time0 = time.perf_counter()
+      for n in range(repeat):
+          nmlgrp.merge1dict(indict)
+      time1 = time.perf_counter()
+      for n in range(repeat):
+          for nml_name,var in allvars:
+              getattr(nmlgrp[nml_name],var)
+              dict.__getitem__(nmlgrp[nml_name],var).datatype
+      time2 = time.perf_counter()
+
+      print(f"{os.path.basename(file_name):<32} {len(indict):6d} {(time1-time0)/repeat*1000.:12.3f} "
+            f"{len(allvars):6d} {(time2-time1)/repeat*1000.:12.3f}")
+#enddef bench_merge
+
 ##======================================================================
 ## USAGE
 ##======================================================================
@@ -1187,6 +1597,8 @@ def usage( istatus = 0 ) :
      \t-s, --set     \t  \t  Set FILE1 with values from FILE2. FILE2 contains
      \t              \t  \t  variable and value pairs only, but not embeded
      \t              \t  \t  within namelist blocks
+     \t              \t \t
+     \t-b, --bench   \t  \t  Benchmark the namelist decoders and merging on FILE1 [FILE2 ...]
      """ % (os.path.basename(cmd)), file=sys.stderr)
   print('  For questions or problems, please contact yunheng@ou.edu (v%s, %s).\n' % (version,lastdate),file=sys.stderr)
 
@@ -1210,8 +1622,8 @@ def parseArgv(argv) :
   ## Decode command options
   ##
   try:
-    opts, args = getopt.getopt(argv,'hvcmskfo:p',
-             ['help','verbose','diff','merge','set','keep1','force','output','print'])
+    opts, args = getopt.getopt(argv,'hvcmskfo:pb',
+             ['help','verbose','diff','merge','set','keep1','force','output','print','bench'])
 
     for opt, arg in opts :
       if opt in ('-h','--help'):
@@ -1232,6 +1644,8 @@ def parseArgv(argv) :
         options['action'] = 'merge'
       elif opt in ( '-s', '--set'):
         options['action'] = 'set'
+      elif opt in ( '-b', '--bench'):
+        options['action'] = 'bench'
 
   except getopt.GetoptError:
     print('  ERROR: Unknown option (%s).' %opt,file=sys.stderr)
@@ -1248,7 +1662,9 @@ def parseArgv(argv) :
   else :
     expected = 1
 
-  if (len(args) == expected ) :
+  if options['action'] == 'bench' and len(args) >= 1 :
+    argfiles = args
+  elif (len(args) == expected ) :
     argfiles = args
     if len(args) == 2 and os.path.isdir(args[1]):
         filename = os.path.basename(args[0])
@@ -1276,6 +1692,11 @@ if (__name__ == '__main__') :
   cmd  = os.path.basename(sys.argv[0])
   (opts,args) = parseArgv(sys.argv[1:])
 
+  if opts['action'] == 'bench' :
+    bench_decode(args)
+    bench_merge(args)
+    sys.exit(0)
+
   ## Decode a nameliss file to get a namelist group
   nmlfile = args[0]
   nmlgrp = decode_namelist_file(nmlfile,opts['debug'])
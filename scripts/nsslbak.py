@@ -29,6 +29,7 @@ import logging
 from nssldomains import NSSLDomains
 from nsslconf import caseConf as APSCase
 from configBase import runException, ConfDict
+from obscatalog import ObsCatalog
 
 ##======================================================================
 ## Parse command line arguments
@@ -484,7 +485,7 @@ def copy_obs(dt,domains,wrkdir,conf) :
           retobs['radial'] = copy_radial(dt,obsconf,domains,wrkdir)
           continue
         elif obstype == 'mrms':
-          retobs['mrms'] = copy_mrms(dt,obsconf,wrkdir)
+          retobs['mrms'] = copy_mrms(dt,obsconf,wrkdir,conf)
           continue
 
         logger=logging.getLogger(obstype)
@@ -561,6 +562,37 @@ def copy_obs(dt,domains,wrkdir,conf) :
 
 #enddef copy_obs
 
+##%%%%%%%%%%%%%%%%%%%%  Index of the data feeds %%%%%%%%%%%%%%%%%%%%%%%%
+
+def open_index(conf,obstype,dt,timerange) :
+    ''' The index kept by obscatalog.py (conf.obscatalog) if it holds files
+        of "obstype" around "dt", otherwise None. The caller closes it.'''
+
+    obscatalog = conf.get('obscatalog',None)
+    if obscatalog is None or not os.path.lexists(obscatalog):
+        return None
+
+    obsdb = ObsCatalog(obscatalog)
+    if obsdb.covers(obstype,dt,timerange):
+        return obsdb
+
+    obsdb.close()
+    return None
+
+#enddef open_index
+
+def find_obs(obsdb,obstype,sensor,validtime,pattern) :
+    ''' Files of "sensor" valid at "validtime", the stable one in the index
+        "obsdb" or those matching "pattern" when it is None'''
+
+    if obsdb is None:
+        return glob.glob(pattern)
+
+    datafl = obsdb.nearest(obstype,sensor,validtime,[0])
+    return [] if datafl is None else [datafl]
+
+#enddef find_obs
+
 ##%%%%%%%%%%%%%%%%%%%%  Wait for radar data %%%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 def copy_radar(dt,domains,wrkdir,conf) :
@@ -580,6 +612,7 @@ def copy_radar(dt,domains,wrkdir,conf) :
       radarswithindomain = [radar.name for radar in domains[0]['radars']]
 
     radconf = conf.obsconfs.radar
+    obsdb   = open_index(conf,'radar',dt,radconf.timerange)
 
     ##---------------- looking for radar files ----------------------
     radars = []
@@ -612,7 +645,7 @@ def copy_radar(dt,domains,wrkdir,conf) :
                 #datcmpr1  = '%s.gz' % datfile1
                 logger.debug(f'    Looking for radar data file {datfile1} ... ')
 
-                datafls = glob.glob(datfile1)
+                datafls = find_obs(obsdb,'radar',radname,currTime,datfile1)
                 if len(datafls)>=1:
                     logger.debug(f'    Found radar data file {datafls[0]} ... ')
                     radfound = True
@@ -629,12 +662,14 @@ def copy_radar(dt,domains,wrkdir,conf) :
             radars.append(radname)
             iradar += 1
 
+    if obsdb is not None: obsdb.close()
+
     logger.debug('    %d radar files found and they are [%s] ' %(len(radars),', '.join(radars) ))
 
     return radars
 #enddef copy_radar
 
-def copy_mrms(dt,obsconf,wrkdir) :
+def copy_mrms(dt,obsconf,wrkdir,conf) :
      ''' Wait for MRMS data at one specific time "dt".'''
 
      datestr = dt.strftime('%Y%m%d')
@@ -661,6 +696,7 @@ def copy_mrms(dt,obsconf,wrkdir) :
 
      waittime = 0
      while waittime < obsconf.maxwait  :
+         obsdb = open_index(conf,'mrms',dt,obsconf.timerange)
          for minrng in obsconf.timerange:
            currTime  = dt + timedelta(minutes=minrng)
 
@@ -672,8 +708,8 @@ def copy_mrms(dt,obsconf,wrkdir) :
 
            ## -------- Preprocessing each datfile to get obsfile ---
            i = 0
-           for datfile in datfiles:     # each level
-               datafls   = glob.glob(datfile)
+           for lvl,datfile in zip(mrmslvls,datfiles):     # each level
+               datafls   = find_obs(obsdb,'mrms',lvl,currTime,datfile)
                assert(len(datafls) <= 1)
                if len(datafls)==1 :
                   obsfileAb = os.path.join(destdir,os.path.basename(datafls[0]))
@@ -690,6 +726,8 @@ def copy_mrms(dt,obsconf,wrkdir) :
                logger.info('    Saved MRMS data at %s ... ' % (timstr))
                break
 
+         if obsdb is not None: obsdb.close()
+
          ## Continue waiting or exit
          if obsfound :
            break  # waittime loop
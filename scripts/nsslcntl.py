@@ -23,19 +23,19 @@
 import os
 import re
 import glob
-import shutil
-import gzip
 #import bz2
 #import sys
 
 import subprocess, threading
+import concurrent.futures
 import time, math
 from datetime import datetime, timedelta
 
 import namelist
 import prep_okmeso
+from obscatalog import ObsCatalog, srcnames
 
-from configBase import ExtMData, MyFileClass
+from configBase import ExtMData, MyFileClass, JobGraph, RadarCatalog
 
 
 class NSSLCase(threading.Thread):
@@ -104,8 +104,24 @@ class NSSLCase(threading.Thread):
 
         self.mutex = threading.Lock()
         self.kill_received = False
+        self.obswait = threading.local()   # cutoff of the observation preparer in this thread
         self.bucket = bucket
 
+        ## Workflow graph, each step takes inputs from its upstream steps
+        ## and is submitted with dependencies on those still in the queue
+        permember = []
+        if self.runcase.pipeline and 'real' in self.runConfig and 'wrf' in self.runConfig:
+            if self.runConfig['real'].numens is not None and \
+               self.runConfig['real'].numens == self.runConfig['wrf'].numens:
+                permember.append(('real', 'wrf'))      # each WRF member follows its own real
+
+        self.jobgraph = JobGraph(self.command, {
+            'metgrid': ('geogrid',),
+            'tinterp': ('metgrid',),
+            'real':    ('tinterp', 'metgrid'),
+            'wrf':     ('real',),
+        }, permember)
+
         threading.Thread.__init__(self)
 
         self.name = f'case-{caseconf.caseNo}_{self.domain.id:02d}'
@@ -126,6 +142,11 @@ class NSSLCase(threading.Thread):
             ## do analysis only
             if self.runcase.caseNo == 1:      # Analysis starting with external dataset
 
+                # observations only need the start time, not the background
+                obsfuture = None
+                if self.runcase.earlyobs:
+                    obsfuture = self.start_check_wait_obs(self.obstypes)
+
                 if self.cmprun <= 0:
                     extdat = self.check_link_extm(self.runcase.extsrcs)
                     if extdat is None:
@@ -136,13 +157,13 @@ class NSSLCase(threading.Thread):
                         self.run_ungrib(extdat, False)
 
                     if self.check_job('geogrid'):
-                        self.run_geogrid(extdat, True)
+                        self.run_geogrid(extdat, False)
 
                     if self.check_job('metgrid'):
-                        self.run_metgrid(extdat, True)
+                        self.run_metgrid(extdat, False)
 
                     if self.check_job('tinterp'):
-                        self.run_tinterp(extdat, True)
+                        self.run_tinterp(extdat, False)
 
                     bkgfiles = self.run_real(
                         extdat, wait=False, outmet='tinterp')
@@ -156,8 +177,15 @@ class NSSLCase(threading.Thread):
                     bkgfiles = [MyFileClass(os.path.join(wrkdir.replace(
                         self.command.wrkdir, self.runcase.rundirs.cmpdir), 'wrfinput_d01'), True) for wrkdir in wrkdirs]
 
-                validobs = self.check_wait_obs(
-                    self.obstypes)  # prepare observation data
+                if obsfuture is not None:
+                    validobs = obsfuture.result()
+                else:
+                    validobs = self.check_wait_obs(
+                        self.obstypes)  # prepare observation data
+
+                # the background files are needed from here
+                if not self.jobgraph.wait('real'):
+                    self.command.addlog(-1, "cntl.run", "ERROR: WPS/REAL jobs failed.")
 
                 if self.check_job('radremap') and len(validobs['radar']) > 0:
                     self.run_radar_remaps(validobs['radar'], bkgfiles[0])
@@ -204,6 +232,10 @@ class NSSLCase(threading.Thread):
             ## do analysis and forecast
             elif self.runcase.caseNo == 3:    # Analysis and Forecast based on external dataset
 
+                obsfuture = None
+                if self.runcase.earlyobs:
+                    obsfuture = self.start_check_wait_obs(self.obstypes)
+
                 extdat = self.check_link_extm(self.runcase.extsrcs)
                 if extdat is None:
                     self.command.addlog(-1, "cntl.run",
@@ -213,18 +245,25 @@ class NSSLCase(threading.Thread):
                     self.run_ungrib(extdat, False)
 
                 if self.check_job('geogrid'):
-                    self.run_geogrid(extdat, True)
+                    self.run_geogrid(extdat, False)
 
                 if self.check_job('metgrid'):
-                    self.run_metgrid(extdat, True)
+                    self.run_metgrid(extdat, False)
 
                 if self.check_job('tinterp'):
-                    self.run_tinterp(extdat, True)  # careful for error
+                    self.run_tinterp(extdat, False)  # careful for error
 
-                bkgfiles = self.run_real(extdat, wait=True, outmet='tinterp')
+                bkgfiles = self.run_real(extdat, wait=False, outmet='tinterp')
 
-                validobs = self.check_wait_obs(
-                    self.obstypes)  # prepare observation data
+                if obsfuture is not None:
+                    validobs = obsfuture.result()
+                else:
+                    validobs = self.check_wait_obs(
+                        self.obstypes)  # prepare observation data
+
+                # the background files are needed from here
+                if not self.jobgraph.wait('real'):
+                    self.command.addlog(-1, "cntl.run", "ERROR: WPS/REAL jobs failed.")
 
                 if self.check_job('radremap') and len(validobs['radar']) > 0:
                     self.run_radar_remaps(validobs['radar'], bkgfiles[0])
@@ -561,6 +600,8 @@ class NSSLCase(threading.Thread):
                 #outputintvl = self.runcase.fcstOutput
                 outputintvl = 600
 
+                pipeline = self.runcase.pipeline and len(afiles) > 1
+                joinjobs = []
                 for itime in range(0, endsecs+outputintvl, outputintvl):
                     currtime = self.runcase.startTime + \
                         timedelta(seconds=itime)
@@ -569,7 +610,7 @@ class NSSLCase(threading.Thread):
                         break
 
                     if self.check_job('joinwrf'):
-                        self.run_joinwrf(currtime, False)
+                        joinjobs.extend(self.run_joinwrf(currtime, False, pipeline) or [])
 
                     # if self.check_job('nclplt'):
                     #    outfiles = [os.path.join(wrfdir,'wrfout_d01_%s'%(currtime.strftime('%Y-%m-%d_%H:%M:%S'))) for wrfdir in afiles]
@@ -595,6 +636,9 @@ class NSSLCase(threading.Thread):
                     #            self.run_nclplt(afile=outfile,atime=time2d,wait=False,
                     #                            bfile=out2dfile,pltfields=['vor2d','ref2d'] )
 
+                if len(joinjobs) > 0:
+                    self.submit_joinwrf_members(joinjobs)
+
     # enddef run_post
 
     ####################################################################
@@ -896,6 +940,7 @@ class NSSLCase(threading.Thread):
         outfile = 'geo%02d.output' % self.domain.id
         jobid = self.command.run_a_program(
             executable, None, outfile, wrkdir, mpiconfig)
+        self.jobgraph.add('geogrid', jobid)
 
         # -------------- wait for it to be done -------------------
         if not self.command.wait_job('geogrid', jobid, wait):
@@ -987,14 +1032,19 @@ class NSSLCase(threading.Thread):
             self.command.addlog(
                 999, "cntl.met", f"Waiting for {ungribfile} ...")
 
-            if self.command.wait_for_files('run_metgrid', ungribfiles, None, 600, 5) == len(ungribfiles):
-                for srcfl, wrkdir in zip(ungribfiles, wrkdirs):
+            # link each member's file as soon as it is ready
+            wrkmap = {srcfl: [] for srcfl in ungribfiles}
+            for srcfl, wrkdir in zip(ungribfiles, wrkdirs):
+                wrkmap[srcfl].append(wrkdir)
+
+            for srcfl, ready in self.command.as_files_ready('run_metgrid', ungribfiles, None, 600, 5):
+                if not ready:
+                    self.command.addlog(-2, "cntl.met",
+                                        f'File "{srcfl}" is missed')
+                for wrkdir in wrkmap[srcfl]:
                     relfl = os.path.join(wrkdir, ungribfile)
                     if os.path.lexists(relfl):  os.unlink(relfl)
                     os.symlink(srcfl, relfl)
-            else:
-                self.command.addlog(-2, "cntl.met",
-                                    f'File "{ungribfile}" is missed')
 
             currtime = currtime + timedelta(hours=extsrc.hourIntvl)
 
@@ -1028,8 +1078,10 @@ class NSSLCase(threading.Thread):
         # ------------ run the program from command line ------------------
         hhmmstr = self.runcase.startTime.strftime('%H%M')
         outfile = 'met%d_%s.output' % (self.runcase.caseNo, hhmmstr)
+        depends = self.jobgraph.depends('metgrid')
         jobid = self.command.run_a_program(
-            executable, None, outfile, wrkbas, mpiconfig)
+            executable, None, outfile, wrkbas, mpiconfig, depends=depends)
+        self.jobgraph.add('metgrid', jobid, depends)
 
         # -------------- wait for it to be done -------------------
         if not self.command.wait_job('metgrid', jobid, wait):
@@ -1167,8 +1219,10 @@ class NSSLCase(threading.Thread):
             hhmmstr = self.runcase.startTime.strftime('%H%M')
             outfile = 'ttrp%d_%s.output' % (self.runcase.caseNo, hhmmstr)
 
+            depends = self.jobgraph.depends('tinterp')
             jobid = self.command.run_a_program(
-                executable, nmlfile, outfile, wrkbas, mpiconfig)
+                executable, nmlfile, outfile, wrkbas, mpiconfig, depends=depends)
+            self.jobgraph.add('tinterp', jobid, depends)
 
         # -------------- wait for it to be done -------------------
 
@@ -1221,6 +1275,19 @@ class NSSLCase(threading.Thread):
 
         fcstlength = realend-realstart
 
+        # metgrid/tinterp jobs still in the queue, their outputs do not exist yet
+        depends = self.jobgraph.depends('real')
+
+        # with split output (io_form_metgrid > 100), a metgrid job still in
+        # the queue writes one met_em file per process, link those names too
+        metsuffixes = ['']
+        metjob = self.jobgraph.get('metgrid')
+        if metjob is not None and any(dep.split(':')[-1] == str(metjob.id) for dep in depends):
+            metconf = self.runConfig.metgrid
+            metnml  = namelist.decode_namelist_file(self.runcase.getNamelistTemplate('metgrid'))
+            if 'io_form_metgrid' in metnml['metgrid'] and metnml['metgrid'].io_form_metgrid > 100 and metconf.mpi:
+                metsuffixes += ['_%04d' % i for i in range(metconf.ntotal)]
+
         for metdir, wrkdir in zip(metdirs, wrkdirs):
             ftime = realstart
             while ftime <= realend:
@@ -1230,7 +1297,10 @@ class NSSLCase(threading.Thread):
                 #li = basfl.rsplit('met_em.d')
                 #readyfl = 'met_emReady.d'.join(li)
                 # if self.command.wait_for_a_file('run_real',readyfl,1800,300,10,skipread=True):
-                for absfl in glob.iglob('%s*' % basfl):
+                absfls = glob.glob('%s*' % basfl)
+                if len(absfls) == 0 and len(depends) > 0:
+                    absfls = [basfl+suffix for suffix in metsuffixes]
+                for absfl in absfls:
                     relfl = os.path.join(wrkdir, os.path.basename(absfl))
                     if not os.path.lexists(relfl):
                         self.command.copyfile(absfl, relfl, hardcopy=False)
@@ -1277,20 +1347,15 @@ class NSSLCase(threading.Thread):
                  'dx':  self.domain.dx,
                  'dy':  self.domain.dy,
                  }
-        iens = 0
-        for nmlfile in nmlfiles:
-            tmplinput = self.runcase.getNamelistTemplate(
-                'real', mpiconfig.numens if mpiconfig.numens is None else iens)
-            nmlgrp = namelist.decode_namelist_file(tmplinput)
-
-            if extsrc.extname == 'HRRR':
-                nmlin["p_top_requested"] = 5000
-            elif extsrc.extname in ('HRRRX', 'HRRRE'):
-                nmlin["p_top_requested"] = 2000
+        if extsrc.extname == 'HRRR':
+            nmlin["p_top_requested"] = 5000
+        elif extsrc.extname in ('HRRRX', 'HRRRE'):
+            nmlin["p_top_requested"] = 2000
 
-            nmlgrp.merge(nmlin)
-            nmlgrp.writeToFile(nmlfile)
-            iens += 1
+        tmplinputs = [self.runcase.getNamelistTemplate(
+                          'real', mpiconfig.numens if mpiconfig.numens is None else iens)
+                      for iens in range(len(nmlfiles))]
+        namelist.render_namelist_files(tmplinputs, nmlfiles, nmlin)
 
         # -------------- run the program --------------------------
 
@@ -1299,7 +1364,8 @@ class NSSLCase(threading.Thread):
 
         if self.check_job('real'):
             jobid = self.command.run_a_program(
-                executable, None, outfile, wrkbas, mpiconfig)
+                executable, None, outfile, wrkbas, mpiconfig, depends=depends)
+            self.jobgraph.add('real', jobid, depends)
 
             # -------------- wait for it to be done -------------------
             # print 'checking real with ', status,jobid,wait
@@ -1317,8 +1383,12 @@ class NSSLCase(threading.Thread):
 
     # %%%%%%%%%%%%%%%%%  Link 9 km real from early run  %%%%%%%%%%%%%%%%
 
-    def link_wait_real(self, wrfdir, iens):
-        '''find valid real output from an early run'''
+    def link_wait_real(self, wrfdir, iens, wait=True):
+        '''find valid real output from an early run
+
+        wait : False when the WRF job is submitted with a dependency on
+               the real job, so the files are only linked.
+        '''
 
         ##
         # --------------------- find a valid real run ----------------
@@ -1339,7 +1409,7 @@ class NSSLCase(threading.Thread):
 
         maxwaitime = 30*60
         waitime = 0
-        realdone = False
+        realdone = not wait
         while not realdone and waitime < maxwaitime:
             self.command.addlog(
                 0, "cntl.wreal", 'Waiting for real rsl.error.0000. \n')
@@ -1413,12 +1483,15 @@ class NSSLCase(threading.Thread):
 
         wrkbas, wrkdirs = self.runcase.getwrkdir(
             self.caseDir, 'wrf', numens=mpiconfig.numens)
+
+        depends = self.jobgraph.depends('wrf')   # real job still in the queue
+
         for iens, wrkdir in enumerate(wrkdirs):
             if not os.path.lexists(wrkdir):
                 os.mkdir(wrkdir)
 
             if self.runcase.caseNo == 1:     # did not run wrfdaupdate
-                if not self.link_wait_real(wrkdir, iens):
+                if not self.link_wait_real(wrkdir, iens, wait=(len(depends) == 0)):
                     return None
 
             # ------------------------ copy working files ----------------
@@ -1484,35 +1557,33 @@ class NSSLCase(threading.Thread):
                  'dy':  self.domain.dy,
                  }
 
-        for iens, nmlfile in enumerate(nmlfiles):
-            tmplinput = self.runcase.getNamelistTemplate(
-                'wrf', iens if mpiconfig.numens is not None else None)
-            nmlgrp = namelist.decode_namelist_file(tmplinput)
-
-            if extsrc.extname == 'HRRR':
-                nmlin["p_top_requested"] = 5000
-            elif extsrc.extname in ('HRRRX', 'HRRRE'):
-                nmlin["p_top_requested"] = 2000
+        if extsrc.extname == 'HRRR':
+            nmlin["p_top_requested"] = 5000
+        elif extsrc.extname in ('HRRRX', 'HRRRE'):
+            nmlin["p_top_requested"] = 2000
 
-            nmlgrp.merge(nmlin)
-
-            if self.runcase.caseNo in (6, 7):
-                nmlgrp["time_control"].iofields_filename = "forecast_vars_d01.txt"
-                nmlgrp["time_control"].ignore_iofields_warning = ".true."
-                if self.runcase.hybrid > 0:
-                    nmlgrp["time_control"].auxhist7_outname = "wrfhyb_d<domain>_<date>"
-                else:
-                    nmlgrp["time_control"].auxhist7_outname = "wrfvar_d<domain>_<date>"
-                nmlgrp["time_control"].frames_per_auxhist7 = 1
-                nmlgrp["time_control"].io_form_auxhist7 = 2
-                nmlgrp["time_control"].gsd_diagnostics = 1
-                nmlgrp["time_control"].auxhist7_interval = 10
-                nmlgrp["time_control"].reset_interval1 = 10
-                nmlgrp["physics"].prec_acc_dt = 10
+        # set in the namelist blocks, added if not in the template
+        nmlin["time_control"] = {}
+        if self.runcase.caseNo in (6, 7):
+            nmlin["time_control"]["iofields_filename"] = "forecast_vars_d01.txt"
+            nmlin["time_control"]["ignore_iofields_warning"] = ".true."
+            if self.runcase.hybrid > 0:
+                nmlin["time_control"]["auxhist7_outname"] = "wrfhyb_d<domain>_<date>"
+            else:
+                nmlin["time_control"]["auxhist7_outname"] = "wrfvar_d<domain>_<date>"
+            nmlin["time_control"]["frames_per_auxhist7"] = 1
+            nmlin["time_control"]["io_form_auxhist7"] = 2
+            nmlin["time_control"]["gsd_diagnostics"] = 1
+            nmlin["time_control"]["auxhist7_interval"] = 10
+            nmlin["time_control"]["reset_interval1"] = 10
+            nmlin["physics"] = { "prec_acc_dt" : 10 }
 
-            nmlgrp["time_control"].nocolons = ".true."
+        nmlin["time_control"]["nocolons"] = ".true."
 
-            nmlgrp.writeToFile(nmlfile)
+        tmplinputs = [self.runcase.getNamelistTemplate(
+                          'wrf', iens if mpiconfig.numens is not None else None)
+                      for iens in range(len(nmlfiles))]
+        namelist.render_namelist_files(tmplinputs, nmlfiles, nmlin)
 
         # -------------- run the program from command line -------------------
 
@@ -1525,7 +1596,8 @@ class NSSLCase(threading.Thread):
             hhmmstr = self.runcase.startTime.strftime('%H%M')
             outfile = 'wrf%d_%s.output' % (self.runcase.caseNo, hhmmstr)
             jobid = self.command.run_a_program(
-                executable, None, outfile, wrkbas, mpiconfig)
+                executable, None, outfile, wrkbas, mpiconfig, depends=depends)
+            self.jobgraph.add('wrf', jobid, depends)
 
             # -------------- wait for it to be done -------------------
             if not self.command.wait_job('wrf', jobid, wait, 12*3600):
@@ -1543,7 +1615,14 @@ class NSSLCase(threading.Thread):
     # enddef run_wrf
     # ========================== JOINWRF =============================
 
-    def run_joinwrf(self, currTime=None, wait=False):
+    def run_joinwrf(self, currTime=None, wait=False, pipeline=False):
+        '''
+          Join WRF split output files at currTime
+
+          pipeline : do not wait for all members, but return a list of
+                     (iens, wrfile, nmlfile, outfile) for the members to
+                     be joined, see submit_joinwrf_members
+        '''
 
         executable = os.path.join(self.runDirs.vardir, 'bin', 'joinwrfh')
         tmplinput = self.runcase.getNamelistTemplate('joinwrf')
@@ -1578,7 +1657,7 @@ class NSSLCase(threading.Thread):
             fileformat = nmlwrf['time_control'].io_form_history
 
         if fileformat != 102:
-            return    # do not need to run joinwrf
+            return [] # do not need to run joinwrf
 
         # ---------------- make namelist file ------------------------
 
@@ -1591,14 +1670,19 @@ class NSSLCase(threading.Thread):
 
         fileready = f"{fileheader}_d01_{currTime:%Y-%m-%d_%H:%M:%S}_ready"
         wrfiles = [os.path.join(wrkdir, fileready) for wrkdir in wrkdirs]
-        if self.command.wait_for_files('JOIN', wrfiles, 2, 2, 1) == len(wrkdirs):
+        if pipeline:
+            members = [iens for iens, readyfl in enumerate(wrfiles) if not os.path.lexists(readyfl)]
+            if len(members) == 0:
+                self.command.addlog(0, "JOIN", f'Found {fileready}')
+                return []
+        elif self.command.wait_for_files('JOIN', wrfiles, 2, 2, 1) == len(wrkdirs):
             self.command.addlog(0, "JOIN", f'Found {fileready}')
-            return
+            return []
 
         lastpath = wrfconf.ntotal-1
         wrfile = f"{fileheader}_d01_{currTime:%Y-%m-%d_%H:%M:%S}_{lastpath:04}"
         wrfiles = [os.path.join(wrkdir, wrfile) for wrkdir in wrkdirs]
-        if self.command.wait_for_files('JOIN', wrfiles, 7200, 600, 5) != len(wrkdirs):
+        if not pipeline and self.command.wait_for_files('JOIN', wrfiles, 7200, 600, 5) != len(wrkdirs):
             self.command.addlog(-1, "JOIN", 'WRF output Files not ready')
 
         # arbitrary number of seconds
@@ -1640,6 +1724,9 @@ class NSSLCase(threading.Thread):
 
         outfile = f'joinwrf{self.runcase.caseNo}_{ftime//60:03}.output'
 
+        if pipeline:    # submitted with the other members of this time
+            return [(iens, wrfiles[iens], nmlfile, outfile) for iens in members]
+
         jobid = self.command.run_joinwrf(
             executable, nmlfile, outfile, wrkbas, jconf)
 
@@ -1648,8 +1735,73 @@ class NSSLCase(threading.Thread):
             self.command.addlog(-1, "JOIN", f'job failed: {jobid}')
             #raise SystemExit()
 
+        return []
     # enddef run_joinwrf
 
+    # ================== JOINWRF for each member ======================
+
+    def submit_joinwrf_members(self, joinjobs, maxwaitime=7200):
+        '''
+          Submit JOINWRF for each (member, output time) as soon as its WRF
+          output is complete. At each pass over the files, all pairs that
+          became ready are submitted together as one job array, one task
+          for each member, and the job is not waited for.
+
+          A member whose next output does not come within "maxwaitime"
+          seconds after its previous one is skipped with a warning, the
+          other members go on.
+
+          joinjobs   : list of (iens, wrfile, nmlfile, outfile) from run_joinwrf
+          maxwaitime : seconds to wait for the next output of each member
+        '''
+
+        executable = os.path.join(self.runDirs.vardir, 'bin', 'joinwrfh')
+        jconf = self.runConfig['joinwrf']
+        wrfconf = self.runConfig['wrf']
+
+        wrkbas, _wrkdirs = self.runcase.getwrkdir(
+            self.caseDir, 'wrf', numens=wrfconf.numens)
+
+        pairs = {}              # wrfile: (iens, nmlfile, outfile)
+        for iens, wrfile, nmlfile, outfile in joinjobs:
+            pairs[wrfile] = (iens, nmlfile, outfile)
+
+        lastready = dict.fromkeys([iens for iens, _nmlfile, _outfile in pairs.values()], time.time())
+        lostmembers = set()
+
+        def giveup(wrfile):
+            iens = pairs[wrfile][0]
+            return iens in lostmembers or time.time()-lastready[iens] > maxwaitime
+
+        nbatch = 0
+        for readys, fails in self.command.files_ready_by_pass('JOIN', list(pairs.keys()),
+                                                              None, 600, 5, giveup=giveup):
+            if self.kill_received:
+                return
+
+            for wrfile in fails:
+                iens = pairs[wrfile][0]
+                if iens not in lostmembers:
+                    lostmembers.add(iens)
+                    self.command.addlog(1, "JOIN", f'Member {iens} skipped, WRF output not ready: {os.path.basename(wrfile)}')
+
+            if len(readys) == 0: continue
+
+            jobs = {}
+            for wrfile in readys:
+                iens, nmlfile, outfile = pairs[wrfile]
+                jobs.setdefault(iens, []).append((nmlfile, outfile))
+                lastready[iens] = time.time()
+
+            nbatch += 1
+            jobname = f'joinwrf{self.runcase.caseNo}_b{nbatch:03}'
+            jobid = self.command.run_joinwrf_batch(
+                executable, jobs, jobname, wrkbas, jconf)
+            if not self.command.wait_job('joinwrf%02d' % self.domain.id, jobid, False):
+                self.command.addlog(-1, "JOIN", f'job failed: {jobid}')
+
+    # enddef submit_joinwrf_members
+
     # ======================== radremap   ==============================
 
     def run_radremap(self, radname, bkgfile, wait):
@@ -1809,18 +1961,30 @@ class NSSLCase(threading.Thread):
             else:
                 ensfileopt = 1        # WRF input file
 
-            # Waiting for background files, just in case
+            # Waiting for background files, just in case. Each member's
+            # background is renamed as soon as its ready file appears
             bkgstatus = [bkgfile.status for bkgfile in bkgfiles]
             if not all(bkgstatus):
-                bkgreadys = [bkgfile.ready for bkgfile in bkgfiles]
-                if self.command.wait_for_files('run_news3dvar', bkgreadys, None, 120, 3, skipread=True) < len(bkgfiles):
+                bkgmap = {}
+                for bkgfile in bkgfiles:
+                    bkgmap.setdefault(bkgfile.ready, []).append(bkgfile)
+
+                nready = 0
+                for readyfl, ready in self.command.as_files_ready('run_news3dvar', list(bkgmap.keys()), None, 120, 3, skipread=True):
+                    if not ready: continue
+                    for bkgfile in bkgmap[readyfl]:
+                        nready += 1
+                        bkgfile.rename(self.runcase.startTime,
+                                       self.runcase.ntimesample, self.runcase.timesamin)
+
+                if nready < len(bkgfiles):
                     self.command.addlog(-1, "cntl.3dvar",
                                         'Not all background files are ready, please check ....')
 
                 for bkgfile in bkgfiles:
                     bkgfile.ready = True
 
-            for bkgfile in bkgfiles:
+            for bkgfile in bkgfiles:       # those ready before, the others are done
                 bkgfile.rename(self.runcase.startTime,
                                self.runcase.ntimesample, self.runcase.timesamin)
 
@@ -2074,6 +2238,39 @@ class NSSLCase(threading.Thread):
         nmlfile = 'news3dvar.input'
         nmlfiles = [os.path.join(wrkdir, nmlfile) for wrkdir in wrkdirs]
 
+        nmlbase = { 'initime'     : self.runcase.startTime.strftime('%Y-%m-%d.%H:%M:00'),
+                    'modelopt'    : 2,
+                    'inigbf'      : 'xxxxxx',
+                    #'hdmpfmt'     : hdmpfmt
+                    'runname'     : '%s_%s' % (self.runcase.runname,timstr),
+                    'nradfil'     : nradfile,
+                    'radfname'    : radfnames,
+                    'nsngfil'     : nsngfile,
+                    'sngfname'    : sngfname,
+                    'sngtmchk'    : sngtmchk,
+                    'nconvfil'    : nconvfil,
+                    'convfname'   : convfname,
+                    'nuafil'      : nuafile,
+                    'uafname'     : uafnames,
+                    'ncwpfil'     : ncwpfile,
+                    'cwpfname'    : cwpfname,
+                    'nlgtfil'     : nlgtfile,
+                    'lightning_files': lgtfname,
+                    'dirname'     : './',
+                    'nproc_x'     : mpiconfig.nproc_x,
+                    'nproc_y'     : mpiconfig.nproc_y,
+                    'max_fopen'   : mpiconfig.nproc_x*mpiconfig.nproc_y,
+                    'ensdirname'  : ensdirname,
+                    'ensfileopt'  : ensfileopt,
+                    'nensmbl'     : nensemble,
+                    'ntimesample' : self.runcase.ntimesample,
+                    'stimesample' : self.runcase.timesamin*60,
+                    'cov_factor'  : cov_factor,
+                    'icycle'      : self.domain.cycle_num
+                  }
+
+        tmplinputs = []
+        nmldeltas  = []
         for iens, absnmlfile in enumerate(nmlfiles):
             tmplinput = self.runcase.getNamelistTemplate(
                 'news3dvar', mpiconfig.numens if mpiconfig.numens is None else iens)
@@ -2093,38 +2290,9 @@ class NSSLCase(threading.Thread):
             bkgfiles[iens].rename(
                 self.runcase.startTime, self.runcase.ntimesample, self.runcase.timesamin)
 
-            nmlin = { 'initime'     : self.runcase.startTime.strftime('%Y-%m-%d.%H:%M:00'),
-                      'inifile'     : bkgfiles[iens].name,
-                      'modelopt'    : 2,
-                      'inigbf'      : 'xxxxxx',
-                      #'hdmpfmt'     : hdmpfmt
-                      'runname'     : '%s_%s' % (self.runcase.runname,timstr),
+            nmlin = { 'inifile'     : bkgfiles[iens].name,
                       'refile'      : mrmsfiles[0],
-                      'nradfil'     : nradfile,
-                      'radfname'    : radfnames,
-                      'nsngfil'     : nsngfile,
-                      'sngfname'    : sngfname,
-                      'sngtmchk'    : sngtmchk,
-                      'nconvfil'    : nconvfil,
-                      'convfname'   : convfname,
-                      'nuafil'      : nuafile,
-                      'uafname'     : uafnames,
-                      'ncwpfil'     : ncwpfile,
-                      'cwpfname'    : cwpfname,
-                      'nlgtfil'     : nlgtfile,
-                      'lightning_files': lgtfname,
-                      'dirname'     : './',
-                      'nproc_x'     : mpiconfig.nproc_x,
-                      'nproc_y'     : mpiconfig.nproc_y,
-                      'max_fopen'   : mpiconfig.nproc_x*mpiconfig.nproc_y,
-                      'ensdirname'  : ensdirname,
-                      'ensfileopt'  : ensfileopt,
-                      'nensmbl'     : nensemble,
                       'iensmbl'     : iens,
-                      'ntimesample' : self.runcase.ntimesample,
-                      'stimesample' : self.runcase.timesamin*60,
-                      'cov_factor'  : cov_factor,
-                      'icycle'      : self.domain.cycle_num
                     }
 
             ##
@@ -2209,13 +2377,14 @@ class NSSLCase(threading.Thread):
                         nmlin[nmlvar] = [ele for idx, ele in enumerate(
                             nmlvalues) if idx not in delpass]
                         #print(f"after:  {nmlvar} => {nmlin[nmlvar]}")
-                nmlgrp['adas_const'].npass = npass-len(delpass)
+                nmlin['adas_const'] = { 'npass' : npass-len(delpass) }
                 break
 
             #
-            # To write the namelist file at run-time based on nmlgrp & nmlin
+            # The namelist file is written at run-time based on nmlbase & nmlin
             #
-            nmlgrp.merge(nmlin)
+            tmplinputs.append(tmplinput)
+            nmldeltas.append(nmlin)
             # if iens == 0:
             #    #nmlgrp["var_ens"].ntimesample = 1    # control member always uses 1
             #    if inittime: nmlgrp["var_ens"].kgain_factor = 1.0      # control member always uses 1 at inittime
@@ -2223,7 +2392,6 @@ class NSSLCase(threading.Thread):
             #    #nmlgrp["var_ens"].ntimesample = self.runcase.ntimesample
             #    nmlgrp["var_ens"].cov_factor = 0.0      # control member always uses 1 at inittime
             #
-            nmlgrp.writeToFile(absnmlfile)
 
             # -------------- Copy rtma_random_flips ----------------------
 
@@ -2232,6 +2400,8 @@ class NSSLCase(threading.Thread):
                     self.command.copyfile(
                         randomsrc, randomfiles[iens], hardcopy=False)
 
+        namelist.render_namelist_files(tmplinputs, nmlfiles, nmlbase, nmldeltas)
+
         # -------------- run the program  ----------------
         if self.check_job('news3dvar') and not skip3dvar:
 
@@ -3095,11 +3265,34 @@ class NSSLCase(threading.Thread):
                     0, "cntl.extm", f"Waiting for {extdname}:{exttime:%Y%m%d_%H:%M:%S} in {extdat} ...")
                 allextfils = [
                     extfile for extmfiles in extfiles for extfile in extmfiles]
-                itotal = self.command.wait_for_files('link_extm', allextfils,
+
+                # where each file goes, the same file can be used by several members
+                linkto = {extfile: [] for extfile in allextfils}
+                for idx, extmfiles in enumerate(extfiles):
+                    flname = self.gribfile_name(idx)
+                    for memid, (extmdir, extfile) in enumerate(zip(extmdirs, extmfiles)):
+                        linkto[extfile].append((memid, os.path.join(extmdir, flname)))
+
+                if dowrk:
+                    self.clean_gribfiles(extmdirs)    # links left from a previous try or run
+
+                # link each file as soon as it is ready
+                itotal = 0
+                for extfile, ready in self.command.as_files_ready('link_extm', allextfils,
                                                      None, extconf.waitparms.ready, extconf.waitparms.tick,
-                                                     expectSize=extconf.waitparms.size)
+                                                     expectSize=extconf.waitparms.size):
+                    if not ready: continue
+
+                    itotal += len(linkto[extfile])
+                    if dowrk:
+                        for memid, gribfl in linkto[extfile]:
+                            self.command.addlog(
+                                0, "EXTM", f"member {memid:03} - {extfile} -> {os.path.basename(gribfl)}")
+                            self.command.copyfile(extfile, gribfl)
 
                 if itotal < ntotal:
+                    if dowrk:
+                        self.clean_gribfiles(extmdirs)    # partial set of this try
                     self.command.addlog(0, "cntl.extm",
                                         f"= Found {itotal}/{ntotal} files {extdname}:{exttime:%Y%m%d_%H:%M:%S} in {extdat}")
                     exttime = exttime - timedelta(hours=srcHour)
@@ -3119,34 +3312,9 @@ class NSSLCase(threading.Thread):
             break
 
         #
-        # Finally, find one set of files.
-        # Link them into ungrib directory
+        # Finally, one set of files is found and linked into ungrib directory
         #
-        if itotal == ntotal:
-            if dowrk:
-                for idx, extmfiles in enumerate(extfiles):
-                    self.command.addlog(
-                        0, "EXTM", f"{appext} files for all members - {idx:03}:")
-                    for memid, filepath in enumerate(extmfiles):
-                        self.command.addlog(
-                            0, "EXTM", f"member {memid:03} - {filepath}")
-
-                aord = ord('A')
-
-                for ij, extmfiles in enumerate(extfiles):
-                    (ii, i1) = divmod(ij, 26)
-                    (i3, i2) = divmod(ii, 26)
-                    if i3 >= aord+26:
-                        raise ValueError('RAN OUT OF GRIB FILE SUFFIXES!')
-                    flname = 'GRIBFILE.%s%s%s' % (
-                        chr(i3+aord), chr(i2+aord), chr(i1+aord))
-                    # print flname
-                    for extmdir, extfile in zip(extmdirs, extmfiles):
-                        destfl = os.path.join(extmdir, flname)
-                        if os.path.lexists(destfl):
-                            os.unlink(destfl)
-                        self.command.copyfile(extfile, destfl)
-        else:
+        if itotal != ntotal:
             self.command.addlog(-1, "EXTM", "Cannot find valid GRIB files.")
 
         #
@@ -3190,6 +3358,29 @@ class NSSLCase(threading.Thread):
         return extsrc
     # enddef check_link_extm
 
+    def clean_gribfiles(self, extmdirs):
+        ''' Remove GRIBFILE.* links in the ungrib directories '''
+        for extmdir in extmdirs:
+            for gribfl in glob.glob(os.path.join(extmdir, 'GRIBFILE.*')):
+                os.unlink(gribfl)
+
+    # enddef clean_gribfiles
+
+    # %%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+    @staticmethod
+    def gribfile_name(ij):
+        '''GRIBFILE.AAA, GRIBFILE.AAB, ... for the ij-th external file'''
+        aord = ord('A')
+
+        (ii, i1) = divmod(ij, 26)
+        (i3, i2) = divmod(ii, 26)
+        if i3 >= 26:
+            raise ValueError('RAN OUT OF GRIB FILE SUFFIXES!')
+        return 'GRIBFILE.%s%s%s' % (chr(i3+aord), chr(i2+aord), chr(i1+aord))
+
+    # enddef gribfile_name
+
     # %%%%%%%%%%%%%%%%%  Preprocess Observation data %%%%%%%%%%%%%%%%%%%
 
     def check_wait_obs(self, obses):
@@ -3210,11 +3401,13 @@ class NSSLCase(threading.Thread):
         retobs = {'radar': [], 'ua': [], 'sng': [], 'conv': [], 'cwp': [],
                   'lightning1': [], 'lightning2': []}
 
+        preparers = {}      # obstype: (obskey, preparer, arguments)
         for obstype in obses:
             obsconf = self.runcase.getObsConfig(obstype)
 
             if obstype == 'radar':
-                retobs['radar'] = self.check_wait_radar(startime, obsconf)
+                preparers[obstype] = ('radar', self.check_wait_radar,
+                                      (startime, obsconf))
                 #retobs['radar'] = self.check_wait_radar_radial(startime,obsconf.datdir)
                 continue
 
@@ -3222,25 +3415,85 @@ class NSSLCase(threading.Thread):
                 continue
 
             if obstype == "lightning1":
-                retobs['lightning1'] = self.check_wait_ENTLN(
-                    obstype, startime, obsconf, wrkdirs[0])
+                preparers[obstype] = ('lightning1', self.check_wait_ENTLN,
+                                      (obstype, startime, obsconf, wrkdirs[0]))
                 continue
 
             if obstype == "lightning2":
-                retobs['lightning2'] = self.check_wait_GLM(
-                    obstype, startime, obsconf, wrkdirs[0])
+                preparers[obstype] = ('lightning2', self.check_wait_GLM,
+                                      (obstype, startime, obsconf, wrkdirs[0]))
                 continue
 
             if obsconf.typeof in ('ua', 'cwp', 'conv'):
-                retobs[obsconf.typeof] = self.check_wait_datfile(
-                    obstype, startime, obsconf, wrkdirs[0])
+                preparers[obstype] = (obsconf.typeof, self.check_wait_datfile,
+                                      (obstype, startime, obsconf, wrkdirs[0]))
             elif obsconf.typeof == 'sng':
-                retobs['sng'] = self.check_wait_sng(
-                    obstype, startime, obsconf, wrkdirs[0])
+                preparers[obstype] = ('sng', self.check_wait_sng,
+                                      (obstype, startime, obsconf, wrkdirs[0]))
             else:
                 self.command.addlog(-1, "cntl.obs",
                                     '    Error: unsupport obs type %s ... ' % (obsconf.typeof))
 
+        ##
+        # Each observation type waits for its own data concurrently,
+        # the preparers stop waiting at the analysis cutoff.
+        ##
+        time0 = time.time()
+        deadline = None
+        if self.runcase.obscutoff is not None:
+            deadline = time0 + self.runcase.obscutoff
+        cancel = threading.Event()      # set for the preparers left behind
+        staging = {'cond': threading.Condition(), 'busy': 0}   # side effects in progress
+
+        def timed_preparer(obstype, preparer, args):
+            self.obswait.deadline = deadline
+            self.obswait.cancel = cancel
+            self.obswait.staging = staging
+            t0 = time.time()
+            files = preparer(*args) or []
+            if cancel.is_set():
+                self.command.addlog(1, "cntl.obs",
+                                    f'"{obstype}" finished after the analysis cutoff, its {len(files)} files are not used')
+            else:
+                self.command.addlog(0, "cntl.obs",
+                                    f'Prepared {len(files)} "{obstype}" files in {time.time()-t0:.1f} seconds')
+            return files
+
+        if len(preparers) > 0:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(preparers), thread_name_prefix='obs')
+            futures = {executor.submit(timed_preparer, obstype, preparer, args): obstype
+                       for obstype, (_obskey, preparer, args) in preparers.items()}
+
+            # a preparer may be checking file stability when the cutoff
+            # is reached, give it a grace period before leaving it behind
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline-time.time(), 0) + self.runcase.obsgrace
+            done, notdone = concurrent.futures.wait(futures, timeout)
+            if len(notdone) > 0:
+                # the late preparers stop at their next check and stage
+                # nothing more, let those staging right now finish first
+                with staging['cond']:
+                    cancel.set()
+                    if not staging['cond'].wait_for(lambda: staging['busy'] == 0,
+                                                    self.runcase.obsgrace):
+                        self.command.addlog(1, "cntl.obs",
+                                            f'{staging["busy"]} late preparers are still staging files at the analysis cutoff')
+            executor.shutdown(wait=False)
+
+            for future, obstype in futures.items():    # keep the order in obses
+                if future in done:
+                    retobs[preparers[obstype][0]] = future.result()
+                else:
+                    self.command.addlog(1, "cntl.obs",
+                                        f'"{obstype}" is not ready at the analysis cutoff, skipped.')
+
+            self.command.addlog(0, "cntl.obs",
+                                f'Observation preparation done in {time.time()-time0:.1f} seconds')
+            if self.command.obscache is not None:
+                self.command.addlog(0, "cntl.obs", self.command.obscache.summary())
+
         ##
         # Log the observation files
         ##
@@ -3265,6 +3518,91 @@ class NSSLCase(threading.Thread):
         return validobs
     # enddef check_wait_obs
 
+    def start_check_wait_obs(self, obses):
+        '''
+        Start check_wait_obs in a background thread and return a future
+        for its result, which is passed to run_radar_remaps/run_news3dvar.
+        '''
+
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f'{self.name}-obs')
+        future = executor.submit(self.check_wait_obs, obses)
+        executor.shutdown(wait=False)
+
+        self.command.addlog(0, "cntl.obs", "Started observation preparation")
+        return future
+    # enddef start_check_wait_obs
+
+    def before_obs_cutoff(self):
+        ''' Whether the observation preparers should keep waiting '''
+
+        if self.kill_received:
+            return False
+
+        cancel = getattr(self.obswait, 'cancel', None)
+        if cancel is not None and cancel.is_set():
+            return False
+
+        deadline = getattr(self.obswait, 'deadline', None)
+        return deadline is None or time.time() < deadline
+    # enddef before_obs_cutoff
+
+    def obs_stage(self, func, *args, **kwargs):
+        '''
+        Run a side effect of an observation preparer, i.e. staging files
+        in the work directory or setting the domain, unless the preparer
+        was left behind at the analysis cutoff. Returns None if skipped.
+
+        Staging may still go on within the grace period after the cutoff,
+        so it checks the cancel event instead of the deadline.
+        '''
+
+        staging = getattr(self.obswait, 'staging', None)
+        if staging is None:         # not run from check_wait_obs
+            return func(*args, **kwargs)
+
+        with staging['cond']:
+            if self.kill_received or self.obswait.cancel.is_set():
+                return None
+            staging['busy'] += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with staging['cond']:
+                staging['busy'] -= 1
+                staging['cond'].notify_all()
+    # enddef obs_stage
+
+    def obs_index(self, obstype, startime, timerange):
+        '''
+        The index of the data feeds (runcase.obscatalog, kept by obscatalog.py
+        running separately) if it holds files of "obstype" around "startime",
+        otherwise None to look in the data feeds directly, e.g. retro runs or
+        times out of the lookback of the indexer.
+
+        It is opened for one pass of a waiting loop, the caller closes it.
+        '''
+
+        if self.runcase.obscatalog is None or not os.path.lexists(self.runcase.obscatalog):
+            return None
+
+        obsdb = ObsCatalog(self.runcase.obscatalog)
+        if obsdb.covers(obstype, startime, timerange):
+            return obsdb
+
+        obsdb.close()
+        return None
+    # enddef obs_index
+
+    @staticmethod
+    def obs_exists(obsdb, obstype, datfile):
+        ''' Whether "datfile" is in the data feed, a stable file in the index "obsdb" if not None '''
+
+        if obsdb is None:
+            return os.path.lexists(datfile)
+        return obsdb.stable(obstype, datfile)
+    # enddef obs_exists
+
     # %%%%%%%%%%%%%%%%%  Wait for radar data %%%%%%%%%%%%%%%%%%%%%%%%%%%
 
     def check_wait_radar(self, startime, obsconf):
@@ -3289,7 +3627,7 @@ class NSSLCase(threading.Thread):
             for radfl in radfls:
                 radflb = os.path.basename(radfl)
                 radfile = os.path.join(wrkdir, radflb)
-                self.command.copyfile(radfl, radfile, hardcopy=False)
+                self.obs_stage(self.command.copyfile, radfl, radfile, hardcopy=False)
                 radar = radflb.partition("RADR_")[2].partition(timstr)[0]
                 radars.append(radar)
         else:
@@ -3297,48 +3635,58 @@ class NSSLCase(threading.Thread):
             if datetime.utcnow()-startime > timedelta(minutes=5):
                 retro = True
 
+            # radar directories are listed once per pass and shared by all domains,
+            # used when the index has no radar files around startime, e.g. retro
+            # runs or times out of the lookback of the indexer
+            catalog = RadarCatalog.get(
+                obsconf.datdir, obsconf.subdir, obsconf.filename)
+
             # ---------------- looking for radar files ----------------------
-            while waittime <= obsconf.maxwait:  # wait x minutes for complete radar set
+            while waittime <= obsconf.maxwait and self.before_obs_cutoff():  # wait x minutes for complete radar set
+                obsdb = self.obs_index('radar', startime, obsconf.timerange)
+                if obsdb is None and self.runcase.obscatalog is not None and waittime == 0:
+                    self.command.addlog(1, "cntl.radar",
+                                        f'No radar files around {startime:%Y%m%d%H%M} in {self.runcase.obscatalog}, looking in the radar directories.')
+
+                def find_radar(radname):
+                    if obsdb is not None:
+                        return obsdb.nearest('radar', radname, startime, obsconf.timerange)
+                    return catalog.nearest(radname, startime, obsconf.timerange)
+
                 #radarsToCheck = set(self.radars).difference(set(radars))
                 radarsToCheck = [
                     radar for radar in self.radars if radar not in radars]
+                self.command.addlog(0, "cntl.radar", 'Looking for %d radar data files in %s ... ' % (
+                    len(radarsToCheck), os.path.join(obsconf.datdir, obsconf.subdir)))
+                tostage = {}        # datafl: (radname, radfile)
                 for radname in radarsToCheck:
-                    radfound = False
                     radfile = os.path.join(
                         wrkdir, 'RADR_%s%s.raw' % (radname, timstr))
                     if os.path.lexists(radfile):
                         self.command.addlog(
                             0, "cntl.radar", 'Found radar data file %s ... ' % radfile)
-                        radfound = True
+                        radars.append(radname)
                     else:
                         ##
                         # look for radar data files
                         ##
                         # in minutes, find in (-10, 10) range
-                        for timemin in obsconf.timerange:
-                            currTime = startime+timedelta(minutes=timemin)
-                            datfile1 = os.path.join(obsconf.datdir,
-                                                    obsconf.subdir.format(
-                                                        radar=radname, time=currTime),
-                                                    obsconf.filename.format(radar=radname, time=currTime))
-
+                        datafl = find_radar(radname)
+                        if datafl is not None:
                             self.command.addlog(
-                                0, "cntl.radar", 'Looking for radar data file %s ... ' % datfile1)
-
-                            datafls = glob.glob(datfile1)
-                            #assert(len(datafls) <= 1)
-                            if len(datafls) >= 1:
-                                self.command.addlog(
-                                    0, "cntl.radar", 'Found radar data file %s ... ' % datafls[0])
-                                if not self.command.wait_for_a_file("check_wait_radar", datafls[0], 10, 180, 2):
-                                    break
-                                self.command.copyfile(
-                                    datafls[0], radfile, hardcopy=True)
-                                radfound = True
-                                break  # timemin loop
-
-                    if radfound:
-                        radars.append(radname)
+                                0, "cntl.radar", 'Found radar data file %s ... ' % datafl)
+                            tostage[datafl] = (radname, radfile)
+                if obsdb is not None:
+                    obsdb.close()
+
+                # stage the radar files of this pass in one batch
+                if len(tostage) > 0:
+                    readyfls = [datafl for datafl, ready in self.command.as_files_ready(
+                                "check_wait_radar", list(tostage.keys()), 10, 180, 2) if ready]
+                    staged = self.obs_stage(self.command.stage_files, "check_wait_radar",
+                                            [(datafl, tostage[datafl][1]) for datafl in readyfls]) or []
+                    radars.extend([tostage[datafl][0] for datafl in readyfls
+                                   if tostage[datafl][1] in staged])
 
                 if len(radars) < len(self.radars) and not retro:
                     time.sleep(10)
@@ -3350,8 +3698,7 @@ class NSSLCase(threading.Thread):
         logmessage = f"Found {len(radars)} radar files after {waittime} seconds and they are [{', '.join(radars)}]"
         self.command.addlog(0, "cntl.radar", logmessage)
         # self.runcase.setCaseRadars(self.domID,radars)
-        self.domain['usedradars']  = radars
-        self.domain['search_done'] = True
+        self.obs_stage(self.domain.update, usedradars=radars, search_done=True)
 
         return radars
     # enddef check_wait_radar
@@ -3403,13 +3750,14 @@ class NSSLCase(threading.Thread):
         #
         datestr = startime.strftime('%Y%m%d')
         radars = []
+        tostage = []
         for radar in self.radars:
             filelist = os.path.join(
                 obsdir, datestr, "RADR_%s%s.list" % (radar, timstr))
             if os.path.lexists(filelist):
                 wrklist = os.path.join(
                     wrkdir, "RADR_%s%s.list" % (radar, timstr))
-                self.command.copyfile(filelist, wrklist, hardcopy=True)
+                tostage.append((filelist, wrklist))
 
                 raddir = os.path.join(wrkdir, radar)
                 if not os.path.lexists(raddir):
@@ -3420,14 +3768,15 @@ class NSSLCase(threading.Thread):
                 for fl in lines:
                     (_nothing, radfname) = os.path.split(fl)
                     wrkfile = os.path.join(raddir, radfname)
-                    self.command.copyfile(fl, wrkfile, hardcopy=True)
+                    tostage.append((fl, wrkfile))
                 radars.append(radar)
 
+        self.obs_stage(self.command.stage_files, "check_wait_radar_radial", tostage)
+
         self.command.addlog(0, "cntl.radar", 'Found %d radar files and they are [%s] ' % (
             len(radars), ', '.join(radars)))
         # self.runcase.setCaseRadars(self.domID,radars)
-        self.domain['usedradars'] = radars
-        self.domain['search_done'] = True
+        self.obs_stage(self.domain.update, usedradars=radars, search_done=True)
 
         return radars
     # enddef check_wait_radar_radial
@@ -3459,7 +3808,7 @@ class NSSLCase(threading.Thread):
             for datfile in obsfls:
                 obsfileRe = os.path.basename(datfile)
                 obsfileAb = os.path.join(wrkdir, obsfileRe)
-                self.command.copyfile(datfile, obsfileAb, hardcopy=False)
+                self.obs_stage(self.command.copyfile, datfile, obsfileAb, hardcopy=False)
                 retobsfl.append(obsfileAb)
         else:
             obsfound = False
@@ -3470,7 +3819,7 @@ class NSSLCase(threading.Thread):
                 retro = True
 
             waittime = 0
-            while waittime < obsconf.maxwait:  # wait 10 seconds for each data set
+            while waittime < obsconf.maxwait and self.before_obs_cutoff():  # wait 10 seconds for each data set
                 obsfileRe = obsconf.filename.format(currTime)
                 obsfileAb = os.path.join(wrkdir, obsfileRe)
 
@@ -3479,6 +3828,7 @@ class NSSLCase(threading.Thread):
                         0, "cntl.datfile", 'Found data file for %s as %s ... ' % (obstype, obsfileAb))
                     obsfound = True
                 else:
+                    obsdb = self.obs_index(obstype, startime, obsconf.timerange)
                     for minrng in obsconf.timerange:
                         currTime = startime + timedelta(minutes=minrng)
                         obsfileRe = obsconf.filename.format(currTime)
@@ -3489,25 +3839,28 @@ class NSSLCase(threading.Thread):
                             0, "cntl.datfile", 'Looking for data file %s ... ' % (datfile))
 
                         # -------- Preprocessing each datfile to get obsfile ---
-                        if os.path.lexists(datfile):
+                        if self.obs_exists(obsdb, obstype, datfile):
                             obsfileAb = os.path.join(wrkdir, obsfileRe)
                             if os.path.lexists(obsfileAb):
-                                os.unlink(obsfileAb)
+                                self.obs_stage(os.unlink, obsfileAb)
                             #
                             # Wait dat file for it to be ready
                             #
                             if not self.command.wait_for_a_file('wait_datfile', datfile, 60, 60, 2, expectSize=obsconf.expsize):
                                 baddatfl = True
                                 break
+                            if not self.obs_stage(self.command.stage_files, 'wait_datfile', [(datfile, obsfileAb)]):
+                                baddatfl = True
+                                break
                             #
                             # Everything is good now
                             #
-                            self.command.copyfile(
-                                datfile, obsfileAb, hardcopy=True)
                             self.command.addlog(
                                 0, "cntl.datfile", 'Found data file %s ... ' % (datfile))
                             obsfound = True
                             break
+                    if obsdb is not None:
+                        obsdb.close()
 
                 # Continue waiting or exit
                 if obsfound:
@@ -3557,12 +3910,12 @@ class NSSLCase(threading.Thread):
                         if os.path.lexists(obsfile1hr):
                             obsfile1hrRe = os.path.basename(obsfile1hr)
                             obsfile1hrAb = os.path.join(wrkdir, obsfile1hrRe)
-                            self.command.copyfile(
+                            self.obs_stage(self.command.copyfile,
                                 obsfile1hr, obsfile1hrAb, hardcopy=False)
                         else:
                             obsfile1hrAb = 'none'
                         # print(obsfileAb,obsfile1hrAb)
-                        self.command.copyfile(
+                        self.obs_stage(self.command.copyfile,
                             datfile, obsfileAb, hardcopy=False)
                         retobsfl.append([obsfileAb, obsfile1hrAb])
 
@@ -3576,7 +3929,7 @@ class NSSLCase(threading.Thread):
             if obstype == 'surf':
 
                 waittime = 0
-                while waittime < obsconf.maxwait:
+                while waittime < obsconf.maxwait and self.before_obs_cutoff():
 
                     # if startime.minute >= 15:
                     #    break    # waittime, break for next obstype
@@ -3596,6 +3949,7 @@ class NSSLCase(threading.Thread):
                             0, "cntl.sng", 'Found data file for %s as %s ... ' % (obstype, obsfileAb))
                         obsfound = True
                     else:
+                        obsdb = self.obs_index(obstype, startime, obsconf.timerange)
                         for minrng in obsconf.timerange:
                             currTime = startime + timedelta(minutes=minrng)
 
@@ -3608,12 +3962,12 @@ class NSSLCase(threading.Thread):
                                 0, "cntl.sng", 'Looking for data file %s ... ' % (datfile))
 
                             # -------- Preprocessing each datfile to get obsfile ---
-                            if os.path.lexists(datfile):
+                            if self.obs_exists(obsdb, obstype, datfile):
                                 obsfileAb = os.path.join(wrkdir, obsfileRe)
                                 if not self.command.wait_for_a_file('wait_sng', datfile, 60, 60, 2, expectSize=obsconf.expsize):
                                     break
-                                self.command.copyfile(
-                                    datfile, obsfileAb, hardcopy=True)
+                                if not self.obs_stage(self.command.stage_files, 'wait_sng', [(datfile, obsfileAb)]):
+                                    break
                                 self.command.addlog(
                                     0, "cntl.sng", 'Found data file %s ... ' % (obsfileAb))
                                 obsfound = True
@@ -3631,16 +3985,17 @@ class NSSLCase(threading.Thread):
                             self.command.addlog(
                                 0, "cntl.sng", 'Looking for data file %s ... ' % (datfile1hr))
 
-                            if os.path.lexists(datfile1hr):
-                                obsfile1hrAb = os.path.join(
-                                    wrkdir, datfile1hrRe)
-                                self.command.copyfile(
-                                    datfile1hr, obsfile1hrAb, hardcopy=True)
+                            obsfile1hrAb = os.path.join(
+                                wrkdir, datfile1hrRe)
+                            if self.obs_exists(obsdb, obstype, datfile1hr) and \
+                               self.obs_stage(self.command.stage_files, 'wait_sng', [(datfile1hr, obsfile1hrAb)]):
                                 self.command.addlog(
                                     0, "cntl.sng", 'Found data file %s ... ' % (obsfile1hrAb))
                                 obsfound = True
                             else:
                                 obsfile1hrAb = 'None'
+                        if obsdb is not None:
+                            obsdb.close()
 
                     # Continue waiting or exit
                     if obsfound:
@@ -3663,7 +4018,7 @@ class NSSLCase(threading.Thread):
 
                 if self.domain.checkRange(latmin, latmax, lonmin, lonmax, 100):
                     waittime = 0
-                    while waittime < obsconf.maxwait:
+                    while waittime < obsconf.maxwait and self.before_obs_cutoff():
 
                         currTime = startime
                         obsfileRe = obsconf.filename.format(currTime)
@@ -3704,7 +4059,7 @@ class NSSLCase(threading.Thread):
                                     if not self.command.wait_for_a_file('wait_sng', datfile, 60, 60, 2, expectSize=obsconf.expsize):
                                         break
                                     # self.command.copyfile(datfile,obsfileAb,hardcopy=True)
-                                    prep_okmeso.meso2lso(
+                                    self.obs_stage(prep_okmeso.meso2lso,
                                         datfile, stnfilename, obsfileAb)
                                     self.command.addlog(
                                         0, "cntl.auto", 'Found data file %s ... ' % (obsfileAb))
@@ -3728,7 +4083,7 @@ class NSSLCase(threading.Thread):
                                     obsfile1hrAb = os.path.join(
                                         wrkdir, '%s.lso' % (datfile1hrRe))
                                     # self.command.copyfile(datfile1hr,obsfile1hrAb,hardcopy=True)
-                                    prep_okmeso.meso2lso(
+                                    self.obs_stage(prep_okmeso.meso2lso,
                                         datfile1hr, stnfilename, obsfile1hrAb)
                                     obsfound = True
                                 else:
@@ -3770,7 +4125,7 @@ class NSSLCase(threading.Thread):
             retro = True
 
         waittime = 0
-        while waittime < obsconf.maxwait:
+        while waittime < obsconf.maxwait and self.before_obs_cutoff():
             currTime = startime-timedelta(minutes=(startime.minute % 5))
             timstr = currTime.strftime('%y%j')
             obsfileRe = '%s_entln.nc' % (timstr)
@@ -3790,7 +4145,7 @@ class NSSLCase(threading.Thread):
                         0, "cntl.lgt", 'Looking for ENTLN data file %s ... ' % (datfile))
                     # -------- Preprocessing each datfile to get obsfile ---
                     if self.runDirs['obsvar'][obstype]['prepro']:
-                        subprocess.call('ncrcat %(obsdir)s/%(yd)s17050005r %(obsdir)s/%(yd)s17[1-5][05]0005r %(obsdir)s/%(yd)s18000005r %(outfile)s' % {
+                        self.obs_stage(subprocess.call, 'ncrcat %(obsdir)s/%(yd)s17050005r %(obsdir)s/%(yd)s17[1-5][05]0005r %(obsdir)s/%(yd)s18000005r %(outfile)s' % {
                                         'obsdir': obsdir, 'outfile': obsfileRe, 'yd': timstrsrc2}, shell=True, cwd=wrkdir)
 
                         obsfileAb = os.path.join(wrkdir, obsfileRe)
@@ -3799,11 +4154,8 @@ class NSSLCase(threading.Thread):
                         break
 
                     if os.path.lexists(datfile):
-                        if os.path.lexists(obsfileAb):
-                            os.unlink(obsfileAb)
-                        self.command.copyfile(
-                            datfile, obsfileAb, hardcopy=True)
-                        obsfound = True
+                        if self.obs_stage(self.command.stage_files, 'wait_ENTLN', [(datfile, obsfileAb)]):
+                            obsfound = True
                         break
 
             # Continue waiting or exit
@@ -3842,12 +4194,12 @@ class NSSLCase(threading.Thread):
             for datfile in glmfls:
                 obsfileRe = os.path.basename(datfile)
                 obsfileAb = os.path.join(wrkdir, obsfileRe)
-                self.command.copyfile(datfile, obsfileAb, hardcopy=False)
+                self.obs_stage(self.command.copyfile, datfile, obsfileAb, hardcopy=False)
                 retobsfl.append(obsfileAb)
         else:
             obsfound = False
             waittime = 0
-            while waittime < obsconf.maxwait:
+            while waittime < obsconf.maxwait and self.before_obs_cutoff():
                 currTime = startime-timedelta(minutes=(startime.minute % 5))
                 obsfileRe = obsconf.filename.format(currTime)
                 obsfileAb = os.path.join(wrkdir, obsfileRe)
@@ -3857,6 +4209,7 @@ class NSSLCase(threading.Thread):
                         0, "cntl.lgt", 'Found GLM data file for %s as %s ... ' % (obstype, obsfileAb))
                     obsfound = True
                 else:
+                    obsdb = self.obs_index(obstype, startime, obsconf.timerange)
                     for minrng in obsconf.timerange:
                         currTime = currTime + timedelta(minutes=minrng)
 
@@ -3867,16 +4220,18 @@ class NSSLCase(threading.Thread):
                         self.command.addlog(
                             0, "cntl.lgt", 'Looking for GLM data file %s ... ' % (datfile))
 
-                        if os.path.lexists(datfile):
+                        if self.obs_exists(obsdb, obstype, datfile):
                             obsfileAb = os.path.join(wrkdir, obsfileRe)
                             if not self.command.wait_for_a_file('wait_lightning', datfile, 60, 60, 2):
                                 break
-                            self.command.copyfile(
-                                datfile, obsfileAb, hardcopy=True)
+                            if not self.obs_stage(self.command.stage_files, 'wait_lightning', [(datfile, obsfileAb)]):
+                                break
                             self.command.addlog(
                                 0, "cntl.GLM", 'Found data file %s ... ' % (obsfileAb))
                             obsfound = True
                             break
+                    if obsdb is not None:
+                        obsdb.close()
 
                 # Continue waiting or exit
                 if obsfound:
@@ -3930,8 +4285,13 @@ class NSSLCase(threading.Thread):
             if (datetime.utcnow()-startime) > timedelta(minutes=10):
                 retro = True
 
+            cachedir = obsconf.get('cachedir', os.path.join(
+                self.command.wrkdir, 'mrms_cache'))
+            cachemaxage = obsconf.get('cachemaxage', 6)     # in hours
+
             waittime = 0
-            while waittime < obsconf.maxwait:
+            while waittime < obsconf.maxwait and self.before_obs_cutoff():
+                obsdb = self.obs_index('mrms', startime, obsconf.timerange)
                 for minrng in obsconf.timerange:
                     currTime = startime + timedelta(minutes=minrng)
                     timstrsrc = currTime.strftime('%Y%m%d-%H%M')
@@ -3942,36 +4302,44 @@ class NSSLCase(threading.Thread):
                     obsfileAb = [os.path.join(wrkdir, fileRe)
                                  for fileRe in obsfileRe]
 
-                    obsfileSr = ['MRMS_MergedReflectivityQC_%s_%s??.grib2.gz' % (
-                        lvl, timstrsrc) for lvl in mrmslvls]
+                    obsfileSr = [srcnames['mrms'].format(
+                        currTime, level=lvl) for lvl in mrmslvls]
                     datfiles = [os.path.join(
                         obsconf.datdir, ldmdir, fileSr) for fileSr in obsfileSr]
                     self.command.addlog(
                         0, "cntl.mrms", 'Looking for %s ... ' % (datfiles[0]))
 
                     # -------- Preprocessing each datfile to get obsfile ---
-                    i = 0
-                    for datfile in datfiles:     # each level
-                        datafls = glob.glob(datfile)
-                        #assert(len(datafls) <= 1)
-                        if len(datafls) >= 1:
-                            if not self.command.wait_for_a_file('wait_mrms', datafls[0], 60, 120, 2, expectSize=obsconf.expsize):
+                    srcfiles = []
+                    if obsdb is not None:
+                        indexed = obsdb.sensors('mrms', currTime)
+                        srcfiles = [indexed[lvl] for lvl in mrmslvls if lvl in indexed]
+                    else:
+                        for datfile in datfiles:     # each level
+                            datafls = glob.glob(datfile)
+                            #assert(len(datafls) <= 1)
+                            if len(datafls) < 1:
                                 break
-                            with gzip.open(datafls[0], 'rb') as f_in:
-                                with open(obsfileAb[i], 'wb') as f_out:
-                                    shutil.copyfileobj(f_in, f_out)
-                            # self.command.copyfile(srcfile,obsfileAb[i],hardcopy=False)
+                            srcfiles.append(datafls[0])
+
+                    foundfiles = []
+                    if len(srcfiles) == len(mrmslvls):
+                        readys = [srcfile for srcfile, ready in self.command.as_files_ready(
+                                  'wait_mrms', srcfiles, 60, 120, 2, expectSize=obsconf.expsize) if ready]
+                        if len(readys) == len(srcfiles):
+                            # decompress all levels at once, they are kept in
+                            # a cache shared by all domains and cycles
+                            foundfiles = self.obs_stage(self.command.gunzip_files, 'wait_mrms',
+                                            list(zip(srcfiles, obsfileAb)), cachedir,
+                                            cachemaxage=cachemaxage) or []
                             self.command.addlog(
-                                0, "cntl.mrms", 'Found data file %s ... ' % datafls[0])
-                            foundfiles.append(obsfileAb[i])
-                        else:
-                            foundfiles = []
-                            break
-                        i += 1
+                                0, "cntl.mrms", 'Found %d data files at %s ... ' % (len(foundfiles), timstrsrc))
 
                     if len(foundfiles) == len(mrmslvls):
                         obsfound = True
                         break
+                if obsdb is not None:
+                    obsdb.close()
 
                 # Continue waiting or exit
                 if obsfound or retro:
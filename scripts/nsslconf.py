@@ -74,6 +74,17 @@ class caseConf :
     self.extsrcs  = self._cfg.extsrcs    # list of external data sources to be sought one by one
 
     self.cmprun   = self._cfg.cmprun
+    self.jobpoll  = self._cfg.get('jobpoll',None)   # shared job status poller, e.g. {interval: 30, maxretry: 3}
+    self.pipeline = self._cfg.get('pipeline',False) # advance each ensemble member as soon as its inputs are ready
+    self.obscutoff = self._cfg.get('obscutoff',None) # analysis cutoff in seconds for observation preparation
+    self.obsgrace  = self._cfg.get('obsgrace',180)   # seconds after the cutoff for a preparer to finish
+    self.earlyobs  = self._cfg.get('earlyobs',False) # gather observations while WPS/real are running
+    self.obscache  = self._cfg.get('obscache',None)  # observation files cache, e.g. {budget: 20} in GB
+    self.obscatalog = self._cfg.get('obscatalog',None) # SQLite database maintained by obscatalog.py
+
+    # resolved once and shared by all domains of this case
+    self._runargs  = None                # {prog: (args, kwargs)} of runConfig
+    self._nmltmpls = {}                  # (progname, ensno) -> namelist template file
 
   #enddef __init__
 
@@ -187,6 +198,17 @@ class caseConf :
 
   def getNamelistTemplate(self,progname,ensno=None) :
 
+    key = (progname,ensno)
+    if key not in self._nmltmpls:
+        self._nmltmpls[key] = self.findNamelistTemplate(progname,ensno)
+    return self._nmltmpls[key]
+
+  #enddef getNamelistTemplate
+
+  ##--------------------------------------------------------------------
+
+  def findNamelistTemplate(self,progname,ensno=None) :
+
     nmltmpls = self._cfg.NMLTemplates[self.caseIndex]    # dict
     if ensno is None:
       nmltmpl = os.path.join(self.rundirs.inputdir,'input',nmltmpls[progname])
@@ -225,18 +247,18 @@ class caseConf :
 
     return nmltmpl
 
-  #enddef getNamelistTemplate
+  #enddef findNamelistTemplate
 
   ##--------------------------------------------------------------------
 
-  def getRuntimeConfig(self,gridsize=None) :
+  def resolveRuntimeConfig(self) :
     '''
-      Program run-time configuraiton in runConfig
+      Split runConfig of this case into MPIConf arguments, {prog: (args, kwargs)}
     '''
 
     config = ConfDict(self._cfg.runConfig[self.caseIndex])
 
-    retConfig = ConfDict({})
+    runargs = {}
     for k,v in config.items():
         argsa = []
         argsb = {}
@@ -246,6 +268,27 @@ class caseConf :
             else:                  # normal mpi options
                 argsa.append(e)
 
+        runargs[k] = (argsa,argsb)
+
+    return runargs
+
+  #enddef resolveRuntimeConfig
+
+  ##--------------------------------------------------------------------
+
+  def getRuntimeConfig(self,gridsize=None) :
+    '''
+      Program run-time configuraiton in runConfig
+
+      A new MPIConf is made for each program on every call because the
+      callers adjust them for their own domain.
+    '''
+
+    if self._runargs is None:
+        self._runargs = self.resolveRuntimeConfig()
+
+    retConfig = ConfDict({})
+    for k,(argsa,argsb) in self._runargs.items():
         retConfig[k] = MPIConf(*argsa,**argsb)
 
     #To make sure the MPI configuration is valid with respect to grid sizes
@@ -7,6 +7,11 @@
 ## setRadars    find radar within given model domains based on an static
 ##              radarinfo file.
 ##
+## geometry     lat/lon, x/y and map factor of a domain grid.
+##
+## RadarTable   radarinfo file parsed once into a NumPy structured array
+##              with KD-tree queries for radar selection.
+##
 ## ---------------------------------------------------------------------
 ##
 ## HISTORY:
@@ -18,13 +23,25 @@
 ##
 ## Requirements:
 ##
-##   o Python 2.7 or above
+##   o Python 3.6 or above
+##   o NumPy for GridGeometry and RadarTable
+##   o SciPy (optional) for the KD-trees in RadarTable
 ##
 ########################################################################
 
-import re
+import os, re, math, struct, zipfile, threading
 from NWPMapProjection import NWPMapProjector
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
 ##%%%%%%%%%%%%%%%%%%%%%%%  class Radar      %%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 class Radar:
@@ -34,7 +51,8 @@ class Radar:
         name:
         lat:        latitude
         lon:        longitude
-        distance:   Square of latitude/longitude difference
+        distance:   great-circle distance in meters from the domain centre,
+                    None when not computed
     '''
 
     ##----------------------- Constructor  -----------------------------
@@ -42,7 +60,7 @@ class Radar:
       self.name  = radname
       self.lat   = radlat
       self.lon   = radlon
-      self.distance = rdist    # distance from the central of the domain
+      self.distance = rdist    # great-circle distance from the domain centre in meters
     #enddef __init__
 
     ####################### outputString ###############################
@@ -63,6 +81,287 @@ class Radar:
 
 #endclass Radar
 
+##%%%%%%%%%%%%%%%%%%%%%%%  class RadarTable %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class RadarTable:
+    #classbegin
+    ''' This class holds the radars in a radarinfo file as a NumPy
+        structured array with fields name, lat & lon.
+
+        Each file is parsed once and shared (see get). Spatial queries:
+
+        within:     radars within a domain plus an extension, KD-tree in
+                    the domain map coordinates
+        nearest:    k radars nearest to a point, KD-tree on the unit
+                    sphere, so the distances are true meters
+        inPolygon:  radars within a polygon of lat/lon vertices
+
+        scipy.spatial.cKDTree is used when available, otherwise the
+        queries fall back to NumPy brute force, which is fine for a
+        couple of hundred radars.
+    '''
+
+    eradius = 6371000.0         # mean earth radius in meters
+
+    dtype = [('name','U4'),('lat','f8'),('lon','f8')]
+
+    radinfo_line_ex = re.compile(r'^(\w{4}) +[^ ]+ +((?:\d{1,3} +){6})\d+ *')
+
+    tables = {}                 # shared by all domains and threads, key: file name
+    lock   = threading.Lock()
+
+    ##----------------------- Constructor  -----------------------------
+    def __init__(self,table,source=None) :
+        self.table  = table
+        self.source = source
+
+        rlat = np.radians(table['lat'])
+        rlon = np.radians(table['lon'])
+        self.xyz = np.column_stack((np.cos(rlat)*np.cos(rlon),
+                                    np.cos(rlat)*np.sin(rlon), np.sin(rlat)))
+        self.sphtree  = cKDTree(self.xyz) if cKDTree is not None and len(table) > 0 else None
+
+        self.maptrees = {}      # key: domain grid parameters
+    #enddef __init__
+
+    def __len__(self):
+        return len(self.table)
+
+    ####################### get ########################################
+    @classmethod
+    def get(cls,radinfo):
+        ''' Return the shared table of "radinfo", parse it when it is new or modified '''
+
+        if np is None:
+            raise ImportError("NumPy is required by RadarTable")
+
+        stat = os.stat(radinfo)
+        key  = os.path.realpath(radinfo)
+        with cls.lock:
+            cached = cls.tables.get(key)
+            if cached is None or cached[0] != (stat.st_size, stat.st_mtime):
+                cached = ((stat.st_size, stat.st_mtime), cls(cls.parse(radinfo),radinfo))
+                cls.tables[key] = cached
+        return cached[1]
+    #enddef get
+
+    ####################### parse ######################################
+    @classmethod
+    def parse(cls,radinfo):
+        ''' Read station table data from "radinfo" '''
+
+        records = []
+        with open(radinfo) as res:
+            for line in res:
+                linematch = cls.radinfo_line_ex.match(line)
+                if linematch:
+                    rnam = linematch.group(1)
+                    ilat,ilatmin,ilatsec,ilon,ilonmin,ilonsec =  linematch.group(2).split()
+                    rlat = float(ilat)+(float(ilatmin)/60.)+(float(ilatsec)/3600.)
+                    rlon = -1.*(float(ilon)+(float(ilonmin)/60.)+(float(ilonsec)/3600.))
+                    records.append((rnam,rlat,rlon))
+
+        return np.array(records,dtype=cls.dtype)
+    #enddef parse
+
+    ####################### radars #####################################
+    def radars(self,indices=None,distances=None):
+        ''' Radar objects of "indices" (default all) with the given distances '''
+
+        if indices is None:
+            indices = range(len(self.table))
+        if distances is None:
+            distances = [None]*len(indices)
+
+        return [Radar(str(self.table['name'][i]),float(self.table['lat'][i]),
+                      float(self.table['lon'][i]),None if dist is None else float(dist))
+                for i,dist in zip(indices,distances)]
+    #enddef radars
+
+    ####################### distance ###################################
+    def distance(self,lat,lon,indices=None):
+        ''' Great circle distance in meters from (lat, lon) to the radars '''
+
+        xyz = self.xyz if indices is None else self.xyz[indices]
+        chord = np.linalg.norm(xyz-self.unitvector(lat,lon),axis=-1)
+        return 2.0*self.eradius*np.arcsin(np.minimum(0.5*chord,1.0))
+    #enddef distance
+
+    @staticmethod
+    def unitvector(lat,lon):
+        rlat = math.radians(lat)
+        rlon = math.radians(lon)
+        return np.array([math.cos(rlat)*math.cos(rlon),math.cos(rlat)*math.sin(rlon),math.sin(rlat)])
+    #enddef unitvector
+
+    ####################### nearest ####################################
+    def nearest(self,lat,lon,k=1):
+        ''' Return (indices, distances in meters) of the k radars nearest to (lat, lon) '''
+
+        k = min(k,len(self.table))
+        if k <= 0:
+            return np.array([],dtype=int), np.array([])
+
+        if self.sphtree is not None:
+            _, indices = self.sphtree.query(self.unitvector(lat,lon),k=k)
+            indices = np.atleast_1d(indices)
+        else:
+            indices = np.argsort(self.distance(lat,lon),kind='stable')[:k]
+
+        distances = self.distance(lat,lon,indices)
+        order     = np.argsort(distances,kind='stable')
+        return indices[order], distances[order]
+    #enddef nearest
+
+    ####################### mapxy ######################################
+    def mapxy(self,domain):
+        ''' Map coordinates of the radars in "domain" and a KD-tree of them '''
+
+        params = domain.gridParams()
+        with self.lock:
+            cached = self.maptrees.get(params)
+            if cached is None:
+                x, y = domain.mapProjector().lltoxy_array(self.table['lat'],self.table['lon'])
+                xy   = np.column_stack((x,y))
+                tree = cKDTree(xy) if cKDTree is not None and len(xy) > 0 else None
+                cached = (xy, tree)
+                self.maptrees[params] = cached
+        return cached
+    #enddef mapxy
+
+    ####################### within #####################################
+    def within(self,domain,extendx=0.,extendy=0.):
+        '''
+          Return indices of the radars within "domain" extended by
+          extendx/extendy (meters) in each direction.
+        '''
+
+        xy, tree = self.mapxy(domain)
+
+        xl = (domain.nx-1)*domain.dx
+        yl = (domain.ny-1)*domain.dy
+        hx = 0.5*xl+extendx
+        hy = 0.5*yl+extendy
+
+        if tree is not None:                # candidates within the bounding square
+            indices = np.array(sorted(tree.query_ball_point([0.5*xl,0.5*yl],max(hx,hy),p=np.inf)),dtype=int)
+        else:
+            indices = np.arange(len(xy))
+
+        dxy  = np.abs(xy[indices]-[0.5*xl,0.5*yl])
+        return indices[(dxy[:,0] < hx) & (dxy[:,1] < hy)]
+    #enddef within
+
+    ####################### inPolygon ##################################
+    def inPolygon(self,vertices,domain=None):
+        '''
+          Return indices of the radars within the polygon given by a list
+          of (lat, lon) vertices. The test is done in the map coordinates
+          of "domain" when it is given, otherwise in lat/lon.
+        '''
+
+        vlat, vlon = np.asarray(vertices,dtype=float).T
+        if domain is not None:
+            mapproj = domain.mapProjector()
+            px, py  = self.mapxy(domain)[0].T
+            vx, vy  = mapproj.lltoxy_array(vlat,vlon)
+        else:
+            px, py  = self.table['lon'], self.table['lat']
+            vx, vy  = vlon, vlat
+
+        # even-odd rule, cast a ray toward +x from each radar
+        inside = np.zeros(len(px),dtype=bool)
+        for x1,y1,x2,y2 in zip(vx,vy,np.roll(vx,-1),np.roll(vy,-1)):
+            if y1 == y2: continue
+            crosses = ((y1 > py) != (y2 > py)) & (px < x1+(py-y1)*(x2-x1)/(y2-y1))
+            inside ^= crosses
+
+        return np.nonzero(inside)[0]
+    #enddef inPolygon
+
+#endclass RadarTable
+
+##%%%%%%%%%%%%%%%%%%%%%%%  class GridGeometry %%%%%%%%%%%%%%%%%%%%%%%%%
+
+class GridGeometry:
+    #classbegin
+    ''' This class holds the geometry of the nx by ny grid points at
+        (i*dx, j*dy) of one domain, i.e. the staggered (corner) points of
+        WRF. The nx-1 by ny-1 mass points are at the cell centres in between.
+
+        lat:        latitude,  (ny,nx) array
+        lon:        longitude, (ny,nx) array
+        x:          distance from the southwest corner in meters, (nx,) array
+        y:          distance from the southwest corner in meters, (ny,) array
+        msf:        map scale factor, (ny,nx) array
+
+        load() memory-maps the arrays of an uncompressed npz file, it is
+        also used for the regridding weights of mrmsregrid.py.
+    '''
+
+    fields = ('lat','lon','x','y','msf')
+
+    ##----------------------- Constructor  -----------------------------
+    def __init__(self,arrays) :
+        for field in self.fields:
+            setattr(self,field,arrays[field])
+    #enddef __init__
+
+    ####################### compute ####################################
+    @classmethod
+    def compute(cls,domain):
+        ''' Compute the geometry with the vectorized map projector '''
+
+        if np is None:
+            raise ImportError("NumPy is required by GridGeometry")
+
+        mapproj = domain.mapProjector()
+
+        x = np.arange(domain.nx)*float(domain.dx)
+        y = np.arange(domain.ny)*float(domain.dy)
+        lat, lon = mapproj.xytoll_array(x[np.newaxis,:],y[:,np.newaxis])
+
+        return cls({'lat': lat, 'lon': lon, 'x': x, 'y': y,
+                    'msf': mapproj.lattomf_array(lat)})
+    #enddef compute
+
+    ####################### load #######################################
+    @staticmethod
+    def load(filename):
+        '''
+          Memory-map each array in an uncompressed npz file.
+
+          np.load ignores mmap_mode for npz files, so the data offset of
+          each member is worked out from its zip local header and .npy header.
+        '''
+
+        if np is None:
+            raise ImportError("NumPy is required by GridGeometry")
+
+        arrays = {}
+        with zipfile.ZipFile(filename) as zf, open(filename,'rb') as fh:
+            for info in zf.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{info.filename} in {filename} is compressed")
+
+                fh.seek(info.header_offset)
+                header = fh.read(30)                            # zip local file header
+                namelen, extralen = struct.unpack('<HH',header[26:30])
+                fh.seek(info.header_offset+30+namelen+extralen)
+
+                version = np.lib.format.read_magic(fh)
+                if version == (1,0):
+                    shape, fortran, dtype = np.lib.format.read_array_header_1_0(fh)
+                else:
+                    shape, fortran, dtype = np.lib.format.read_array_header_2_0(fh)
+
+                arrays[os.path.splitext(info.filename)[0]] = np.memmap(filename,dtype=dtype,
+                        mode='r',offset=fh.tell(),shape=shape,order='F' if fortran else 'C')
+        return arrays
+    #enddef load
+
+#endclass GridGeometry
+
 ##%%%%%%%%%%%%%%%%%%%%%%%  class Domain      %%%%%%%%%%%%%%%%%%%%%%%%%%%
 
 class Domain(dict):
@@ -125,19 +424,28 @@ class Domain(dict):
     #    else:
     #        raise KeyError("Only job <numtry> can be set")
 
-    ##%%%%%%%%%%%%%%%%%%%%%%%  setRadars     %%%%%%%%%%%%%%%%%%%%%%%%%%%
+    ##%%%%%%%%%%%%%%%%%%%%%%%  mapProjector  %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+    def gridParams(self):
+        ''' Parameters that determine the grid geometry of this domain '''
+        return (self.map_proj, self.truelat1, self.truelat2, self.standlon,
+                self.ctrlat, self.ctrlon, self.nx, self.ny, self.dx, self.dy)
+
+    #enddef gridParams
 
-    def setRadars(self,radarlist,extendx=140,extendy=140,ordered=True,info=False) :
+    def mapProjector(self):
         '''
-          Find radar name within the domain based on a radar list that
-          contains Radar object as elements.
+          NWPMapProjector of this domain with the origin reset to the
+          southwest corner, so that xytoll/lltoxy work on the model
+          coordinates x/y directly.
 
-          extendx   Extended search range (KM) in each direction
-          extendy
+          It is created once and reused until the grid parameters change.
         '''
 
-        extrng_x = extendx*1000.0
-        extrng_y = extendy*1000.0
+        params = self.gridParams()
+        cached = self.__dict__.get('_mapproj')
+        if cached is not None and cached[0] == params:
+            return cached[1]
 
         mapwrftoarps = { 'lambert' : 2, 'polar' : 1, 'mercator' : 3 }
 
@@ -151,31 +459,97 @@ class Domain(dict):
         #NOTE1: Create an instance with the specified map projection
         mapproj = NWPMapProjector(iproj,latnot,orient,scale=1.0,info=False)
 
-        clat = self.ctrlat
-        clon = self.ctrlon
-
-        nx = self.nx
-        ny = self.ny
-        dx = self.dx
-        dy = self.dy
-
-        xl = (nx-1)*dx
-        yl = (ny-1)*dy
+        xl = (self.nx-1)*self.dx
+        yl = (self.ny-1)*self.dy
 
         # NOTE2: The following code working on this instance
-        (cx,cy) = mapproj.lltoxy( clat,clon )
-        # NOTE3: input/output to lltoxy may be lists or scalars
-        # NOTE4: the return status should be checked to ensure error-free.
+        (cx,cy) = mapproj.lltoxy( self.ctrlat,self.ctrlon )
+        # NOTE3: the return status should be checked to ensure error-free.
         if cx is not None and cy is not None:
           swx = cx - 0.5*xl
           swy = cy - 0.5*yl
           mapproj.setorig( 1, swx, swy)
-          #NOTE5: Reset the map projection origin to be our model southwest corn
+          #NOTE4: Reset the map projection origin to be our model southwest corn
           #       instead of the default north pole. Then we can convert between
           #       the model coordinates x/y and lat/lon by calling xytoll or lltoxy.
         else:
           raise Exception("May projection problem in Domain")
-          #continue
+
+        self._mapproj = (params, mapproj)
+        return mapproj
+
+    #enddef mapProjector
+
+    ##%%%%%%%%%%%%%%%%%%%%%%%  geometry      %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+    def geometry(self):
+        '''
+          GridGeometry (lat, lon, x, y & map factor) of this domain.
+
+          It is computed at the first call and kept until the grid
+          parameters change.
+        '''
+
+        params = self.gridParams()
+        cached = self.__dict__.get('_geometry')
+        if cached is not None and cached[0] == params:
+            return cached[1]
+
+        geometry = GridGeometry.compute(self)
+        self._geometry = (params, geometry)
+        return geometry
+
+    #enddef geometry
+
+    ##%%%%%%%%%%%%%%%%%%%%%%%  setRadars     %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+    def setRadars(self,radarlist,extendx=140,extendy=140,ordered=True,info=False,polygon=None) :
+        '''
+          Find radar name within the domain based on a radar list that
+          contains Radar object as elements, or a RadarTable.
+
+          extendx   Extended search range (KM) in each direction
+          extendy
+          polygon   List of (lat, lon) vertices, select the radars within
+                    it instead of the extended domain (RadarTable only)
+        '''
+
+        extrng_x = extendx*1000.0
+        extrng_y = extendy*1000.0
+
+        if isinstance(radarlist,RadarTable):
+            radartable = radarlist
+
+            if info:
+                mapproj = self.mapProjector()
+                xl = (self.nx-1)*self.dx
+                yl = (self.ny-1)*self.dy
+                print ('Lat/lon at the SW corner of base grid= %f, %f.' % mapproj.xytoll(-extrng_x,-extrng_y))
+                print ('Lat/lon at the NE corner of base grid= %f, %f.' % mapproj.xytoll(xl+extrng_x,yl+extrng_y))
+
+            if polygon is None:
+                indices = radartable.within(self,extrng_x,extrng_y)
+            else:
+                indices = radartable.inPolygon(polygon,self)
+            distances = radartable.distance(self.ctrlat,self.ctrlon,indices)  # meters from the domain center
+
+            if info: print (' Found %d of %d radars within the domain.' % (len(indices),len(radartable)))
+
+            if ordered:                     # sorted by distance
+                order = np.argsort(distances,kind='stable')
+                indices, distances = indices[order], distances[order]
+
+            self['radars']    = radartable.radars(indices,distances)
+            self['outradars'] = radartable.radars(np.setdiff1d(np.arange(len(radartable)),indices))
+            return
+
+        #
+        #  Map projection with the origin at the southwest corner
+        #
+        mapproj = self.mapProjector()
+
+        xl = (self.nx-1)*self.dx
+        yl = (self.ny-1)*self.dy
 
         xorig = 0.0
         yorig = 0.0
@@ -186,9 +560,6 @@ class Domain(dict):
         (rad_grd_lat2,rad_grd_lon2) = mapproj.xytoll((xorig+xl+extrng_x),(yorig+yl+extrng_y),)
         if info: print ('Lat/lon at the NE corner of base grid= %f, %f.' %(rad_grd_lat2,rad_grd_lon2))
 
-        rlat = 0.5*(rad_grd_lat1+rad_grd_lat2)
-        rlon = 0.5*(rad_grd_lon1+rad_grd_lon2)
-
         #
         # Match radar name and table name
         #
@@ -197,16 +568,19 @@ class Domain(dict):
         for radar in radarlist:
             if radar.lat>rad_grd_lat1 and radar.lat<rad_grd_lat2 and    \
                radar.lon>rad_grd_lon1 and radar.lon<rad_grd_lon2 :
-
-                radar.distance = (radar.lat-rlat)**2+(radar.lon-rlon)**2
-
                 radars.append( radar )
             else:
                 radars_outside.append( radar )
 
         #
-        # find the distance between center and radars
+        # find the distance (meters) between center and radars
         #
+        if len(radars) > 0:
+            radartable = RadarTable(np.array([(radar.name,radar.lat,radar.lon) for radar in radars],
+                                             dtype=RadarTable.dtype))
+            for radar, dist in zip(radars,radartable.distance(self.ctrlat,self.ctrlon)):
+                radar.distance = float(dist)
+
         if ordered:
             radars = sorted(radars,key=lambda radar: radar.distance)  # sorted by distance
 
@@ -215,6 +589,18 @@ class Domain(dict):
 
     #enddef setRadars
 
+    ##%%%%%%%%%%%%%%%%%%%%%%%  nearestRadars %%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+    def nearestRadars(self,radartable,k=1) :
+        '''
+          Return the k radars in RadarTable "radartable" nearest to the
+          domain center, with distance in meters.
+        '''
+        indices, distances = radartable.nearest(self.ctrlat,self.ctrlon,k)
+        return radartable.radars(indices,distances)
+
+    #enddef nearestRadars
+
     ##%%%%%%%%%%%%%%%%%%%%%%%  checkRange   %%%%%%%%%%%%%%%%%%%%%%%%%%%
 
     def checkRange(self,latmin,latmax,lonmin,lonmax,extend=0,info=False) :
@@ -228,43 +614,13 @@ class Domain(dict):
         extrng_x = extend*1000.0
         extrng_y = extend*1000.0
 
-        mapwrftoarps = { 'lambert' : 2, 'polar' : 1, 'mercator' : 3 }
-
         #
-        #  Set up map projection.
+        #  Map projection with the origin at the southwest corner
         #
-        iproj = mapwrftoarps[self.map_proj]
-        latnot = [ self.truelat1,self.truelat2 ]
-        orient = self.standlon
-
-        #NOTE1: Create an instance with the specified map projection
-        mapproj = NWPMapProjector(iproj,latnot,orient,scale=1.0,info=False)
-
-        clat = self.ctrlat
-        clon = self.ctrlon
-
-        nx = self.nx
-        ny = self.ny
-        dx = self.dx
-        dy = self.dy
+        mapproj = self.mapProjector()
 
-        xl = (nx-1)*dx
-        yl = (ny-1)*dy
-
-        # NOTE2: The following code working on this instance
-        (cx,cy) = mapproj.lltoxy( clat,clon )
-        # NOTE3: input/output to lltoxy may be lists or scalars
-        # NOTE4: the return status should be checked to ensure error-free.
-        if cx is not None and cy is not None:
-          swx = cx - 0.5*xl
-          swy = cy - 0.5*yl
-          mapproj.setorig( 1, swx, swy)
-          #NOTE5: Reset the map projection origin to be our model southwest corn
-          #       instead of the default north pole. Then we can convert between
-          #       the model coordinates x/y and lat/lon by calling xytoll or lltoxy.
-        else:
-          raise Exception("May projection problem in Domain")
-          #continue
+        xl = (self.nx-1)*self.dx
+        yl = (self.ny-1)*self.dy
 
         xorig = 0.0
         yorig = 0.0
@@ -408,19 +764,7 @@ class NSSLDomains(list):
 
         ## ----------------- Read station table data -------------------
 
-        radinfo_line_ex = re.compile(r'^(\w{4}) +[^ ]+ +((?:\d{1,3} +){6})\d+ *')
-
-        radartable = []
-        with open(radinfo) as res:
-            for line in res:
-                linematch = radinfo_line_ex.match(line)
-                if linematch:
-                    rnam = linematch.group(1)
-                    ilat,ilatmin,ilatsec,ilon,ilonmin,ilonsec =  linematch.group(2).split()
-                    rlat = float(ilat)+(float(ilatmin)/60.)+(float(ilatsec)/3600.)
-                    rlon = -1.*(float(ilon)+(float(ilonmin)/60.)+(float(ilonsec)/3600.))
-                    radar = Radar(rnam,rlat,rlon)
-                    radartable.append(radar)
+        radartable = RadarTable.get(radinfo)     # parsed once and shared
 
         if info: print (' Read in %d NEXRAD radars from table "%s".' % (len(radartable),radinfo))
 
@@ -212,6 +212,12 @@ def main(conffile,starting,wrkdir,runcase,programs,domains) :
   caseDir = work_dirs(wrkcase,cmdconfig,None,True)
   cmdconfig.setuplog(caseDir,wrkcase.runname,runstr,_debug)
 
+  if wrkcase.jobpoll is not None and hasattr(cmdconfig,'start_status_poller'):
+      cmdconfig.start_status_poller(**wrkcase.jobpoll)
+
+  if wrkcase.obscache is not None:
+      cmdconfig.setup_obscache(**wrkcase.obscache)
+
   print (f"-------- Starting <{runstr}> at {time.strftime('%m-%d %H:%M:%S')} --------",file=sys.stderr)
 
   stime = time.time()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+## ---------------------------------------------------------------------
+##
+## This is a python program that keeps a catalog of the observation
+## files in the realtime data feeds.
+##
+## It scans the observation roots (obsconfs.*.datdir/subdir) of a
+## configuration file periodically and records each file's type, radar
+## or sensor, valid time, size and stable flag in a SQLite database.
+## The workflow asks the database for "radar X nearest to T" instead of
+## globbing the data feeds over and over.
+##
+## ---------------------------------------------------------------------
+##
+## Requirements:
+##
+##   o Python 3.6 or above
+##
+########################################################################
+
+import sys, os, re, time, string, glob
+import sqlite3, logging
+from datetime import datetime, timedelta
+
+from configBase import runException, ConfDict
+
+# Observation types whose files in the data feeds are not named as
+# obsconf.filename, which is then the name in the work directory
+srcnames = { 'mrms' : 'MRMS_MergedReflectivityQC_{level}_{:%Y%m%d-%H%M}??.grib2.gz' }
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# File name pattern of one observation type
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class ObsPattern:
+    ''' Files under "datdir/subdir" named as "filename".
+
+        "subdir" and "filename" are templates with {radar}, {time:...} or
+        positional {:...} time fields, "filename" may also contain glob
+        wildcards. Other named fields (e.g. {level}) are matched as the
+        sensor when there is no {radar}.
+    '''
+
+    def __init__(self, obstype, datdir, subdir, filename):
+        self.obstype  = obstype
+        self.datdir   = datdir
+        self.subdir   = subdir
+
+        self.timespec = None
+        pattern = ''
+        for literal, field, spec, _conv in string.Formatter().parse(filename):
+            pattern += re.escape(literal).replace(r'\?','.').replace(r'\*','.*')
+            if field is None:
+                continue
+            if field in ('', 'time') or field.isdigit():
+                self.timespec = spec or ''
+                width = len(format(datetime(2000,1,1), self.timespec))
+                pattern += f'(?P<time>.{{{width}}})'
+            else:
+                pattern += f'(?P<{field}>.+?)'
+        self.namere = re.compile(pattern)
+
+    #enddef __init__
+
+    def dirs(self, times):
+        ''' Directories that may hold files valid at "times" '''
+        dirpats = set()
+        for currTime in times:
+            dirpats.add(os.path.join(self.datdir, self.subdir.format(currTime, radar='*', time=currTime)))
+
+        dirpaths = set()
+        for dirpat in dirpats:
+            if glob.has_magic(dirpat):
+                dirpaths.update(glob.glob(dirpat))
+            elif os.path.isdir(dirpat):
+                dirpaths.add(dirpat)
+        return sorted(dirpaths)
+
+    #enddef dirs
+
+    def match(self, name):
+        ''' Return (sensor, valid time) parsed from the file name or None '''
+        if self.timespec is None: return None
+
+        m = self.namere.fullmatch(name)
+        if m is None: return None
+
+        try:
+            validtime = datetime.strptime(m.group('time'), self.timespec)
+        except ValueError:
+            return None
+
+        groups = m.groupdict()
+        if 'radar' in groups:
+            sensor = groups['radar']
+        else:
+            sensor = '_'.join([value for key, value in sorted(groups.items()) if key != 'time'])
+        return sensor, validtime
+
+    #enddef match
+
+#endclass ObsPattern
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# SQLite index of observation files
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class ObsCatalog:
+    ''' Table "obsfiles" holds one row for each observation file with its
+        type, radar/sensor, valid time (seconds since epoch), size,
+        modification time and whether it is stable, i.e. its size and
+        modification time did not change between two scans.
+
+        The scanner opens it with readonly=False, the workflow threads
+        open it read-only. A query opens a connection that is kept for the
+        following queries until close(), e.g. once every pass of a waiting
+        loop, so a new pass sees the latest scan. An instance is used by
+        one thread only.
+    '''
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS obsfiles (
+            path      TEXT    PRIMARY KEY,
+            obstype   TEXT    NOT NULL,
+            sensor    TEXT    NOT NULL,
+            validtime INTEGER NOT NULL,
+            size      INTEGER NOT NULL,
+            mtime     REAL    NOT NULL,
+            stable    INTEGER NOT NULL,
+            seen      REAL    NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS obsfiles_sensor_time ON obsfiles (obstype, sensor, validtime);
+    '''
+
+    epoch = datetime.utcfromtimestamp(0)
+
+    def __init__(self, dbfile, readonly=True):
+        self.dbfile   = dbfile
+        self.readonly = readonly
+        self.conn     = None
+
+        if not readonly:
+            conn = self.connect()
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')   # readers are not blocked by the scanner
+                conn.executescript(self.schema)
+                conn.commit()
+            finally:
+                conn.close()
+
+    #enddef __init__
+
+    def connect(self):
+        if self.readonly:
+            return sqlite3.connect(f'file:{self.dbfile}?mode=ro', uri=True, timeout=30)
+        return sqlite3.connect(self.dbfile, timeout=30)
+
+    #enddef connect
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    #enddef close
+
+    def query(self, sql, args=()):
+        if self.conn is None:
+            self.conn = self.connect()
+        return self.conn.execute(sql, args).fetchall()
+
+    #enddef query
+
+    ##------------------------------------------------------------------
+
+    def nearest(self, obstype, sensor, validtime, timerange):
+        ''' Return the stable file of "sensor" for the first minute in
+            "timerange" (minutes relative to "validtime") that has one,
+            or None. An integer "timerange" N means within +/- N minutes,
+            the nearest first.
+        '''
+        if isinstance(timerange, int):
+            timerange = [0] + [minute for n in range(1, timerange+1) for minute in (n, -n)]
+
+        time0 = int((validtime.replace(second=0, microsecond=0)-self.epoch).total_seconds())
+        rows  = self.query('''SELECT path, validtime FROM obsfiles
+                              WHERE obstype = ? AND sensor = ? AND stable = 1
+                                AND validtime BETWEEN ? AND ? ORDER BY path''',
+                           (obstype, sensor, time0+min(timerange)*60, time0+max(timerange)*60+59))
+
+        files = {}
+        for path, vtime in rows:
+            files.setdefault((vtime-time0)//60, path)
+
+        for timemin in timerange:
+            if timemin in files:
+                return files[timemin]
+        return None
+
+    #enddef nearest
+
+    def covers(self, obstype, validtime, timerange):
+        ''' Whether any file of "obstype" is indexed for the time window
+            of nearest(), i.e. the scanner is indexing this time at all
+        '''
+        if isinstance(timerange, int):
+            timerange = [-timerange, timerange]
+
+        time0 = int((validtime.replace(second=0, microsecond=0)-self.epoch).total_seconds())
+        rows  = self.query('''SELECT 1 FROM obsfiles WHERE obstype = ?
+                                AND validtime BETWEEN ? AND ? LIMIT 1''',
+                           (obstype, time0+min(timerange)*60, time0+max(timerange)*60+59))
+        return len(rows) > 0
+
+    #enddef covers
+
+    def sensors(self, obstype, validtime):
+        ''' Return {sensor: path} of the stable files of "obstype" valid
+            within the minute of "validtime"
+        '''
+        time0 = int((validtime.replace(second=0, microsecond=0)-self.epoch).total_seconds())
+        rows  = self.query('''SELECT sensor, path FROM obsfiles
+                              WHERE obstype = ? AND stable = 1
+                                AND validtime BETWEEN ? AND ? ORDER BY path DESC''',
+                           (obstype, time0, time0+59))
+        return dict(rows)       # the first path of each sensor
+
+    #enddef sensors
+
+    def stable(self, obstype, path):
+        ''' Whether "path" is indexed as a stable file of "obstype" '''
+        rows = self.query('SELECT stable FROM obsfiles WHERE obstype = ? AND path = ?',
+                          (obstype, os.path.normpath(path)))
+        return len(rows) > 0 and rows[0][0] == 1
+
+    #enddef stable
+
+    ##------------------------------------------------------------------
+
+    def scan(self, patterns, times, grace=10):
+        ''' Scan the directories of each ObsPattern in "patterns" for files
+            valid at "times" and update the index. A file is stable when it
+            is unchanged since the last scan and older than "grace" seconds.
+
+            Return {obstype: number of files}
+        '''
+        now    = time.time()
+        counts = {}
+
+        conn = self.connect()
+        try:
+            for pattern in patterns:
+                known = dict(((path, (size, mtime)) for path, size, mtime in conn.execute(
+                        'SELECT path, size, mtime FROM obsfiles WHERE obstype = ?', (pattern.obstype,))))
+
+                rows = []
+                for dirpath in pattern.dirs(times):
+                    try:
+                        entries = list(os.scandir(dirpath))
+                    except OSError:
+                        continue
+                    for entry in entries:
+                        matched = pattern.match(entry.name)
+                        if matched is None: continue
+                        try:
+                            stat = entry.stat()
+                        except OSError:         # removed while scanning
+                            continue
+
+                        sensor, validtime = matched
+                        stable = int(known.get(os.path.normpath(entry.path)) == (stat.st_size, stat.st_mtime)
+                                     and now-stat.st_mtime >= grace)
+                        rows.append((os.path.normpath(entry.path), pattern.obstype, sensor,
+                                     int((validtime-self.epoch).total_seconds()),
+                                     stat.st_size, stat.st_mtime, stable, now))
+
+                conn.executemany('INSERT OR REPLACE INTO obsfiles VALUES (?,?,?,?,?,?,?,?)', rows)
+                # files that are gone or out of the time window
+                conn.execute('DELETE FROM obsfiles WHERE obstype = ? AND seen < ?', (pattern.obstype, now))
+                conn.commit()
+                counts[pattern.obstype] = len(rows)
+        finally:
+            conn.close()
+
+        return counts
+
+    #enddef scan
+
+#endclass ObsCatalog
+
+##======================================================================
+## Parse command line arguments
+##======================================================================
+
+def parseargv():
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Catalog of observation files in the realtime data feeds",
+                     formatter_class = argparse.RawTextHelpFormatter)
+  parser.add_argument("-v", "--verbose", action="store_true", help="More messages while running")
+  parser.add_argument("-c", "--conf",    default='config.yaml', help="File that provides configuration in YAML format")
+  parser.add_argument("-d", "--db",      default='obscatalog.db', help="SQLite database file")
+  parser.add_argument("-t", "--types",   nargs='+', default=None,
+                      help="Observation types in obsconfs to be cataloged, default all")
+  parser.add_argument("-i", "--interval", type=int, default=10, help="Seconds between two scans")
+  parser.add_argument("-l", "--lookback", type=int, default=3,
+                      help="Hours to look back for the directories named by time")
+  parser.add_argument("-g", "--grace",   type=int, default=10,
+                      help="Seconds since last modification for a file to be stable")
+  parser.add_argument("-1", "--once",    action="store_true", help="Scan once and exit")
+
+  args = parser.parse_args()
+
+  return { 'confile' : args.conf,   'dbfile'   : args.db,
+           'obstypes': args.types,  'interval' : args.interval,
+           'lookback': args.lookback, 'grace'  : args.grace,
+           'once'    : args.once,   'debug'    : args.verbose }
+
+#enddef parseargv
+
+##%%%%%%%%%%%%%%%%%%%%%%%  main program here  %%%%%%%%%%%%%%%%%%%%%%%%%%
+
+def main(confile,dbfile,obstypes,interval,lookback,grace,once,debug) :
+  '''
+     Scan the observation roots every "interval" seconds
+  '''
+
+  logging.basicConfig(level=logging.DEBUG if debug else logging.INFO,
+                      format='%(asctime)s %(name)-8s: %(message)s', datefmt='%m-%d %H:%M:%S')
+  logger=logging.getLogger("OBSCAT")
+
+  conf = ConfDict.fromfilename(confile)
+
+  if obstypes is None:
+    obstypes = list(conf.obsconfs.keys())
+
+  patterns = []
+  for obstype in obstypes:
+    if obstype not in conf.obsconfs:
+      raise runException(f'Unsupported observation source {obstype}')
+
+    obsconf = ConfDict(conf.obsconfs[obstype])
+    if 'filename' not in obsconf or not os.path.isabs(obsconf.datdir):
+      logger.info(f"Skipping {obstype}, it is not from a data feed.")
+      continue
+    patterns.append(ObsPattern(obstype,obsconf.datdir,obsconf.get('subdir',''),
+                               srcnames.get(obstype,obsconf.filename)))
+
+  catalog = ObsCatalog(dbfile,readonly=False)
+  logger.info(f"Cataloging {[pattern.obstype for pattern in patterns]} into <{os.path.realpath(dbfile)}> ...")
+
+  while True:
+    time0 = time.time()
+
+    # every hour in the look back window for time dependent directories
+    currTime = datetime.utcnow().replace(second=0,microsecond=0)
+    times = [currTime-timedelta(hours=hour) for hour in range(0,lookback+1)]
+
+    counts = catalog.scan(patterns,times,grace)
+    logger.debug(f"Scanned {counts} in {time.time()-time0:.2f} seconds.")
+
+    if once: break
+    time.sleep(max(interval-(time.time()-time0),0))
+
+#enddef main
+
+#############################  Portral   ###############################
+if __name__ == "__main__":
+
+  try:
+    argsdict = parseargv()
+    main(**argsdict)
+  except runException as ex:
+    print(f'\nERROR: {ex}.\n', file = sys.stderr)
+  except KeyboardInterrupt:
+    pass
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+## ---------------------------------------------------------------------
+##
+## This is a python program that keeps the verification results of many
+## cases in a columnar store and aggregates them across days.
+##
+## Each verification run adds one shard for each forecast starting time,
+## a NumPy .npz file with one row per (forecast time, threshold, radius)
+## and the partial sums of the scores as columns:
+##
+##   fss   fss_num, fss_den             sums of (Pf-Po)^2 and Pf^2+Po^2
+##   ets   hits, fals, miss, cneg       contingency table
+##
+## Shards are saved as <store>/<init date>/<kind>_<field>_<init>_<experiment>.npz,
+## so verifying the same forecast again replaces its shard, and a range of
+## init times selects exactly the forecasts started in it. Summing the
+## partial sums over any set of shards gives the aggregated scores exactly.
+##
+## ---------------------------------------------------------------------
+##
+## Requirements:
+##
+##   o Python 3.6 or above
+##   o NumPy
+##
+########################################################################
+
+import sys, os, re, glob, time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+#
+# Shards of partial sums
+#
+#%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%%
+
+class ScoreStore:
+    ''' Directory of score shards, see the head of this file '''
+
+    sums = { 'fss' : ('fss_num','fss_den'),
+             'ets' : ('hits','fals','miss','cneg') }
+
+    def __init__(self, rootdir):
+        self.rootdir = rootdir
+
+    #enddef __init__
+
+    def shardname(self, kind, field, inittime, experiment):
+        return os.path.join(self.rootdir, f'{inittime:%Y%m%d}',
+                            f'{kind}_{field}_{inittime:%Y%m%d%H%M}_{experiment}.npz')
+
+    #enddef shardname
+
+    ##------------------------------------------------------------------
+
+    def append(self, kind, experiment, field, inittime, leads, thres, radius, sums):
+        ''' Save the partial sums of the forecast started at "inittime".
+
+            leads:  forecast times in minutes, (ntime,)
+            sums:   {column: (nthres,ntime,nradius) array} with the
+                    columns of "kind"
+        '''
+        if kind not in self.sums:
+            raise ValueError(f'Unknown score kind {kind}, one of {list(self.sums.keys())}')
+
+        nthres, ntime, nradius = np.shape(sums[self.sums[kind][0]])
+        thresidx, leadidx, radidx = [a.ravel() for a in np.indices((nthres,ntime,nradius))]
+
+        columns = { 'experiment': np.array(experiment), 'field': np.array(field),
+                    'init'  : np.array(inittime.strftime('%Y%m%d%H%M')),
+                    'lead'  : np.asarray(leads,dtype=np.int32)[leadidx],
+                    'thres' : np.asarray(thres,dtype=np.float32)[thresidx],
+                    'radius': np.asarray(radius,dtype=np.float32)[radidx] }
+        for column in self.sums[kind]:
+            columns[column] = np.asarray(sums[column],dtype=np.float64).ravel()
+
+        filename = self.shardname(kind, field, inittime, experiment)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmpfile = f'{filename}.{os.getpid()}.tmp'
+        with open(tmpfile,'wb') as fh:
+            np.savez(fh, **columns)
+        os.replace(tmpfile, filename)       # readers never see a partial shard
+
+        return filename
+
+    #enddef append
+
+    ##------------------------------------------------------------------
+
+    def shards(self, kind, field, start=None, end=None, experiments=None):
+        ''' Shard files of "kind" and "field" with init time in [start, end] '''
+        pattern = re.compile(rf'{kind}_{re.escape(field)}_(\d{{12}})_(.+)\.npz$')
+
+        files = []
+        for datedir in sorted(glob.glob(os.path.join(self.rootdir,'[0-9]'*8))):
+            date = os.path.basename(datedir)
+            if start is not None and date < f'{start:%Y%m%d}': continue
+            if end   is not None and date > f'{end:%Y%m%d}':   continue
+
+            for entry in os.scandir(datedir):
+                m = pattern.match(entry.name)
+                if m is None: continue
+                inittime = datetime.strptime(m.group(1),'%Y%m%d%H%M')
+                if start is not None and inittime < start: continue
+                if end   is not None and inittime > end:   continue
+                if experiments and m.group(2) not in experiments: continue
+                files.append(entry.path)
+        return sorted(files)
+
+    #enddef shards
+
+    def aggregate(self, kind, field, start=None, end=None, experiments=None, bylead=True):
+        ''' Sum the partial sums over all shards in the range by
+            (experiment, lead, thres, radius), the lead is dropped when
+            "bylead" is False.
+
+            Return the number of shards and {column: array} of the groups
+        '''
+        columns = self.sums[kind]
+
+        expers = []; leads = []; thres = []; radius = []
+        values = dict([(column,[]) for column in columns])
+
+        files = self.shards(kind, field, start, end, experiments)
+        for filename in files:
+            with np.load(filename) as shard:
+                nrow = len(shard['lead'])
+                expers.append(np.full(nrow,str(shard['experiment'])))
+                leads.append(shard['lead'] if bylead else np.zeros(nrow,dtype=np.int32))
+                thres.append(shard['thres'])
+                radius.append(shard['radius'])
+                for column in columns:
+                    values[column].append(shard[column])
+
+        if not files:
+            return 0, None
+
+        keys = np.rec.fromarrays([np.concatenate(expers), np.concatenate(leads),
+                                  np.concatenate(thres), np.concatenate(radius)],
+                                 names='experiment,lead,thres,radius')
+        groups, inverse = np.unique(keys, return_inverse=True)
+
+        result = dict([(name, groups[name]) for name in groups.dtype.names])
+        for column in columns:
+            result[column] = np.bincount(inverse.ravel(), weights=np.concatenate(values[column]),
+                                         minlength=len(groups))
+        return len(files), result
+
+    #enddef aggregate
+
+#endclass ScoreStore
+
+##======================================================================
+## Scores from the partial sums
+##======================================================================
+
+def scores(kind, sums, missing=-999.0):
+    ''' FSS, or ETS and frequency bias of the aggregated sums '''
+    if kind == 'fss':
+        num, den = sums['fss_num'], sums['fss_den']
+        fss = np.full(num.shape, missing)
+        np.subtract(1.0, num/np.where(den > 0, den, 1.0), out=fss, where=den > 0)
+        return {'fss': fss}
+
+    hits, fals, miss, cneg = [sums[column] for column in ('hits','fals','miss','cneg')]
+    total  = hits+fals+miss+cneg
+    random = (hits+fals)*(hits+miss)/np.where(total > 0, total, 1.0)
+    ets    = np.full(hits.shape, missing)
+    bias   = np.full(hits.shape, missing)
+    np.divide(hits-random, hits+fals+miss-random, out=ets, where=hits+fals+miss-random > 0)
+    np.divide(hits+fals, hits+miss, out=bias, where=hits+miss > 0)
+    return {'ets': ets, 'bias': bias}
+
+#enddef scores
+
+##======================================================================
+## Parse command line arguments
+##======================================================================
+
+def parseargv():
+  import argparse
+
+  parser = argparse.ArgumentParser(description="Aggregate verification scores in a score store across days",
+                     formatter_class = argparse.RawTextHelpFormatter)
+  parser.add_argument("store",                help="Score store directory")
+  parser.add_argument("-k", "--kind",    default='fss', choices=list(ScoreStore.sums.keys()),
+                      help="Score to aggregate")
+  parser.add_argument("-f", "--field",   default='CREF', help="Verified field, e.g. CREF, HPCP")
+  parser.add_argument("-s", "--start",   default=None, help="First initial time, yyyymmdd[HHMM]")
+  parser.add_argument("-e", "--end",     default=None, help="Last initial time, yyyymmdd[HHMM]")
+  parser.add_argument("-x", "--experiments", nargs='+', default=None, help="Experiments, default all")
+  parser.add_argument("-a", "--all_leads", action="store_true",
+                      help="Aggregate over all forecast times instead of by forecast time")
+
+  args = parser.parse_args()
+
+  def parsetime(timestr, last=False):
+    if timestr is None: return None
+    if len(timestr) == 8:
+      day = datetime.strptime(timestr,'%Y%m%d')
+      return day+timedelta(days=1,minutes=-1) if last else day
+    return datetime.strptime(timestr,'%Y%m%d%H%M')
+
+  return { 'storedir'   : args.store, 'kind'  : args.kind, 'field' : args.field,
+           'start'      : parsetime(args.start), 'end' : parsetime(args.end, True),
+           'experiments': args.experiments, 'bylead' : not args.all_leads }
+
+#enddef parseargv
+
+##%%%%%%%%%%%%%%%%%%%%%%%  main program here  %%%%%%%%%%%%%%%%%%%%%%%%%%
+
+def main(storedir,kind,field,start,end,experiments,bylead) :
+  '''
+     Print the aggregated scores, one line for each experiment, forecast
+     time, threshold and radius
+  '''
+
+  stime = time.time()
+  nshard, sums = ScoreStore(storedir).aggregate(kind,field,start,end,experiments,bylead)
+  if nshard == 0:
+    print(f'No {kind} shards of {field} found in {storedir}.', file=sys.stderr)
+    return
+
+  values = scores(kind, sums)
+  names  = list(values.keys())
+
+  print(f"{'experiment':<20s} {'lead':>6s} {'thres':>8s} {'radius':>8s}"+''.join([f'{name:>10s}' for name in names]))
+  for g in range(len(sums['experiment'])):
+    print(f"{sums['experiment'][g]:<20s} {sums['lead'][g]:6d} {sums['thres'][g]:8.2f} {sums['radius'][g]:8.2f}"
+          +''.join([f'{values[name][g]:10.4f}' for name in names]))
+
+  print(f'Aggregated {nshard} shards in {time.time()-stime:.2f} seconds.', file=sys.stderr)
+
+#enddef main
+
+#############################  Portral   ###############################
+if __name__ == "__main__":
+
+  try:
+    argsdict = parseargv()
+    main(**argsdict)
+  except KeyboardInterrupt:
+    pass
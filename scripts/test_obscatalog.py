@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+## ---------------------------------------------------------------------
+##
+## Tests of obscatalog.py on a temporary data feed, run with
+##
+##     python3 -m pytest test_obscatalog.py
+##
+## ---------------------------------------------------------------------
+
+import os, tempfile, unittest
+from datetime import datetime
+
+from obscatalog import ObsCatalog, ObsPattern, srcnames
+
+class ObsCatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.feed   = os.path.join(self.tmpdir.name, 'feed')
+        self.dbfile = os.path.join(self.tmpdir.name, 'obscatalog.db')
+
+        self.patterns = [ObsPattern('radar', os.path.join(self.feed, 'NEXRAD2'), '{radar}',
+                                    '{radar}{time:%Y%m%d_%H%M}??_V06'),
+                         ObsPattern('mrms', os.path.join(self.feed, 'MRMS'), '{:%Y%m%d}',
+                                    srcnames['mrms'])]
+        self.files = ['NEXRAD2/KTLX/KTLX20240501_195812_V06',
+                      'NEXRAD2/KTLX/KTLX20240501_200347_V06',
+                      'NEXRAD2/KINX/KINX20240501_200105_V06',
+                      'NEXRAD2/KINX/KINX.tmp',
+                      'MRMS/20240501/MRMS_MergedReflectivityQC_00.50_20240501-200038.grib2.gz',
+                      'MRMS/20240501/MRMS_MergedReflectivityQC_00.75_20240501-200038.grib2.gz']
+        for relpath in self.files:
+            self.write(relpath)
+
+        self.times = [datetime(2024, 5, 1, 20)]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, relpath, data=b'x'):
+        filepath = os.path.join(self.feed, relpath)
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, 'ab') as f:
+            f.write(data)
+        return filepath
+
+    def scan(self):
+        catalog = ObsCatalog(self.dbfile, readonly=False)
+        return catalog.scan(self.patterns, self.times, grace=0)
+
+    def test_scan(self):
+        self.assertEqual(self.scan(), {'radar': 3, 'mrms': 2})
+
+    def test_stable_after_second_scan(self):
+        self.scan()
+        obsdb = ObsCatalog(self.dbfile)
+        self.assertIsNone(obsdb.nearest('radar', 'KTLX', self.times[0], [0, 3, -2]))
+        obsdb.close()
+
+        self.scan()
+        ktlx = os.path.join(self.feed, 'NEXRAD2/KTLX/KTLX20240501_200347_V06')
+        self.assertTrue(obsdb.stable('radar', ktlx))
+        self.assertEqual(obsdb.nearest('radar', 'KTLX', self.times[0], [0, 3, -2]), ktlx)
+        obsdb.close()
+
+        # a file that changed since the last scan is not stable
+        self.write('NEXRAD2/KTLX/KTLX20240501_200347_V06')
+        self.scan()
+        self.assertFalse(obsdb.stable('radar', ktlx))
+        self.assertEqual(obsdb.nearest('radar', 'KTLX', self.times[0], [0, 3, -2]),
+                         os.path.join(self.feed, 'NEXRAD2/KTLX/KTLX20240501_195812_V06'))
+        obsdb.close()
+
+    def test_nearest(self):
+        self.scan()
+        self.scan()
+        obsdb = ObsCatalog(self.dbfile)
+        ktlx  = os.path.join(self.feed, 'NEXRAD2/KTLX/KTLX20240501_200347_V06')
+        kinx  = os.path.join(self.feed, 'NEXRAD2/KINX/KINX20240501_200105_V06')
+
+        self.assertEqual(obsdb.nearest('radar', 'KINX', self.times[0], 5), kinx)
+        self.assertEqual(obsdb.nearest('radar', 'KTLX', self.times[0], [0, -1, -2]),
+                         os.path.join(self.feed, 'NEXRAD2/KTLX/KTLX20240501_195812_V06'))
+        self.assertEqual(obsdb.nearest('radar', 'KTLX', self.times[0], [0, 3, -2]), ktlx)
+        self.assertIsNone(obsdb.nearest('radar', 'KTLX', self.times[0], [0, 1]))
+        self.assertIsNone(obsdb.nearest('radar', 'KFWS', self.times[0], 5))
+
+        self.assertEqual(sorted(obsdb.sensors('mrms', self.times[0])), ['00.50', '00.75'])
+        obsdb.close()
+
+    def test_covers(self):
+        self.scan()
+        obsdb = ObsCatalog(self.dbfile)
+        self.assertTrue(obsdb.covers('radar', self.times[0], 5))
+        self.assertTrue(obsdb.covers('radar', self.times[0], [-2, 0]))
+        self.assertFalse(obsdb.covers('radar', self.times[0], [-1, 0]))
+        self.assertFalse(obsdb.covers('radar', datetime(2024, 5, 1, 12), 10))
+        self.assertFalse(obsdb.covers('satcwp', self.times[0], 10))
+        obsdb.close()
+
+    def test_removed_files(self):
+        self.scan()
+        os.unlink(os.path.join(self.feed, 'NEXRAD2/KINX/KINX20240501_200105_V06'))
+        self.assertEqual(self.scan(), {'radar': 2, 'mrms': 2})
+        obsdb = ObsCatalog(self.dbfile)
+        self.assertIsNone(obsdb.nearest('radar', 'KINX', self.times[0], 5))
+        obsdb.close()
+
+if __name__ == "__main__":
+    unittest.main()
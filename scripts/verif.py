@@ -20,17 +20,36 @@
 ##
 ########################################################################
 
-import sys, os, re
+import sys, os, re, copy
 from datetime import datetime, timedelta
 import time
 import logging, argparse
 
 import namelist
+import mrmsregrid
+
+try:
+    import scorestore
+except ImportError:            # NumPy is not available
+    scorestore = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import netCDF4
+except ImportError:
+    netCDF4 = None
 
 ##========================== run_interp ==============================
 
 def run_interp(cmd,opts,start_time,workfiles,mrmsfiles,worktimes):
 
+    if 'regrid' in opts.native and native_interp_supported(mrmsfiles):
+        return interp_native(cmd,opts,start_time,workfiles,mrmsfiles,worktimes)
+
     executable = os.path.join(opts.srcdir,'bin','minterp')
     tmplinput  = os.path.join(opts.srcdir,'NSSLVAR','input','mrmsinterp.input')
 
@@ -107,9 +126,43 @@ def run_interp(cmd,opts,start_time,workfiles,mrmsfiles,worktimes):
     return obss_files
 #enddef run_interp
 
+def native_interp_supported(mrmsfiles):
+    ''' MRMS files in netCDF format can be interpolated in process '''
+    if np is None or netCDF4 is None:
+        return False
+
+    return all([mrmsregrid.is_netcdf(mrmsfile) for mrmsfile in mrmsfiles])
+
+#enddef native_interp_supported
+
+def interp_native(cmd,opts,start_time,workfiles,mrmsfiles,worktimes):
+    '''
+       Interpolate the MRMS files with sparse weights that are built once
+       for the MRMS and model grids and cached in "<wrkdir>/regrid".
+       The model grid comes from the first forecast file.
+    '''
+
+    mydir = create_wrkdir(start_time,opts.wrkdir,1)
+
+    obss_files = [os.path.join(mydir,'%s_%s'%(opts.intrpname[opts.field],
+                               wrktime.strftime('%Y-%m-%d_%H:%M:%S.nc'))) for wrktime in worktimes]
+
+    stime = time.time()
+    mrmsregrid.regrid_files(list(mrmsfiles),obss_files,opts.obsvarname[opts.field],workfiles[0],
+                            os.path.join(opts.wrkdir,'regrid'),opts.regrid)
+    logging.info(f"Interpolated {len(obss_files)} MRMS files in {time.time()-stime:.2f} seconds.")
+
+    return obss_files
+#enddef interp_native
+
 ##========================== FSS ==============================
 
-def run_fss(cmd,opts,timestr,workfiles,obss_files) :
+def run_fss(cmd,opts,timestr,workfiles,obss_files,worktimes=None,native=None) :
+
+  if native is None: native = 'fss' in opts.native
+  if native and native_fss_supported(opts):
+      return fss_native(cmd,opts,timestr,workfiles,obss_files,worktimes)
+  skip_scores(opts,'fss')
 
   executable = os.path.join(opts.srcdir,'bin','fss')
   tmplinput  = os.path.join(opts.srcdir,'NSSLVAR','input','neighbor_fss.input')
@@ -175,9 +228,337 @@ def run_fss(cmd,opts,timestr,workfiles,obss_files) :
   return txtfile
 #enddef run_fss
 
+##========================== Native FSS ==============================
+
+def native_fss_supported(opts):
+  ''' Composite reflectivity and hourly precipitation can be verified in
+      process, other fields still need the external program
+  '''
+  if np is None or netCDF4 is None or scorestore is None:
+      return False
+
+  return opts.vfield == 1 or (opts.vfield == 2 and opts.rainaccum == 0)
+
+#enddef native_fss_supported
+
+def read_vfield(filename,varname):
+  ''' Read the 2D verification field "varname" from a netCDF file, a 3D
+      field is reduced to its column maximum (composite reflectivity).
+
+      Return the field and grid spacing (DX in meters, None if not found)
+  '''
+  with netCDF4.Dataset(filename) as ncfile:
+      var  = ncfile.variables[varname]
+      data = var[0] if var.dimensions[0] == 'Time' else var[:]
+      dx   = ncfile.getncattr('DX') if 'DX' in ncfile.ncattrs() else None
+
+  data = np.ma.filled(np.ma.asarray(data,dtype=np.float32),np.nan)
+  if data.ndim == 3:
+      data = np.nanmax(data,axis=0)
+
+  return data, dx
+
+#enddef read_vfield
+
+class FSSAccumulator:
+  ''' Fraction skill score for all thresholds and radii at once.
+
+      The neighborhood fractions of each threshold are box means over
+      (2n+1)x(2n+1) grid points taken from one summed-area table, so the
+      cost does not grow with the radius. Windows are truncated at the
+      domain boundaries. Points where the observation is missing (NaN)
+      are left out of the windows and of the sums, for both fields.
+
+      Sums of (Pf-Po)^2 and Pf^2+Po^2 are aggregated over all forecasts
+      (ensemble members or forecast starting times) verified at the same
+      forecast time before the score is formed.
+  '''
+
+  missing = -999.0
+
+  def __init__(self,thres,halfwidths,ntime):
+    self.thres      = np.asarray(thres,dtype=np.float32)
+    self.halfwidths = list(halfwidths)
+
+    shape = (len(self.thres),ntime,len(self.halfwidths))
+    self.numer = np.zeros(shape)
+    self.denom = np.zeros(shape)
+  #enddef __init__
+
+  @staticmethod
+  def summed_area(events):
+    ''' Integral images of "events" (...,ny,nx), (...,ny+1,nx+1) '''
+    sat = np.zeros(events.shape[:-2]+(events.shape[-2]+1,events.shape[-1]+1),dtype=np.int32)
+    np.cumsum(events,axis=-2,out=sat[...,1:,1:])
+    np.cumsum(sat[...,1:,1:],axis=-1,out=sat[...,1:,1:])
+    return sat
+  #enddef summed_area
+
+  def exceedances(self,field,valid=None):
+    ''' "field >= thres" at the valid points, (nthres,ny,nx) '''
+    events = field[np.newaxis,:,:] >= self.thres[:,np.newaxis,np.newaxis]
+    if valid is not None:
+      events &= valid
+    return events
+  #enddef exceedances
+
+  @staticmethod
+  def box_sums(sat,n):
+    ''' Sums over the windows with half width "n" from summed-area table "sat".
+
+        Padding the table with its edge values clips the windows at the
+        boundaries, so the four corners are plain slices.
+    '''
+    ny = sat.shape[-2]-1
+    nx = sat.shape[-1]-1
+    w  = 2*n+1
+
+    pad = np.pad(sat,[(0,0)]*(sat.ndim-2)+[(n,n),(n,n)],mode='edge')
+    return pad[...,w:w+ny,w:w+nx] - pad[...,:ny,w:w+nx] - pad[...,w:w+ny,:nx] + pad[...,:ny,:nx]
+  #enddef box_sums
+
+  @staticmethod
+  def window_sizes(shape,n):
+    ''' Number of points in the clipped windows with half width "n" '''
+    ny,nx = shape
+    wy = np.minimum(np.arange(ny)+n+1,ny) - np.maximum(np.arange(ny)-n,0)
+    wx = np.minimum(np.arange(nx)+n+1,nx) - np.maximum(np.arange(nx)-n,0)
+    return wy[:,None]*wx[None,:]
+  #enddef window_sizes
+
+  def add(self,t,fcsts,obs):
+    ''' Accumulate forecast fields "fcsts" verified against "obs" at time index "t" '''
+    valid = ~np.isnan(obs)
+    if valid.all():
+      valid  = None
+      npts   = [self.window_sizes(obs.shape,n) for n in self.halfwidths]
+    else:
+      validsat = self.summed_area(valid)
+      npts   = [np.maximum(self.box_sums(validsat,n),1) for n in self.halfwidths]
+
+    def fractions(field):
+      sat = self.summed_area(self.exceedances(field,valid))
+      pfs = [self.box_sums(sat,n)/npt for n,npt in zip(self.halfwidths,npts)]
+      if valid is not None:
+        pfs = [pf[:,valid] for pf in pfs]       # (nthres,number of valid points)
+      return pfs
+
+    nthres = len(self.thres)
+    pos  = fractions(obs)
+    po2s = [np.square(po).reshape(nthres,-1).sum(axis=-1) for po in pos]
+
+    for fcst in fcsts:
+      for r,pf in enumerate(fractions(fcst)):
+        self.numer[:,t,r] += np.square(pf-pos[r]).reshape(nthres,-1).sum(axis=-1)
+        self.denom[:,t,r] += np.square(pf).reshape(nthres,-1).sum(axis=-1) + po2s[r]
+  #enddef add
+
+  def merge(self,other):
+    ''' Add the sums of accumulator "other" '''
+    self.numer += other.numer
+    self.denom += other.denom
+    return self
+  #enddef merge
+
+  def sums(self):
+    ''' Partial sums by the columns of the score store '''
+    return {'fss_num': self.numer, 'fss_den': self.denom}
+  #enddef sums
+
+  def scores(self):
+    ''' FSS(nthres,ntime,nradius), missing where neither field has an event '''
+    return scorestore.scores('fss',self.sums(),self.missing)['fss']
+  #enddef scores
+
+  def write(self,filename,times,radius):
+    ''' Write the scores in the format of "fss_mpi", read by plt_fss and plt_ets.py '''
+    fss = self.scores()
+    nthres,ntime,nradius = fss.shape
+    with open(filename,'w') as outfile:
+      outfile.write(f'nthres= {nthres}, ntime= {ntime}, nradius= {nradius}\n')
+      outfile.write('thres= '+' '.join([f'{thres:.2f}' for thres in self.thres])+'\n')
+      outfile.write('radius= '+' '.join([f'{rad:.2f}' for rad in radius])+'\n')
+      for n in range(nthres):
+        for t in range(ntime):
+          outfile.write(f'{times[t]:10.2f}'+''.join([f'{fss[n,t,r]:12.5f}' for r in range(nradius)])+'\n')
+  #enddef write
+
+#endclass FSSAccumulator
+
+precipwindow = 60    # minutes, accumulation of the observed precipitation (HOURLYPRCP)
+
+def accum_files(opts,fstart_time,curr_time):
+  ''' Forecast files of "fstart_time" at the beginning of the precipitation
+      window ending at "curr_time", None when the forecast is shorter than
+      the window
+  '''
+  if curr_time-fstart_time < timedelta(minutes=precipwindow):
+      return None
+
+  wrffile,_varfile = get_files_at_t(fstart_time,curr_time-timedelta(minutes=precipwindow),opts,wait=False)
+  return wrffile if isinstance(wrffile,list) else [wrffile]
+
+#enddef accum_files
+
+def read_pairs(opts,fcstfiles,obsfiles,accfiles=None):
+  ''' Read forecasts "fcstfiles" and the observations "obsfiles" they are
+      verified against at one forecast time. For precipitation, "accfiles"
+      are the same forecasts at the beginning of the precipitation window
+      (see accum_files), RAINNC is accumulated since the model start.
+
+      Return dx and [(forecast fields, observation field), ...]
+  '''
+
+  if opts.vfield == 1:
+      fcstname = 'REFL_10CM'
+      obsname  = 'REFL_10CM' if opts.obsfmt == 1 else opts.obsvarname[opts.field]
+  else:
+      fcstname = 'RAINNC'
+      obsname  = opts.obsvarname[opts.field]
+      if accfiles is None or len(accfiles) != len(fcstfiles):
+          raise ValueError(f"RAINNC at {precipwindow} minutes before is needed for {fcstfiles[0]}.")
+
+  obsfields = [read_vfield(obsfile,obsname)[0] for obsfile in obsfiles]
+
+  fcstfields = []
+  for c,fcstfile in enumerate(fcstfiles):
+      field, dx = read_vfield(fcstfile,fcstname)
+      if opts.vfield == 2:
+          field = field - read_vfield(accfiles[c],fcstname)[0]
+      fcstfields.append(field)
+
+  if dx is None:
+      raise RuntimeError(f"Grid spacing (DX) is not found in {fcstfiles[0]}.")
+
+  # each observation is shared by ncopy/nobs forecasts
+  nshare = max(len(fcstfiles)//len(obsfiles),1)
+  return dx, [(fcstfields[o*nshare:(o+1)*nshare],obsfield) for o,obsfield in enumerate(obsfields)]
+
+#enddef read_pairs
+
+def verif_fields(opts,workfiles,obss_files,worktimes=None):
+  ''' Read the verification fields time by time.
+
+      workfiles[t] holds all forecasts at forecast time t, either the
+      ensemble members or one file for each forecast starting time, and
+      obss_files[t] holds the observation files they are verified against.
+      worktimes[t] are the valid times of each forecast starting time.
+
+      Precipitation is verified over the window before each forecast time,
+      the forecast times shorter than the window are skipped.
+
+      Yield (t, dx, [(forecast fields, observation field), ...])
+  '''
+
+  for t in range(len(workfiles)):
+      accfiles = None
+      if opts.vfield == 2:
+          if worktimes is None:
+              raise ValueError("Forecast times are needed to verify precipitation.")
+
+          accfiles = [accum_files(opts,fstart_time,curr_time)
+                      for fstart_time,curr_time in zip(worktimes[0],worktimes[t])]
+          if None in accfiles:
+              logging.info(f"Forecast time {t} is shorter than {precipwindow} minutes, precipitation is not verified.")
+              continue
+          accfiles = [accfile for files in accfiles for accfile in files]
+
+      dx, pairs = read_pairs(opts,workfiles[t],obss_files[t],accfiles)
+      yield t, dx, pairs
+
+#enddef verif_fields
+
+def forecast_times(opts,worktimes,ntime,units=None):
+  ''' Forecast time of each row in "units", default opts.timeunits of the field '''
+  if worktimes is None:
+      return list(range(ntime))
+
+  if units is None: units = opts.timeunits[opts.field]
+  scale = 3600.0 if units == 'hours' else 60.0
+  return [(wtimes[0]-worktimes[0][0]).total_seconds()/scale for wtimes in worktimes]
+
+#enddef forecast_times
+
+def total_sums(engines):
+  ''' One accumulator with the sums of all accumulators in "engines" '''
+  total = copy.deepcopy(engines[0])
+  for engine in engines[1:]:
+      total.merge(engine)
+  return total
+
+#enddef total_sums
+
+def store_scores(opts,kind,engines,worktimes):
+  ''' Add the partial sums to the score store, one shard for each forecast
+      starting time worktimes[0][o] from engines[o]. A None engine is skipped.
+  '''
+  if opts.scoredir is None or worktimes is None:
+      return
+
+  if len(engines) != len(worktimes[0]):
+      raise ValueError(f"{len(engines)} accumulators for {len(worktimes[0])} forecast starting times.")
+
+  store = scorestore.ScoreStore(opts.scoredir)
+  leads = forecast_times(opts,worktimes,len(worktimes),'minutes')
+  for fstart_time,engine in zip(worktimes[0],engines):
+      if engine is None: continue
+      shard = store.append(kind,opts.experiment,opts.outname,fstart_time,leads,
+                           engine.thres,opts.hradius[opts.field],engine.sums())
+      logging.info(f"Scores saved in {shard}.")
+
+#enddef store_scores
+
+def skip_scores(opts,kind):
+  ''' The external programs only write the aggregated text files, there are
+      no partial sums for the score store, so say that this run is missing
+  '''
+  if opts.scoredir is None:
+      return
+
+  logging.warning(f"{kind.upper()} of {opts.outname} is computed by the \"{kind}\" program, "
+                  f"the scores are not added to {opts.scoredir} (use \"--native {kind}\" for "
+                  f"composite reflectivity or hourly precipitation).")
+
+#enddef skip_scores
+
+def fss_native(cmd,opts,timestr,workfiles,obss_files,worktimes=None) :
+  ''' Compute FSS in process instead of submitting the "fss_mpi" job '''
+
+  mydir   = cmd.wrkdir
+  txtfile = os.path.join(mydir,'vscore_%s_%s.fss'%(opts.outname,timestr))
+
+  ntime  = len(workfiles)
+  radius = opts.hradius[opts.field]
+
+  stime   = time.time()
+  engines = None          # one for each forecast starting time, i.e. each observation
+  for t,dx,pairs in verif_fields(opts,workfiles,obss_files,worktimes):
+      if engines is None:
+          halfwidths = [int(round(rad*1000.0/dx)) for rad in radius]
+          engines = [FSSAccumulator(opts.thres[opts.field],halfwidths,ntime) for _pair in pairs]
+
+      for engine,(fcstfields,obsfield) in zip(engines,pairs):
+          engine.add(t,fcstfields,obsfield)
+
+  if engines is None:
+      raise RuntimeError(f"No forecast time of {opts.outname} is verified.")
+
+  total_sums(engines).write(txtfile,forecast_times(opts,worktimes,ntime),radius)
+  logging.info(f"FSS for {ntime} times computed in {time.time()-stime:.2f} seconds.")
+
+  store_scores(opts,'fss',engines,worktimes)
+
+  return txtfile
+#enddef fss_native
+
 ##========================== ETS ==============================
 
-def run_ets(cmd,opts,timestr,workfiles,obss_files) :
+def run_ets(cmd,opts,timestr,workfiles,obss_files,worktimes=None,native=None) :
+
+  if native is None: native = 'ets' in opts.native
+  if native and native_fss_supported(opts):
+      return ets_native(cmd,opts,timestr,workfiles,obss_files,worktimes)
+  skip_scores(opts,'ets')
 
   executable = os.path.join(opts.srcdir,'bin','ets')
   tmplinput  = os.path.join(opts.srcdir,'NSSLVAR','input','neighbor_ets.input')
@@ -249,6 +630,304 @@ def run_ets(cmd,opts,timestr,workfiles,obss_files) :
   return txtfile1,txtfile2
 #enddef run_ets
 
+##========================== Native ETS ==============================
+
+def sliding_max(field,n,axis):
+  ''' Maximum over a window of 2n+1 points along "axis", clipped at the
+      boundaries (van Herk/Gil-Werman, cost independent of "n")
+  '''
+  w = 2*n+1
+  a = np.moveaxis(field,axis,-1)
+  m = a.shape[-1]
+
+  nblk = -(-(m+2*n)//w)
+  pad  = np.full(a.shape[:-1]+(nblk*w,),-np.inf,dtype=a.dtype)
+  pad[...,n:n+m] = a
+
+  blk = pad.reshape(a.shape[:-1]+(nblk,w))
+  pre = np.maximum.accumulate(blk,axis=-1).reshape(pad.shape)
+  suf = np.maximum.accumulate(blk[...,::-1],axis=-1)[...,::-1].reshape(pad.shape)
+
+  return np.moveaxis(np.maximum(suf[...,:m],pre[...,w-1:w-1+m]),-1,axis)
+
+#enddef sliding_max
+
+class ETSAccumulator:
+  ''' Neighborhood contingency tables for all thresholds and radii.
+
+      With the neighborhood maxima Fmax/Omax over (2n+1)x(2n+1) points
+      (Clark et al. 2010),
+
+        hit               : O >= thres and Fmax >= thres
+        miss              : O >= thres and Fmax <  thres
+        false alarm       : F >= thres and Omax <  thres
+        correct negative  : F <  thres and O    <  thres
+
+      The four events of each point are packed into a 4-bit code and the
+      codes of all thresholds and radii are counted by one np.bincount.
+      Points where the observation is missing (NaN) are not counted.
+      Tables are summed over all forecasts verified at the same time.
+  '''
+
+  missing = -999.0
+
+  def __init__(self,thres,halfwidths,ntime):
+    self.thres      = np.asarray(thres,dtype=np.float32)
+    self.halfwidths = list(halfwidths)
+
+    # (nthres,ntime,nradius) of hits, false alarms, misses, correct negatives
+    self.table = np.zeros((4,len(self.thres),ntime,len(self.halfwidths)),dtype=np.int64)
+  #enddef __init__
+
+  def neighbor_max(self,field):
+    ''' Neighborhood maxima of "field" for each radius, (nradius,ny,nx) '''
+    field = np.where(np.isnan(field),-np.inf,field).astype(np.float32)
+    return np.stack([sliding_max(sliding_max(field,n,0),n,1) for n in self.halfwidths])
+  #enddef neighbor_max
+
+  def add(self,t,fcsts,obs):
+    ''' Accumulate forecast fields "fcsts" verified against "obs" at time index "t" '''
+    nthres = len(self.thres)
+    nrad   = len(self.halfwidths)
+    thres  = self.thres[:,None,None,None]
+
+    # bits of the observation events and the (threshold,radius) slot, (nthres,nradius,ny,nx)
+    slot = (np.arange(nthres*nrad,dtype=np.int16)*16).reshape(nthres,nrad,1,1)
+    base = slot + (obs >= thres)*np.int16(1) + (self.neighbor_max(obs)[None] >= thres)*np.int16(8)
+
+    valid = ~np.isnan(obs)
+    if valid.all(): valid = None
+
+    counts = np.zeros(nthres*nrad*16,dtype=np.int64)
+    for fcst in fcsts:
+      code = base + (self.neighbor_max(fcst)[None] >= thres)*np.int16(2) + (fcst >= thres)*np.int16(4)
+      if valid is not None:
+        code = code[...,valid]
+      counts += np.bincount(code.ravel(),minlength=nthres*nrad*16)
+
+    counts = counts.reshape(nthres,nrad,16)
+    isobs, isfmax, isfcst, isomax = [(np.arange(16) >> bit) & 1 == 1 for bit in range(4)]
+
+    self.table[0,:,t,:] += counts[:,:, isobs &  isfmax].sum(axis=-1)
+    self.table[1,:,t,:] += counts[:,:, isfcst & ~isomax].sum(axis=-1)
+    self.table[2,:,t,:] += counts[:,:, isobs & ~isfmax].sum(axis=-1)
+    self.table[3,:,t,:] += counts[:,:,~isfcst & ~isobs].sum(axis=-1)
+  #enddef add
+
+  def merge(self,other):
+    ''' Add the tables of accumulator "other" '''
+    self.table += other.table
+    return self
+  #enddef merge
+
+  def sums(self):
+    ''' Partial sums by the columns of the score store '''
+    return dict(zip(('hits','fals','miss','cneg'),self.table))
+  #enddef sums
+
+  def scores(self):
+    ''' ETS and frequency bias (nthres,ntime,nradius), missing where undefined '''
+    values = scorestore.scores('ets',self.sums(),self.missing)
+    return values['ets'], values['bias']
+  #enddef scores
+
+  def write(self,filenames,contgfile,times,minutes,radius,vradius):
+    ''' Write .ets, .bias in the layout of the FSS scores and the
+        contingency tables in the layout read by performance_*.ncl
+    '''
+    nthres,ntime,nradius = self.table.shape[1:]
+    header = (f'nthres= {nthres}, ntime= {ntime}, nradius= {nradius}\n'
+              + 'thres= '+' '.join([f'{thres:.2f}' for thres in self.thres])+'\n'
+              + 'radius= '+' '.join([f'{rad:.2f}' for rad in radius])+'\n')
+
+    for filename,score in zip(filenames,self.scores()):
+      with open(filename,'w') as outfile:
+        outfile.write(header)
+        for n in range(nthres):
+          for t in range(ntime):
+            outfile.write(f'{times[t]:10.2f}'+''.join([f'{score[n,t,r]:12.5f}' for r in range(nradius)])+'\n')
+
+    with open(contgfile,'w') as outfile:
+      outfile.write(header)
+      outfile.write('vradius= '+' '.join([f'{vrad}' for vrad in vradius[:nradius]])+'\n')
+      outfile.write('  radius     thres      time        hits   falsealarms      misses   correctnegs\n')
+      for r in range(nradius):
+        for n in range(nthres):
+          for t in range(ntime):
+            outfile.write(f'{radius[r]:8.2f}{self.thres[n]:10.2f}{minutes[t]:10.2f}'
+                          +''.join([f'{self.table[k,n,t,r]:12d}' for k in range(4)])+'\n')
+  #enddef write
+
+#endclass ETSAccumulator
+
+def ets_native(cmd,opts,timestr,workfiles,obss_files,worktimes=None) :
+  ''' Compute neighborhood ETS/bias and contingency tables in process
+      instead of submitting the "ets_mpi" job.
+
+      The fields are 2D (composite reflectivity or precipitation), so
+      only the horizontal radii are used, vradius is recorded in the
+      contingency file only.
+  '''
+
+  mydir = cmd.wrkdir
+
+  txtfile1 = os.path.join(mydir,'vscore_%s_%s.ets'%(opts.outname,timestr))
+  txtfile2 = os.path.join(mydir,'vscore_%s_%s.bias'%(opts.outname,timestr))
+  txtfile3 = os.path.join(mydir,'contingency_%s_%s.txt'%(opts.outname,timestr))
+
+  ntime  = len(workfiles)
+  radius = opts.hradius[opts.field]
+
+  stime   = time.time()
+  engines = None          # one for each forecast starting time, i.e. each observation
+  for t,dx,pairs in verif_fields(opts,workfiles,obss_files,worktimes):
+      if engines is None:
+          halfwidths = [int(round(rad*1000.0/dx)) for rad in radius]
+          engines = [ETSAccumulator(opts.thres[opts.field],halfwidths,ntime) for _pair in pairs]
+
+      for engine,(fcstfields,obsfield) in zip(engines,pairs):
+          engine.add(t,fcstfields,obsfield)
+
+  if engines is None:
+      raise RuntimeError(f"No forecast time of {opts.outname} is verified.")
+
+  total_sums(engines).write([txtfile1,txtfile2],txtfile3,forecast_times(opts,worktimes,ntime),
+               forecast_times(opts,worktimes,ntime,'minutes'),radius,opts.vradius[opts.field])
+  logging.info(f"ETS for {ntime} times computed in {time.time()-stime:.2f} seconds.")
+
+  store_scores(opts,'ets',engines,worktimes)
+
+  return txtfile1,txtfile2
+#enddef ets_native
+
+##========================== Streaming ==============================
+
+def ready_files(opts,wrffiles,varfile,curr_time):
+  ''' Files that mark the forecasts and the observation at "curr_time" complete '''
+
+  readys = [os.path.join(os.path.dirname(wrffile),f'{opts.wrfheader}Ready_d01_{curr_time:%Y-%m-%d_%H:%M:%S}')
+            for wrffile in wrffiles]
+  if opts.obsfmt == 1:
+      readys.append(os.path.join(os.path.dirname(varfile),f'wrfoutReady_d01_{curr_time:%Y-%m-%d_%H:%M:%S}'))
+  else:
+      readys.append(varfile)
+  return readys
+
+#enddef ready_files
+
+def stream_verif(cmd,opts,timestr,fstart_times,fcst_interval,fcst_len,maxwait=10800,waittick=30):
+  ''' Score each (forecast starting time, forecast time) pair as soon as
+      its forecast and observation files are ready instead of waiting for
+      all of them first.
+
+      The FSS and contingency sums are accumulated by forecast time for
+      each forecast starting time over the ensemble members. The score
+      files (summed over all starting times) and the score store shards
+      (one per starting time) are rewritten after each update, so they
+      always hold the scores of the pairs seen so far. Gives up after "maxwait" seconds without a
+      new pair.
+
+      Each pair is read on its own, so pairs may arrive in any order:
+      precipitation is taken from the forecast files at the beginning of
+      its own window, not from the pair scored before.
+  '''
+
+  if not native_fss_supported(opts) or opts.obsfmt not in (1,202):
+      raise RuntimeError("Streaming verification needs numpy, netCDF4 and a supported field.")
+
+  mydir = cmd.wrkdir
+
+  fssfile  = os.path.join(mydir,'vscore_%s_%s.fss'%(opts.outname,timestr))
+  etsfiles = [os.path.join(mydir,'vscore_%s_%s.ets'%(opts.outname,timestr)),
+              os.path.join(mydir,'vscore_%s_%s.bias'%(opts.outname,timestr))]
+  contgfile = os.path.join(mydir,'contingency_%s_%s.txt'%(opts.outname,timestr))
+
+  dtimes = list(range(0,fcst_len+fcst_interval,fcst_interval))
+  ntime  = len(dtimes)
+  radius = opts.hradius[opts.field]
+
+  worktimes = [[ftime+timedelta(minutes=dtime) for ftime in fstart_times] for dtime in dtimes]
+  times     = forecast_times(opts,worktimes,ntime)
+  minutes   = forecast_times(opts,worktimes,ntime,'minutes')
+
+  # (start index, time index) -> (forecast files, observation files, ready files,
+  #                               forecast files at the beginning of the precipitation window)
+  pending = {}
+  for f,ftime in enumerate(fstart_times):
+      for t,dtime in enumerate(dtimes):
+          wrkTime = ftime + timedelta(minutes=dtime)
+          accfiles = None
+          if opts.vfield == 2:
+              accfiles = accum_files(opts,ftime,wrkTime)
+              if accfiles is None: continue      # shorter than the window, not verified
+
+          wrffile,varfile = get_files_at_t(ftime,wrkTime,opts,wait=False)
+          wrffiles = wrffile if isinstance(wrffile,list) else [wrffile]
+          readys   = ready_files(opts,wrffiles,varfile,wrkTime) + (accfiles or [])
+          pending[(f,t)] = (wrffiles,[varfile],readys,accfiles)
+
+  fss = None             # accumulators of each forecast starting time
+  ets = None
+  lasttime = time.time()
+  while pending:
+      ready = sorted([key for key,item in pending.items() if all([os.path.exists(fn) for fn in item[2]])])
+
+      for f,t in ready:
+          wrffiles,obsfiles,_readys,accfiles = pending.pop((f,t))
+
+          dx, pairs = read_pairs(opts,wrffiles,obsfiles,accfiles)
+
+          if fss is None:
+              halfwidths = [int(round(rad*1000.0/dx)) for rad in radius]
+              fss = [FSSAccumulator(opts.thres[opts.field],halfwidths,ntime) for _ftime in fstart_times]
+              ets = [ETSAccumulator(opts.thres[opts.field],halfwidths,ntime) for _ftime in fstart_times]
+
+          for fcstfields,obsfield in pairs:
+              fss[f].add(t,fcstfields,obsfield)
+              ets[f].add(t,fcstfields,obsfield)
+
+          logging.info(f"Scored {fstart_times[f]:%Y%m%d_%H%M} + {dtimes[t]} minutes, {len(pending)} pairs to go.")
+
+      if ready:
+          total_sums(fss).write(fssfile,times,radius)
+          total_sums(ets).write(etsfiles,contgfile,times,minutes,radius,opts.vradius[opts.field])
+
+          updated = set([f for f,_t in ready])    # rewrite the shards of these starting times only
+          store_scores(opts,'fss',[engine if f in updated else None for f,engine in enumerate(fss)],worktimes)
+          store_scores(opts,'ets',[engine if f in updated else None for f,engine in enumerate(ets)],worktimes)
+          lasttime = time.time()
+      elif time.time()-lasttime > maxwait:
+          logging.error(f"No new forecast/observation after {maxwait} seconds, {len(pending)} pairs are not scored.")
+          break
+      else:
+          time.sleep(waittick)
+
+  return fssfile, etsfiles
+#enddef stream_verif
+
+def bench_ets(cmd,opts,timestr,workfiles,obss_files,worktimes=None) :
+  ''' Run the "ets_mpi" job and the native engine on the same case,
+      report the wall clock times and the largest score differences
+  '''
+
+  stime = time.time()
+  mpifiles = run_ets(cmd,opts,timestr,workfiles,obss_files,worktimes,native=False)
+  mpitime  = time.time()-stime
+  for mpifile in mpifiles:
+      os.replace(mpifile,f'{mpifile}.mpi')
+
+  stime = time.time()
+  npyfiles = ets_native(cmd,opts,timestr,workfiles,obss_files,worktimes)
+  npytime  = time.time()-stime
+
+  logging.info(f"ets_mpi: {mpitime:.2f} seconds, native: {npytime:.2f} seconds.")
+  for npyfile in npyfiles:
+      mpiscore = np.loadtxt(f'{npyfile}.mpi',skiprows=3)[:,1:]
+      npyscore = np.loadtxt(npyfile,skiprows=3)[:,1:]
+      logging.info(f"{os.path.basename(npyfile)}: max difference {np.abs(mpiscore-npyscore).max():.5f}")
+
+#enddef bench_ets
+
 ##========================== Reliability ==============================
 
 def run_reliability(cmd,opts,timestr,workfiles,obss_files) :
@@ -685,8 +1364,9 @@ def get_files(fstart_times,fcst_interval,fcst_len,diropts):
 
   return wrk_files, ver_files, ver_times
 
-def get_files_at_t(fstart_time,curr_time,opts):
-    '''Find working files at one specific time '''
+def get_files_at_t(fstart_time,curr_time,opts,wait=True):
+    '''Find working files at one specific time,
+       do not wait for the observation files when "wait" is False '''
 
     #print(fstart_time, curr_time)
     basedir = fstart_time.strftime('%Y%m%d')
@@ -761,14 +1441,14 @@ def get_files_at_t(fstart_time,curr_time,opts):
           readyname = f'wrfoutReady_d01_{curr_time:%Y-%m-%d_%H:%M:%S}'
           varfile = os.path.join(opts.fcstdir,basedir,vardir,'dom20/news3dvar',filename)
           varready = os.path.join(opts.fcstdir,basedir,vardir,'dom20/news3dvar',readyname)
-          if not wait_for_a_file(varready,3600,waittick=10):
+          if wait and not wait_for_a_file(varready,3600,waittick=10):
               raise RuntimeError(f"Analysis file not found: {readyname}.")
 
         elif opts.obsfmt == 202:  #'MRMSBIN', Interpolated netCDF files
           creffile = f"{opts.intrpname[opts.field]}_{curr_time:%Y-%m-%d_%H:%M:%S}.nc"
           #creffile = os.path.join(opts.obsdir,basedir,wrfdir,'%s.nc'%creftime)
           varfile = os.path.join(opts.obsdir,basedir,creffile)
-          if not wait_for_a_file(varfile,3600,waittick=10):
+          if wait and not wait_for_a_file(varfile,3600,waittick=10):
               raise RuntimeError(f"MRMS {opts.intrpname[opts.field]} file not found: {varfile}.")
         else:
           #raise RuntimeError("Unsupported obs. source: %s."%opts.obsfmt)
@@ -813,8 +1493,10 @@ def parse_command_line():
                       help='Working directory\n',default=f"{defaultwrkdir}/verify")
 
   parser.add_argument('-p','--program',
-                      help='''Program to run, one of [minterp,plt_fcst,plt_obs,run_fss,run_ets,plt_fss,plt_ets]
-                      verify = [run_fss,run_ets,plt_fss,plt_ets]\n''',
+                      help='''Program to run, one of [minterp,plt_fcst,plt_obs,run_fss,run_ets,plt_fss,plt_ets,stream,bench_ets]
+                      verify = [run_fss,run_ets,plt_fss,plt_ets]
+                      stream scores FSS/ETS as the forecast and observation files arrive
+                      bench_ets runs "ets_mpi" and the native ETS on the same case for comparison\n''',
                       default="verif")
 
   parser.add_argument('-v','--vdata',action='store_true',
@@ -837,6 +1519,16 @@ def parse_command_line():
   parser.add_argument('-t','--wrf_time',default=None,type=int,
                     help='for running "MINTERP" only, WRF output file time in minutes (to provide model grid)\n')
 
+  parser.add_argument('-x','--experiment',default=None,
+                      help='Experiment name in the score store, default the last component of FCST_DIR\n')
+  parser.add_argument('-d','--score_dir',default=None,
+                      help='Score store directory (see scorestore.py), default WRK_DIR/scores, "none" to disable\n')
+  parser.add_argument('-n','--native',nargs='+',default=[],choices=['regrid','fss','ets'],
+                      help='Steps done in Python instead of the external programs, not yet compared with them on a recorded case\n'
+                           'regrid: interpolate netCDF MRMS files with mrmsregrid.py instead of "minterp"\n'
+                           'fss:    compute FSS with FSSAccumulator instead of "fss"\n'
+                           'ets:    compute ETS with ETSAccumulator instead of "ets", compare them with "-p bench_ets"\n')
+
   argout = parser.parse_args()
 
   if argout.program == 'minterp':
@@ -868,6 +1560,12 @@ class Dirs:
     self.wrfheader = argin.wrf_header
     self.nens      = argin.ensno
 
+    self.experiment = argin.experiment or os.path.basename(os.path.normpath(argin.fcst_dir))
+    self.scoredir   = argin.score_dir or os.path.join(argin.wrk_dir,'scores')
+    if self.scoredir.lower() == 'none': self.scoredir = None
+
+    self.native     = set(argin.native)   # steps done in Python, see "--native"
+
     self.naggregation = 1
     self.minterp      = False
     self.wrftime      = argin.wrf_time
@@ -908,6 +1606,14 @@ class Dirs:
                       'pcp3': 'MRMS_HPRCP'
                       }
 
+    self.obsvarname = {'ref' : 'REFMOSAIC3D',       # variable in the interpolated files
+                       'pcp' : 'HOURLYPRCP',
+                       'pcp6': 'HOURLYPRCP',
+                       'pcp3': 'HOURLYPRCP'
+                      }
+
+    self.regrid    = 'area'          # MRMS interpolation: nearest, bilinear or area
+
     self.units     = {'ref' : 'dBZ',
                       'pcp' : 'mm',
                       'pcp6': 'mm',
@@ -1067,12 +1773,13 @@ if __name__ == "__main__":
   logging.info(f"Working directory: {rootdir.wrkdir}")
   logging.info(f"FCST    directory: {rootdir.fcstdir}")
 
-  if args.program != "verif" and args.program not in ["run_ets", "run_fss", "minterp", "run_reliability", "plt_obs"]:
+  if args.program != "verif" and args.program not in ["run_ets", "run_fss", "bench_ets", "stream", "minterp", "run_reliability", "plt_obs"]:
       rootdir.obsfmt = 0    # do not check observation directory
   else:
       logging.info(f"Obs     directory: {rootdir.obsdir}")
 
-  fcst_files,obs_files,wrk_times = get_files(fcst_times,args.interval,args.fcst_len,rootdir)
+  if args.program != "stream":
+      fcst_files,obs_files,wrk_times = get_files(fcst_times,args.interval,args.fcst_len,rootdir)
 
 
   #---------------------------------------------------------------------
@@ -1080,9 +1787,14 @@ if __name__ == "__main__":
   # Run the programs for score and plot
   #
   #---------------------------------------------------------------------
-  if args.program == "verif":
-      fssfile = run_fss(cmdconfig,rootdir,timstr,fcst_files,obs_files)
-      etsfiles = run_ets(cmdconfig,rootdir,timstr,fcst_files,obs_files)
+  if args.program == "stream":
+      fssfile,etsfiles = stream_verif(cmdconfig,rootdir,timstr,fcst_times,args.interval,args.fcst_len)
+
+      plt_fss(cmdconfig,rootdir,timstr,fssfile)
+      plt_ets(cmdconfig,rootdir,timstr,etsfiles)
+  elif args.program == "verif":
+      fssfile = run_fss(cmdconfig,rootdir,timstr,fcst_files,obs_files,wrk_times)
+      etsfiles = run_ets(cmdconfig,rootdir,timstr,fcst_files,obs_files,wrk_times)
       #relfile = run_reliability(cmdconfig,rootdir,timstr,fcst_files,obs_files)
 
       plt_fss(cmdconfig,rootdir,timstr,fssfile)
@@ -1107,10 +1819,13 @@ if __name__ == "__main__":
             plt_comref(cmdconfig,rootdir,f'fcst{args.field}',fcstfiles[t],wrktimes[t])
 
       if args.program == "run_fss":
-        fssfile = run_fss(cmdconfig,rootdir,timstr,fcst_files,obs_files)
+        fssfile = run_fss(cmdconfig,rootdir,timstr,fcst_files,obs_files,wrk_times)
 
       if args.program == "run_ets":
-        etsfiles = run_ets(cmdconfig,rootdir,timstr,fcst_files,obs_files)
+        etsfiles = run_ets(cmdconfig,rootdir,timstr,fcst_files,obs_files,wrk_times)
+
+      if args.program == "bench_ets":
+        bench_ets(cmdconfig,rootdir,timstr,fcst_files,obs_files,wrk_times)
 
       if args.program == "run_reliability":
         relfile = run_reliability(cmdconfig,rootdir,timstr,fcst_files,obs_files)